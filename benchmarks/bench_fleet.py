@@ -0,0 +1,259 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import contextlib
+import csv
+import ipaddress
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import yaml
+from src.classes.client import Client
+from src.classes.device import Device
+from src.classes.engine import MAX_WORKERS
+from simulator import SIMULATED_VENDORS, SimulatedDevice, Simulator
+
+
+# Information requested by the get flow, available for all simulated vendors
+GET_CONFIGS_INFO = ['Configuration', 'Device Information', 'CDP Neighbors']
+# Information read by the upgrade before transferring an image (Upgrade.get_current_release_info),
+# only available for cisco_ios. The upgrade itself (image transfer over FTP, MD5 verification) runs
+# with the legacy client of upgrade.py and isn't measured.
+RELEASE_INFO_CONFIGS_INFO = ['Device Information', 'File System']
+# Configuration blocks applied by the set flow, for each vendor
+SET_CONFIG_BLOCKS = {
+    'cisco_ios': ['vlans'],
+    'extreme': ['lldp'],
+    'extreme_exos': ['lldp'],
+}
+SET_CONFIG_DATA = {
+    'vlans': [{'id': 10 + index, 'name': f"VLAN_{10 + index}"} for index in range(20)],
+    'lldp': {'mgmt_vlan': 'Mgmt', 'enabled_ports': [f"1:{port}" for port in range(1, 49)]},
+}
+
+
+def get_simulated_devices(args) -> list:
+    '''
+    Create the list of simulated devices, with consecutive loopback addresses and the vendors
+    requested, in a round-robin way
+    '''
+
+    first_ip_address = ipaddress.ip_address(args.first_ip)
+    vendor_list = args.vendors.split(',')
+    return [SimulatedDevice(str(first_ip_address + index), vendor_list[index % len(vendor_list)],
+        f"sim-{index + 1}", port=args.port, latency=args.latency, output_lines=args.output_lines)
+        for index in range(args.devices)]
+
+
+def raise_open_files_limit() -> None:
+    '''
+    Each simulated device needs a listening socket and each session a connection
+    '''
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_simulator(args, shard: int, ready, stop) -> None:
+    '''
+    Run a shard of the simulated devices in its own process, so the simulator doesn't compete
+    with the client for the GIL and the SSH handshakes are spread by all cores
+    '''
+
+    raise_open_files_limit()
+    # Sessions closed by netmiko without a proper SSH disconnect are logged by paramiko as errors
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulator = Simulator()
+        for device in get_simulated_devices(args)[shard::args.simulator_processes]:
+            simulator.add_device(device)
+        simulator.start()
+        ready.set()
+        stop.wait()
+        simulator.stop()
+
+
+def create_client_dir(args) -> str:
+    '''
+    Create a client directory with the device list of the simulated devices and the data used
+    by the set flow
+    '''
+
+    client_dir = tempfile.mkdtemp(prefix='bench_fleet_')
+    os.makedirs(f"{client_dir}/inputfiles")
+    with open(f"{client_dir}/inputfiles/device_list.csv", mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['vendor_os', 'ip_address', 'username', 'password', 'enable_secret', 'port'])
+        for device in get_simulated_devices(args):
+            writer.writerow([device.vendor_os, device.ip_address, device.username, device.password,
+                device.enable_secret, device.port])
+    with open(f"{client_dir}/inputfiles/config_data.yaml", mode='w', encoding='utf-8') as file:
+        yaml.safe_dump(SET_CONFIG_DATA, file)
+    return client_dir
+
+
+def timed(method, latencies: list, failures: list):
+    '''
+    Wrap a Device method to measure the time spent on each device, counting the devices that fail
+    '''
+
+    def wrapper(device, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            method(device, *args, **kwargs)
+            if getattr(device, 'status', None) != 'Connected':
+                failures.append(device.ip_address)
+        except Exception:
+            failures.append(device.ip_address)
+        finally:
+            latencies.append(time.perf_counter() - start_time)
+    return wrapper
+
+
+def run_flow(flow: str, args, client_dir: str, results) -> None:
+    '''
+    Run a single flow against the simulated devices, in its own process so the peak memory
+    reported belongs only to that flow
+    '''
+
+    raise_open_files_limit()
+    latencies = []
+    failures = []
+    Device.get_configs = timed(Device.get_configs, latencies, failures)
+    Device.set_configs = timed(Device.set_configs, latencies, failures)
+
+    try:
+        result = measure_flow(flow, args, client_dir, latencies, failures)
+    except Exception as exception:
+        result = {'flow': flow, 'error': repr(exception)}
+    results.put(result)
+
+
+def measure_flow(flow: str, args, client_dir: str, latencies: list, failures: list) -> dict:
+    '''
+    Create the client of the simulated devices and run the flow, measuring the time it takes
+    '''
+
+    output = sys.stdout if args.verbose else open(os.devnull, 'w')
+    with contextlib.redirect_stdout(output):
+        client = Client(client_dir, 'Benchmark')
+        client.get_devices_from_csv()
+        client.get_commands()
+
+        start_time = time.perf_counter()
+        if flow == 'get':
+            client.get_concurrent_configs(GET_CONFIGS_INFO, max_workers=args.max_workers,
+                parse_workers=args.parse_workers, streaming=args.streaming)
+        elif flow == 'set':
+            client.get_j2_template()
+            client.get_j2_data()
+            device_list = client.device_list
+            # Each vendor has its own configuration blocks
+            for vendor_os, config_blocks in SET_CONFIG_BLOCKS.items():
+                client.device_list = [device for device in device_list if device.vendor_os == vendor_os]
+                client.set_concurrent_configs(config_blocks, max_workers=args.max_workers)
+            client.device_list = device_list
+        elif flow == 'release-info':
+            # Release and flash information of the cisco_ios devices, as collected before an upgrade
+            client.device_list = [device for device in client.device_list if device.vendor_os == 'cisco_ios']
+            client.get_concurrent_configs(RELEASE_INFO_CONFIGS_INFO, max_workers=args.max_workers,
+                parse_workers=args.parse_workers)
+        elapsed = time.perf_counter() - start_time
+        # Time spent in each phase, measured by the client during the last run of the flow
+        phases = client.metrics.summary()['phases']
+        client.close()
+
+    return {
+        'flow': flow,
+        'devices': len(latencies),
+        'failures': len(failures),
+        'elapsed': elapsed,
+        'latencies': sorted(latencies),
+        'phases': phases,
+        # Maximum resident set size, in kilobytes on Linux
+        'peak_memory': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def print_result(result: dict) -> None:
+    if 'error' in result:
+        print(f"{result['flow']:<12} failed: {result['error']}")
+        return
+    devices_per_minute = result['devices'] / result['elapsed'] * 60 if result['elapsed'] else 0
+    print(f"{result['flow']:<12} {result['devices']:>7} {result['failures']:>8} {result['elapsed']:>10.2f} "
+        f"{devices_per_minute:>12.0f} {percentile(result['latencies'], 50):>9.2f} "
+        f"{percentile(result['latencies'], 99):>9.2f} {result['peak_memory']:>12.1f}")
+    for phase, statistics in result['phases'].items():
+        print(f"  {phase:<14} {statistics['count']:>7} {statistics['total']:>10.2f} s total "
+            f"{statistics['p50']:>9.4f} p50 {statistics['p99']:>9.4f} p99")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the get, set and release-info flows against simulated devices')
+    parser.add_argument('--devices', type=int, default=1000, help='number of simulated devices')
+    parser.add_argument('--vendors', default=','.join(SIMULATED_VENDORS), help='vendors of the devices, in a round-robin way')
+    parser.add_argument('--first-ip', default='127.1.0.1', help='loopback address of the first device (127.0.0.0/8 on Linux)')
+    parser.add_argument('--port', type=int, default=2222, help='SSH/Telnet port of the devices')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds taken by the devices to answer each command')
+    parser.add_argument('--output-lines', type=int, default=200, help='lines of the bigger outputs (configuration, MAC table)')
+    parser.add_argument('--flows', default='get,set,release-info',
+        help='flows to run: get, set and/or release-info (information collected before an upgrade)')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS, help='devices in flight')
+    parser.add_argument('--parse-workers', type=int, default=None, help='processes used to parse outputs')
+    parser.add_argument('--streaming', action='store_true', help='release the outputs of each device once saved (get flow)')
+    parser.add_argument('--simulator-processes', type=int, default=os.cpu_count(), help='processes running the simulated devices')
+    parser.add_argument('--serve', action='store_true', help='only run the simulator, until interrupted')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the script')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    simulator_list = []
+    for shard in range(args.simulator_processes):
+        ready = context.Event()
+        simulator = context.Process(target=run_simulator, args=(args, shard, ready, stop), daemon=True)
+        simulator.start()
+        simulator_list.append((simulator, ready))
+    for simulator, ready in simulator_list:
+        if not ready.wait(timeout=300):
+            sys.exit('Simulator did not start')
+    print(f"Simulator running with {args.devices} devices from {args.first_ip}, port {args.port}, "
+        f"in {args.simulator_processes} processes")
+
+    if args.serve:
+        try:
+            stop.wait()
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
+
+    client_dir = create_client_dir(args)
+    try:
+        print(f"{'flow':<12} {'devices':>7} {'failures':>8} {'elapsed s':>10} {'devices/min':>12} "
+            f"{'p50 s':>9} {'p99 s':>9} {'peak RSS MB':>12}")
+        for flow in args.flows.split(','):
+            results = context.Queue()
+            process = context.Process(target=run_flow, args=(flow, args, client_dir, results))
+            process.start()
+            result = results.get()
+            process.join()
+            print_result(result)
+    finally:
+        stop.set()
+        for simulator, _ in simulator_list:
+            simulator.join(timeout=30)
+        shutil.rmtree(client_dir, ignore_errors=True)
@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# Entry points measured, with the maximum import time allowed (seconds)
+ENTRY_POINTS = {
+    'src.classes.client': 0.3,
+    'main': 0.8,
+}
+# Heavy dependencies that must only be imported by the features that need them
+DEFERRED_MODULES = ['netmiko', 'paramiko', 'textfsm', 'N2G', 'pykeepass', 'yaml', 'openpyxl', 'pandas', 'pyarrow']
+# Code runned in a fresh interpreter, for each measure
+MEASURE_CODE = '''
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start_time
+print(json.dumps({{'elapsed': elapsed, 'loaded': [name for name in {deferred} if name in sys.modules]}}))
+'''
+
+
+def measure_import(module: str) -> dict:
+    '''
+    Import a module in a new interpreter, returning the time it took and the heavy dependencies
+    it loaded
+    '''
+
+    code = MEASURE_CODE.format(module=module, deferred=DEFERRED_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def print_slowest_imports(module: str, count: int) -> None:
+    '''
+    Show the modules with the highest cumulative import time, using python -X importtime
+    '''
+
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT_DIR,
+        capture_output=True, text=True, check=True)
+    imports = []
+    for line in output.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].strip()))
+    for cumulative, name in sorted(imports, reverse=True)[:count]:
+        print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the import time of the entry points and fail if it exceeds the budget')
+    parser.add_argument('--repeat', type=int, default=5, help='measures per entry point (the fastest is kept)')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the budgets (e.g. for slower machines)')
+    parser.add_argument('--top', type=int, default=0, help='show the slowest imports of each entry point')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<22} {'import s':>9} {'budget s':>9}  deferred modules loaded")
+    for module, budget in ENTRY_POINTS.items():
+        measures = [measure_import(module) for _ in range(args.repeat)]
+        elapsed = min(measure['elapsed'] for measure in measures)
+        loaded = measures[0]['loaded']
+        budget *= args.scale
+        print(f"{module:<22} {elapsed:>9.3f} {budget:>9.3f}  {', '.join(loaded) if loaded else '-'}")
+        if elapsed > budget:
+            failures.append(f"{module} took {elapsed:.3f} s to import (budget {budget:.3f} s)")
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at module load")
+        if args.top:
+            print_slowest_imports(module, args.top)
+
+    if failures:
+        sys.exit('\n'.join(failures))
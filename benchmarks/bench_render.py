@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import yaml
+from jinja2 import Environment, FileSystemLoader
+from src.classes.j2_cache import BASE_TEMPLATE, TEMPLATE_DIR, J2Cache
+from src.classes.port_range import PORT_FILTERS
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+COMMENT_CHAR = {
+    'cisco_ios': '!',
+    'extreme': '!',
+    'extreme_exos': '#',
+}
+
+
+def get_data(vendor_os: str, index: int, j2_data: dict) -> dict:
+    return {
+        'vendor_os': vendor_os,
+        'ip_address': f"10.{index // 65536}.{index // 256 % 256}.{index % 256}",
+        'timestamp': '01/01/2024 00:00:00',
+        'comment_char': COMMENT_CHAR[vendor_os],
+        **j2_data
+    }
+
+
+def get_config_blocks(j2_data: dict) -> dict:
+    '''
+    Get the configuration blocks of each vendor_os that can be rendered with the data file (the
+    others need data not present in it)
+    '''
+
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), trim_blocks=True, lstrip_blocks=True)
+    environment.filters.update(PORT_FILTERS)
+    config_blocks = {}
+    for vendor_os in COMMENT_CHAR:
+        for filename in sorted(glob.glob(os.path.join(TEMPLATE_DIR, f"{vendor_os}_*.j2"))):
+            block = os.path.basename(filename)[len(vendor_os) + 1:-3]
+            if vendor_os == 'extreme' and block.startswith('exos_'):
+                continue
+            try:
+                environment.get_template(BASE_TEMPLATE).render(get_data(vendor_os, 0, j2_data), config_blocks=[block])
+            except Exception:
+                continue
+            config_blocks.setdefault(vendor_os, []).append(block)
+    return config_blocks
+
+
+def render_uncached(devices: int, config_blocks: dict, j2_data: dict) -> list:
+    '''
+    Render the configurations as before: a new environment per run, with every block template
+    included and rendered for each device
+    '''
+
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), trim_blocks=True, lstrip_blocks=True)
+    environment.filters.update(PORT_FILTERS)
+    template = environment.get_template(BASE_TEMPLATE)
+    config_list = []
+    for index in range(devices):
+        for vendor_os, block_list in config_blocks.items():
+            config_list.append(template.render(get_data(vendor_os, index, j2_data), config_blocks=block_list))
+    return config_list
+
+
+def render_cached(devices: int, config_blocks: dict, j2_data: dict, j2_cache: J2Cache) -> list:
+    '''
+    Render the configurations as SetConfigs.render_template does, with the memoized blocks
+    '''
+
+    template = j2_cache.get_template(BASE_TEMPLATE)
+    config_list = []
+    for index in range(devices):
+        for vendor_os, block_list in config_blocks.items():
+            data = {**get_data(vendor_os, index, j2_data), 'config_blocks': block_list}
+            rendered_blocks = {block: j2_cache.render_block(vendor_os, block, data) for block in block_list}
+            config_list.append(template.render(data, rendered_blocks=rendered_blocks))
+    return config_list
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the rendering of the jinja2 configurations, with and without the template cache')
+    parser.add_argument('--devices', type=int, default=1000, help='devices rendered for each vendor_os')
+    parser.add_argument('--data', default=os.path.join(ROOT_DIR, 'inputfiles/config_data.yaml'), help='YAML data file')
+    args = parser.parse_args()
+
+    with open(args.data) as file:
+        j2_data = yaml.safe_load(file)
+    config_blocks = get_config_blocks(j2_data)
+    for vendor_os, block_list in config_blocks.items():
+        print(f"{vendor_os:<14} {', '.join(block_list)}")
+
+    start_time = time.perf_counter()
+    uncached = render_uncached(args.devices, config_blocks, j2_data)
+    uncached_elapsed = time.perf_counter() - start_time
+
+    j2_cache = J2Cache()
+    start_time = time.perf_counter()
+    cached = render_cached(args.devices, config_blocks, j2_data, j2_cache)
+    cached_elapsed = time.perf_counter() - start_time
+
+    if cached != uncached:
+        sys.exit('The configurations rendered with the cache are different')
+    print(f"{'uncached':<10} {len(uncached) / uncached_elapsed:>10.0f} configs/s")
+    print(f"{'cached':<10} {len(cached) / cached_elapsed:>10.0f} configs/s  "
+        f"({j2_cache.hits} blocks reused, {j2_cache.misses} rendered)")
@@ -0,0 +1,43 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from netmiko.utilities import get_structured_data
+from src.classes.textfsm_cache import TEMPLATE_CACHE
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+RECORDED_OUTPUTS = [
+    ('cisco_ios', 'show mac address-table', 'cisco_ios_show_mac_address-table.txt'),
+    ('cisco_ios', 'show interfaces status', 'cisco_ios_show_interfaces_status.txt'),
+]
+
+
+def run_benchmark(name, parse, raw_output, platform, command, iterations):
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        parse(raw_output, platform=platform, command=command)
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<28} {command:<26} {iterations:>7} parses {elapsed:>8.2f} s {iterations / elapsed:>10.0f} parses/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare netmiko get_structured_data with the TextFSM template cache')
+    parser.add_argument('--iterations', type=int, default=10000, help='number of parses per recorded output')
+    args = parser.parse_args()
+
+    for platform, command, filename in RECORDED_OUTPUTS:
+        with open(os.path.join(DATA_DIR, filename), 'r', encoding='utf-8') as file:
+            raw_output = file.read()
+
+        # Both parsers must return the same entries
+        if TEMPLATE_CACHE.parse(raw_output, platform, command) != get_structured_data(raw_output, platform=platform, command=command):
+            sys.exit(f"Template cache output differs from get_structured_data for: {command}")
+
+        run_benchmark('get_structured_data', get_structured_data, raw_output, platform, command, args.iterations)
+        run_benchmark('TEMPLATE_CACHE.parse', TEMPLATE_CACHE.parse, raw_output, platform, command, args.iterations)
@@ -0,0 +1,789 @@
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+import paramiko
+from src.classes.colors import Colors
+
+
+# Vendors emulated by the simulator
+SIMULATED_VENDORS = ('cisco_ios', 'extreme', 'extreme_exos')
+# Number of lines of each page, while paging is enabled
+PAGE_LINES = 24
+MORE_PROMPT = ' --More-- '
+# Time to wait for the SSH banner of the client, before assuming it's a Telnet client
+PROTOCOL_DETECTION_TIMEOUT = 0.5
+
+COMMANDS_PATH = os.path.join(os.path.dirname(__file__), '../src/commands.json')
+INVALID_INPUT = {
+    'cisco_ios': "% Invalid input detected at '^' marker.",
+    'extreme': "%% Invalid input detected at '^' marker.",
+    'extreme_exos': "%% Invalid input detected at '^' marker.",
+}
+IOS_CONFIG_MODES = {
+    'interface': 'config-if',
+    'vlan': 'config-vlan',
+    'router': 'config-router',
+    'line': 'config-line',
+    'ip access-list': 'config-acl',
+}
+
+
+def load_simulated_commands(path: str=COMMANDS_PATH) -> dict:
+    '''
+    Get the commands of each simulated vendor from the commands.json file
+    '''
+
+    with open(path, mode='r', encoding='utf-8') as file:
+        command_list = json.load(file)
+
+    simulated_commands = {vendor_os: set() for vendor_os in SIMULATED_VENDORS}
+    for info in command_list.values():
+        for vendor_os, commands in info['commands'].items():
+            if vendor_os in simulated_commands and commands:
+                simulated_commands[vendor_os].update(command.strip() for command in commands)
+    return simulated_commands
+
+
+class SimulatedDevice():
+    '''
+    Class used to define a simulated device: vendor, hostname, credentials, the time it takes to
+    answer each command (latency) and the size of the outputs (number of lines of the bigger
+    outputs, such as the configuration and the MAC address table)
+    '''
+
+    def __init__(self, ip_address: str, vendor_os: str, hostname: str, port: int=22, username: str='admin',
+        password: str='admin', enable_secret: str='enable', privileged: bool=True, latency: float=0.0,
+        output_lines: int=200, commands: set=None, error_pattern: str=None):
+        '''
+        Constructor used to create a new simulated device. If privileged is True, sessions start in
+        privileged mode (as with users of privilege 15), otherwise the enable secret is needed.
+        Configuration lines containing the error pattern (if any) are rejected, as if they were
+        invalid.
+        '''
+        if vendor_os not in SIMULATED_VENDORS:
+            raise ValueError(f"Vendor not supported by the simulator: {vendor_os}")
+        self.ip_address = ip_address
+        self.vendor_os = vendor_os
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.enable_secret = enable_secret
+        self.privileged = privileged
+        self.latency = latency
+        self.output_lines = output_lines
+        self.commands = commands if commands is not None else load_simulated_commands()[vendor_os]
+        self.error_pattern = error_pattern
+        self.outputs = {}
+
+    def get_output(self, command: str) -> str|None:
+        '''
+        Get the output of a "show" command, generating it only once. Commands with arguments
+        (e.g. dir flash:) are matched by the command in commands.json. Returns None if the command
+        isn't known.
+        '''
+
+        known_command = next((known for known in sorted(self.commands, key=len, reverse=True)
+            if command == known or command.startswith(f"{known} ")), None)
+        if known_command is None:
+            return None
+        if known_command not in self.outputs:
+            self.outputs[known_command] = self.generate_output(known_command)
+        return self.outputs[known_command]
+
+    def generate_output(self, command: str) -> str:
+        '''
+        Generate a plausible output of a command, with the format used by the vendor
+        '''
+
+        if command in ('show running-config', 'show config'):
+            return self.generate_config(self.vendor_os == 'cisco_ios')
+        generator = {
+            'cisco_ios': self.generate_cisco_ios_output,
+            'extreme': self.generate_extreme_output,
+            'extreme_exos': self.generate_extreme_exos_output,
+        }[self.vendor_os]
+        output = generator(command, max(1, min(self.output_lines // 50, 48)))
+        if output is not None:
+            return output
+        # Generic output, with a tenth of the lines of the bigger outputs
+        return '\n'.join(f"{command} - line {index}" for index in range(1, max(1, self.output_lines // 10) + 1))
+
+    def generate_cisco_ios_output(self, command: str, neighbors: int) -> str|None:
+        '''
+        Generate the output of the cisco_ios commands with a specific format
+        '''
+
+        if command == 'show mac address-table':
+            return self.generate_mac_table()
+        if command == 'show version':
+            return '\n'.join([
+                'Cisco IOS Software, Catalyst L3 Switch Software (CAT9K_IOSXE), Version 17.9.4, RELEASE SOFTWARE (fc5)',
+                'Technical Support: http://www.cisco.com/techsupport',
+                '',
+                f"{self.hostname} uptime is 12 weeks, 3 days, 4 hours, 5 minutes",
+                'System returned to ROM by Reload Command',
+                'System image file is "flash:packages.conf"',
+                '',
+                'cisco C9300-48P (X86) processor with 1331521K/6147K bytes of memory.',
+                'Processor board ID FOC2222X0AB',
+                '48 Gigabit Ethernet interfaces',
+                '',
+                'Base Ethernet MAC Address          : 00:11:22:33:44:55',
+                'Model Number                       : C9300-48P',
+                'System Serial Number               : FOC2222X0AB',
+                '',
+                'Configuration register is 0x102',
+            ])
+        if command == 'show file system':
+            return '\n'.join([
+                'File Systems:',
+                '',
+                '       Size(b)       Free(b)      Type  Flags  Prefixes',
+                '*  11353194496    9328041984      disk     rw   flash:',
+                '      2097152       2080768     nvram     rw   nvram:',
+            ])
+        if command in ('show cdp neighbors detail', 'show cdp neighbor detail'):
+            return self.generate_cdp_neighbors(neighbors)
+        return None
+
+    def generate_extreme_exos_output(self, command: str, neighbors: int) -> str|None:
+        '''
+        Generate the output of the extreme_exos commands with a specific format
+        '''
+
+        if command == 'show system':
+            return '\n'.join([
+                f"SysName:          {self.hostname}",
+                'SysLocation:      Simulated lab',
+                'SysContact:       support@example.com',
+                'System MAC:       00:04:96:00:00:01',
+                'System Type:      X440G2-48p-10G4',
+                '',
+                'System Health Check: PASS',
+                'Current Time:     Mon Jan  1 00:00:00 2024',
+                'Boot Time:        Mon Jan  1 00:00:00 2024',
+                'Primary ver:      31.7.1.4',
+                'Secondary ver:    30.7.1.1',
+                'Image   Selected:   primary',
+                'Image   Booted:     primary',
+            ])
+        if command == 'show cdp neighbor detail':
+            lines = []
+            for index in range(1, neighbors + 1):
+                lines.extend([
+                    f"Device ID      : {self.hostname}-neighbor-{index}",
+                    "  Port ID (outgoing port): GigabitEthernet1/0/48",
+                    f"  Interface (port)       : 1:{index}",
+                    f"  IP Address             : 192.0.2.{index}",
+                    '  Platform               : cisco C9300-48P',
+                    '  Capabilities           : Switch IGMP',
+                    '  Holdtime               : 140 sec',
+                    '',
+                ])
+            return '\n'.join(lines)
+        if command in ('show lldp neighbor detailed', 'show lldp neighbor detail'):
+            lines = []
+            for index in range(1, neighbors + 1):
+                lines.extend([
+                    '-----------------------------------------------------------------------------',
+                    f"LLDP Port 1:{index} detected 1 neighbor",
+                    f"  Neighbor: 00:04:96:00:{index // 256:02X}:{index % 256:02X}/1:48, age 12 seconds",
+                    '    - Chassis ID type: MAC address (4); Chassis ID: 00:04:96:00:00:01',
+                    '      Port ID type: ifName (5); Port ID: "1:48"',
+                    '    - Time To Live: 120 seconds',
+                    '    - Port Description: "Simulated uplink"',
+                    f"    - System Name: \"{self.hostname}-neighbor-{index}\"",
+                    '    - System Description: "ExtremeXOS (X440G2-48p-10G4) version 31.7.1.4"',
+                    '    - Management Address Subtype: IPv4 (1)',
+                    f"      Management Address        : 192.0.2.{index}",
+                    '',
+                ])
+            return '\n'.join(lines)
+        if command == 'show ports no-refresh':
+            lines = [
+                'Port      Display              VLAN Name          Port  Link  Speed  Duplex',
+                '#         String               (or # VLANs)       State State Actual Actual',
+                '===============================================================================',
+            ]
+            for port in range(1, max(1, self.output_lines // 10) + 1):
+                lines.append(f"{f'1:{port}':<10}{f'Simulated port {port}':<21}{'Data':<19}E     A      1000  FULL")
+            return '\n'.join(lines)
+        return None
+
+    def generate_extreme_output(self, command: str, neighbors: int) -> str|None:
+        '''
+        Generate the output of the extreme (EOS) commands with a specific format
+        '''
+
+        if command == 'show system':
+            return '\n'.join([
+                'System contact:  support@example.com',
+                'System location: Simulated lab',
+                f"System name:     {self.hostname}",
+                '',
+                'Switch 1',
+                '--------',
+                'PS1-Status     PS2-Status',
+                '-------------- --------------',
+                'Ok             Not Installed and/or Not Operating',
+                '',
+                'Uptime d,h:m:s    Logout',
+                '--------------    -------',
+                '84,4:05:00        10 min',
+            ])
+        if command == 'show system hardware':
+            return '\n'.join([
+                '        SLOT HARDWARE INFORMATION',
+                '        -------------------------',
+                '',
+                'Switch 1',
+                '    Model:                          B5G124-48P2',
+                '    Serial Number:                  12345678901A',
+                '    Vendor ID:                      0xbc00',
+                '    Base MAC Address:               00:1f:45:00:00:01',
+                '    Hardware Version:               BCM56514 REV 1',
+                '    FirmWare Version:               06.81.08.0001',
+                '    Boot Code Version:              01.00.35',
+            ])
+        if command == 'show time':
+            return 'THU JAN 01 00:00:00 2024'
+        if command == 'show neighbors':
+            lines = [
+                '  Port        Device ID                       Port ID                 Type             Network Address',
+                '------------------------------------------------------------------------------------------------------------',
+            ]
+            for index in range(1, neighbors + 1):
+                lines.append(f"  {f'ge.1.{index}':<12}{f'{self.hostname}-neighbor-{index}':<32}{'ge.1.48':<24}"
+                    f"{'lldp':<17}192.0.2.{index}")
+            return '\n'.join(lines)
+        if command == 'show port status':
+            lines = [
+                'Port     Alias               Oper   Admin   Speed   Duplex  Type',
+                '         (truncated)         Status Status  (bps)',
+                '-------- ------------------- ------ ------- ------- ------- ------------',
+            ]
+            for port in range(1, max(1, self.output_lines // 10) + 1):
+                lines.append(f"{f'ge.1.{port}':<9}{f'Simulated port {port}':<20}up     up      1.0G    full    10/100/1000-T")
+            return '\n'.join(lines)
+        return None
+
+    def generate_config(self, ios: bool) -> str:
+        '''
+        Generate a configuration with approximately the number of lines of the device
+        '''
+
+        config = [f"hostname {self.hostname}" if ios else f"configure snmp sysName \"{self.hostname}\""]
+        port = 1
+        while len(config) < self.output_lines:
+            if ios:
+                config.extend([
+                    f"interface GigabitEthernet1/0/{port}",
+                    f" description Simulated port {port}",
+                    ' switchport access vlan 10',
+                    ' switchport mode access',
+                    '!',
+                ])
+            else:
+                config.extend([
+                    f"configure ports {port} display-string \"Simulated port {port}\"",
+                    f"configure vlan Data add ports {port} untagged",
+                ])
+            port += 1
+        return '\n'.join(config[:self.output_lines])
+
+    def generate_mac_table(self) -> str:
+        '''
+        Generate a MAC address table, in the cisco_ios format, with the number of lines of the device
+        '''
+
+        lines = [
+            '          Mac Address Table',
+            '-------------------------------------------',
+            '',
+            'Vlan    Mac Address       Type        Ports',
+            '----    -----------       --------    -----',
+        ]
+        for index in range(self.output_lines):
+            mac = f"{0x001122000000 + index:012x}"
+            lines.append(f"{10 + index % 20:>4}    {mac[0:4]}.{mac[4:8]}.{mac[8:12]}    DYNAMIC     Gi1/0/{index % 48 + 1}")
+        lines.append(f"Total Mac Addresses for this criterion: {self.output_lines}")
+        return '\n'.join(lines)
+
+    def generate_cdp_neighbors(self, count: int) -> str:
+        '''
+        Generate the detail of a given number of CDP neighbors, in the cisco_ios format
+        '''
+
+        lines = []
+        for index in range(1, count + 1):
+            lines.extend([
+                '-------------------------',
+                f"Device ID: {self.hostname}-neighbor-{index}",
+                'Entry address(es): ',
+                f"  IP address: 192.0.2.{index}",
+                'Platform: cisco C9300-48P,  Capabilities: Switch IGMP ',
+                f"Interface: GigabitEthernet1/0/{index},  Port ID (outgoing port): GigabitEthernet1/0/48",
+                'Holdtime : 140 sec',
+                '',
+                'Version :',
+                'Cisco IOS Software, Catalyst L3 Switch Software (CAT9K_IOSXE), Version 17.9.4, RELEASE SOFTWARE (fc5)',
+                '',
+                'advertisement version: 2',
+                'Native VLAN: 1',
+                'Duplex: full',
+                'Management address(es): ',
+                f"  IP address: 192.0.2.{index}",
+                '',
+            ])
+        return '\n'.join(lines)
+
+
+class DeviceShell():
+    '''
+    Class used to emulate the command line of a simulated device over a channel (SSH channel or
+    Telnet socket): prompts, enable, configuration mode, paging and the command outputs
+    '''
+
+    def __init__(self, device: SimulatedDevice, channel, login: bool=False):
+        '''
+        Constructor used to create a new shell. If login is True (Telnet), the username and
+        password are asked before the prompt.
+        '''
+        self.device = device
+        self.channel = channel
+        self.ios = device.vendor_os == 'cisco_ios'
+        self.state = 'username' if login else 'shell'
+        self.username = None
+        self.enabled = device.privileged or not self.ios
+        self.config_mode = None
+        self.paging = True
+        self.counter = 1
+        self.buffer = ''
+        self.last_cr = False
+        self.pages = []
+        self.running = True
+
+    def send(self, data: str) -> None:
+        self.channel.sendall(data.replace('\n', '\r\n').encode('utf-8'))
+
+    def prompt(self) -> str:
+        '''
+        Get the current prompt of the device
+        '''
+
+        if not self.ios:
+            return f"{self.device.hostname}.{self.counter} # "
+        if self.config_mode is not None:
+            return f"{self.device.hostname}({self.config_mode})#"
+        return f"{self.device.hostname}{'#' if self.enabled else '>'}"
+
+    def run(self) -> None:
+        '''
+        Read the input of the client, character by character, until the session is closed
+        '''
+
+        self.send('Username: ' if self.state == 'username' else self.prompt())
+        while self.running:
+            try:
+                data = self.channel.recv(4096)
+            except (OSError, EOFError):
+                break
+            if not data:
+                break
+            for char in data.decode('utf-8', errors='ignore'):
+                self.handle_char(char)
+                if not self.running:
+                    break
+
+    def handle_char(self, char: str) -> None:
+        '''
+        Handle a single character: answer to the --More-- prompt or add it to the current line
+        '''
+
+        # Waiting for a key on the --More-- prompt
+        if self.pages:
+            if char == 'q':
+                self.pages = []
+                self.send('\n' + self.prompt())
+            elif char == ' ':
+                self.send_page()
+            elif char in '\r\n':
+                self.send_page(lines=1)
+            return
+
+        if char in '\r\n':
+            # Line ended by \r\n
+            if char == '\n' and self.last_cr:
+                self.last_cr = False
+                return
+            self.last_cr = char == '\r'
+            line, self.buffer = self.buffer, ''
+            self.handle_line(line)
+        elif char in '\x08\x7f':
+            self.buffer = self.buffer[:-1]
+        elif char == '\x1a':
+            # CTRL+Z leaves the configuration mode
+            self.config_mode = None
+        elif char < ' ':
+            # Other control characters, such as the null sent by netmiko to check the connection
+            return
+        else:
+            self.last_cr = False
+            self.buffer += char
+
+    def handle_line(self, line: str) -> None:
+        '''
+        Handle a line sent by the client, according to the current state of the session
+        '''
+
+        if self.state == 'username':
+            self.username = line.strip()
+            self.state = 'password'
+            self.send('\nPassword: ')
+            return
+        if self.state == 'password':
+            if self.username == self.device.username and line == self.device.password:
+                self.state = 'shell'
+                self.send('\n\n' + self.prompt())
+            else:
+                self.state = 'username'
+                self.send('\n% Login invalid\n\nUsername: ')
+            return
+        if self.state == 'enable':
+            self.state = 'shell'
+            if line == self.device.enable_secret:
+                self.enabled = True
+                self.send('\n' + self.prompt())
+            else:
+                self.send('\n% Access denied\n\n' + self.prompt())
+            return
+
+        # Echo the command, as the devices do
+        self.send(line + '\n')
+        command = ' '.join(line.split())
+        if not command:
+            self.send(self.prompt())
+            return
+
+        if self.device.latency:
+            time.sleep(self.device.latency)
+        output = self.run_command(command)
+        if not self.running:
+            return
+        # The extreme prompt id is only increased by configuration commands, so the prompt read
+        # before a "show" command (used as expect_string) is the same after it
+        if not self.ios and not command.startswith('show '):
+            self.counter += 1
+        self.send_output(output)
+
+    def run_command(self, command: str) -> str|None:
+        '''
+        Run a command and return its output (None if the command doesn't have an output)
+        '''
+
+        if self.config_mode is not None:
+            return self.run_config_command(command)
+
+        if command in ('exit', 'logout', 'quit'):
+            self.running = False
+            self.channel.close()
+            return None
+        if self.ios and command == 'enable':
+            if not self.enabled:
+                self.state = 'enable'
+                self.send('Password: ')
+                return None
+            return ''
+        if self.ios and command == 'disable':
+            self.enabled = False
+            return ''
+        if self.ios and command in ('configure terminal', 'conf t', 'config t'):
+            if not self.enabled:
+                return INVALID_INPUT['cisco_ios']
+            self.config_mode = 'config'
+            return 'Enter configuration commands, one per line.  End with CNTL/Z.'
+
+        # Paging
+        if command in ('terminal length 0', 'disable clipaging', 'set length 0', 'disable cli paging session'):
+            self.paging = False
+            return ''
+        if command.startswith(('terminal length ', 'set length ')) or command in ('enable clipaging', 'enable cli paging session'):
+            self.paging = True
+            return ''
+        if command.startswith('terminal ') or command == 'disable cli prompting':
+            return ''
+
+        # Save configuration
+        if command in ('write mem', 'write memory', 'copy running-config startup-config'):
+            return 'Building configuration...\n[OK]'
+        if command.startswith(('save configuration', 'save config')):
+            return 'Saving configuration on master ......... done!\nConfiguration saved to primary.cfg successfully.'
+
+        output = self.device.get_output(command)
+        if output is not None:
+            return output
+
+        # Configuration commands of the extreme devices are executed without configuration mode
+        if not self.ios and not command.startswith('show '):
+            return self.run_config_command(command)
+        return INVALID_INPUT[self.device.vendor_os]
+
+    def run_config_command(self, command: str) -> str:
+        '''
+        Run a configuration command, entering and leaving the configuration sub-modes of cisco_ios
+        '''
+
+        if self.device.error_pattern and self.device.error_pattern in command:
+            return INVALID_INPUT[self.device.vendor_os]
+        if not self.ios:
+            return ''
+
+        if command == 'end':
+            self.config_mode = None
+        elif command == 'exit':
+            self.config_mode = None if self.config_mode == 'config' else 'config'
+        else:
+            for keyword, mode in IOS_CONFIG_MODES.items():
+                if command.startswith(f"{keyword} "):
+                    self.config_mode = mode
+                    break
+        return ''
+
+    def send_output(self, output: str|None) -> None:
+        '''
+        Send the output of a command followed by the prompt, split in pages if paging is enabled
+        '''
+
+        if output is None:
+            return
+        lines = output.split('\n') if output else []
+        if self.paging and len(lines) > PAGE_LINES:
+            self.pages = lines
+            self.send_page(erase=False)
+            return
+        self.send((output + '\n' if output else '') + self.prompt())
+
+    def send_page(self, lines: int=PAGE_LINES, erase: bool=True) -> None:
+        '''
+        Send the next page (or a number of lines) of the output being paged, erasing the previous
+        --More-- prompt
+        '''
+
+        page, self.pages = self.pages[:lines], self.pages[lines:]
+        self.send(('\x08' * len(MORE_PROMPT) if erase else '') + '\n'.join(page) + '\n')
+        self.send(MORE_PROMPT if self.pages else self.prompt())
+
+
+class TelnetChannel():
+    '''
+    Class used to give a Telnet socket the same interface of a SSH channel, removing the Telnet
+    option negotiation (IAC sequences) sent by the client
+    '''
+
+    IAC = 255
+    SB = 250
+    SE = 240
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.pending = b''
+
+    def recv(self, size: int) -> bytes:
+        data = self.pending + self.sock.recv(size)
+        self.pending = b''
+        output = bytearray()
+        index = 0
+        while index < len(data):
+            byte = data[index]
+            if byte != self.IAC:
+                output.append(byte)
+                index += 1
+                continue
+            # Incomplete sequence, wait for the rest of it
+            if index + 1 >= len(data):
+                self.pending = data[index:]
+                break
+            command = data[index + 1]
+            if command == self.IAC:
+                output.append(self.IAC)
+                index += 2
+            elif command == self.SB:
+                end = data.find(bytes([self.IAC, self.SE]), index)
+                if end < 0:
+                    self.pending = data[index:]
+                    break
+                index = end + 2
+            elif command >= 251:
+                if index + 2 >= len(data):
+                    self.pending = data[index:]
+                    break
+                index += 3
+            else:
+                index += 2
+        # Only option negotiation was received, keep reading
+        if not output and data:
+            return self.recv(size)
+        return bytes(output)
+
+    def sendall(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class SSHServer(paramiko.ServerInterface):
+    '''
+    SSH server interface of a simulated device: password authentication and interactive shell
+    '''
+
+    def __init__(self, device: SimulatedDevice):
+        self.device = device
+        self.shell_requested = threading.Event()
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if username == self.device.username and password == self.device.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+class Simulator():
+    '''
+    Class used to run a set of simulated devices on the local machine. Each device listens on its
+    own IP address and port, accepting both SSH and Telnet (detected by the SSH banner sent by
+    the client). Devices can use different loopback addresses (127.0.0.0/8 on Linux) with the
+    same port, so they can be used in the device list as if they were real devices.
+    '''
+
+    def __init__(self, host_key: paramiko.PKey=None):
+        '''
+        Constructor used to create a new simulator. A host key is generated if none is given.
+        '''
+        self.host_key = host_key if host_key is not None else paramiko.RSAKey.generate(2048)
+        self.devices = {}
+        self.selector = selectors.DefaultSelector()
+        self.thread = None
+        self.running = False
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def add_device(self, device: SimulatedDevice) -> None:
+        '''
+        Add a device to the simulator, listening on its IP address and port
+        '''
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((device.ip_address, device.port))
+        sock.listen(128)
+        sock.setblocking(False)
+        # Port chosen by the operating system
+        device.port = sock.getsockname()[1]
+        self.devices[(device.ip_address, device.port)] = device
+        self.selector.register(sock, selectors.EVENT_READ, device)
+
+    def start(self) -> None:
+        '''
+        Start accepting connections, in a background thread
+        '''
+
+        self.running = True
+        self.thread = threading.Thread(target=self.accept, name='simulator', daemon=True)
+        self.thread.start()
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Simulator running with {len(self.devices)} devices")
+
+    def accept(self) -> None:
+        '''
+        Accept the connections of all devices and handle each one in its own thread
+        '''
+
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.5):
+                try:
+                    sock, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                sock.setblocking(True)
+                threading.Thread(target=self.handle_connection, args=(sock, key.data), daemon=True).start()
+
+    def handle_connection(self, sock: socket.socket, device: SimulatedDevice) -> None:
+        '''
+        Detect the protocol used by the client and run the shell of the device
+        '''
+
+        with self.lock:
+            self.connections.add(sock)
+        try:
+            sock.settimeout(PROTOCOL_DETECTION_TIMEOUT)
+            try:
+                banner = sock.recv(4, socket.MSG_PEEK)
+            except socket.timeout:
+                banner = b''
+            sock.settimeout(None)
+
+            if banner.startswith(b'SSH-'):
+                self.handle_ssh(sock, device)
+            else:
+                DeviceShell(device, TelnetChannel(sock), login=True).run()
+        except Exception:
+            # Connections closed by the client in the middle of a command
+            pass
+        finally:
+            with self.lock:
+                self.connections.discard(sock)
+            sock.close()
+
+    def handle_ssh(self, sock: socket.socket, device: SimulatedDevice) -> None:
+        '''
+        Run the SSH server of the device over an accepted connection
+        '''
+
+        transport = paramiko.Transport(sock)
+        try:
+            transport.add_server_key(self.host_key)
+            server = SSHServer(device)
+            transport.start_server(server=server)
+            channel = transport.accept(timeout=30)
+            if channel is None or not server.shell_requested.wait(timeout=30):
+                return
+            DeviceShell(device, channel).run()
+        finally:
+            transport.close()
+
+    def stop(self) -> None:
+        '''
+        Stop accepting connections and close all the sessions
+        '''
+
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            self.selector.unregister(key.fileobj)
+            key.fileobj.close()
+        with self.lock:
+            for sock in self.connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Simulator stopped")
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import os
+import sys
+import time
+from getpass import getpass
+from src.classes.client import Client
+from src.classes.colors import Colors
+from src.classes.device import Device
+from src.classes.discovery import MAX_HOPS
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Discover the network from seed devices, crawling their CDP/LLDP neighbors')
+    parser.add_argument('root_dir', help='client directory, where the inventory and adjacencies are saved')
+    parser.add_argument('--name', default='Discovery', help='client name (keepass group)')
+    parser.add_argument('--seed', action='append', help='IP address of a seed device, by default the devices of device_list.csv')
+    parser.add_argument('--platform', default='cisco_ios', help='vendor_os of the seed devices given by --seed')
+    parser.add_argument('--username', help='username of the devices found, when not in the keepass database (the password is asked)')
+    parser.add_argument('--kdbx', default=None, help='keepass database with the credentials of the devices')
+    parser.add_argument('--protocol', action='append', choices=['CDP', 'LLDP'], help='discovery protocols, by default CDP and LLDP')
+    parser.add_argument('--max-hops', type=int, default=MAX_HOPS, help='maximum number of hops from the seed devices')
+    parser.add_argument('--subnet', action='append', help='only visit devices with a management IP in these subnets (e.g. 10.0.0.0/16)')
+    parser.add_argument('--workers', type=int, default=None, help='devices visited at the same time')
+    parser.add_argument('--formats', default=None, help='export formats of the neighbors (csv, jsonl, parquet and/or xlsx)')
+    parser.add_argument('--store', action='store_true', help='save the neighbors in the result store')
+    parser.add_argument('--diagram', action='store_true', help='generate the network diagram of the adjacencies found')
+    parser.add_argument('--partition-by', choices=['component', 'site', 'subnet'], default=None,
+        help='generate a diagram per connected component, site or subnet (by default, only for big topologies)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    client = Client(args.root_dir, args.name, kdbx_filename=args.kdbx)
+    client.get_commands()
+
+    # Credentials used for the seed devices given by --seed and for the devices found
+    credentials = None
+    if args.username:
+        credentials = {'username': args.username, 'password': getpass(f"    Password of {args.username}: "), 'enable_secret': None}
+        credentials['enable_secret'] = getpass('    Enable secret (if any): ') or None
+
+    if args.seed:
+        if credentials is None and client.kdbx_database is None:
+            sys.exit(f"{Colors.NOK_RED}[!]{Colors.END} The credentials of the seed devices are needed (--username or --kdbx)")
+        seed_list = []
+        for ip_address in args.seed:
+            seed_credentials = credentials
+            if client.kdbx_database:
+                try:
+                    seed_credentials = client.get_kdbx_credentials(client.kdbx_database, ip_address)
+                except Exception:
+                    pass
+            seed_list.append(Device(client, args.platform, ip_address, seed_credentials))
+    else:
+        client.get_devices_from_csv()
+        seed_list = client.device_list
+
+    topology = client.discover_devices(seed_list, protocols=args.protocol or ['CDP', 'LLDP'], max_hops=args.max_hops,
+        subnets=args.subnet, max_workers=args.workers, export_formats=args.formats.split(',') if args.formats else None,
+        store=args.store)
+    if args.diagram and topology.nodes:
+        client.generate_diagram(topology, partition_by=args.partition_by)
+
+    # Wait for the output files to be written
+    client.close()
+
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
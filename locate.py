@@ -0,0 +1,47 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import os
+import sys
+import time
+from src.classes.colors import Colors
+from src.classes.locator import EndpointLocator
+from src.classes.store import ResultStore, get_store_filename
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the device, port and VLAN where endpoints are connected, using the MAC address and ARP tables stored')
+    parser.add_argument('root_dir', help='client directory, with the result store')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--mac', help='MAC address, in any notation')
+    group.add_argument('--ip', help='IP address, resolved with the ARP tables')
+    group.add_argument('--oui', help='OUI (first 3 bytes of the MAC addresses)')
+    group.add_argument('--vendor', help='vendor name, or part of it')
+    parser.add_argument('--limit', type=int, default=100, help='maximum number of endpoints shown')
+    args = parser.parse_args()
+
+    if not os.path.exists(get_store_filename(args.root_dir)):
+        sys.exit(f"{Colors.NOK_RED}[!]{Colors.END} There are no results stored in {args.root_dir}")
+
+    result_store = ResultStore(get_store_filename(args.root_dir))
+    try:
+        # Index the runs stored since the last lookup
+        locator = EndpointLocator(result_store)
+        locator.update()
+
+        start_time = time.perf_counter()
+        try:
+            endpoint_list = locator.locate(mac=args.mac, ip=args.ip, oui=args.oui, vendor=args.vendor, limit=args.limit)
+        except ValueError as exception:
+            sys.exit(f"{Colors.NOK_RED}[!]{Colors.END} {exception}")
+        elapsed = time.perf_counter() - start_time
+    finally:
+        result_store.close()
+
+    print(f"{'MAC address':<18} {'IP addresses':<16} {'device':<28} {'port':<22} {'VLAN':<6} {'last seen':<20} vendor")
+    for endpoint in endpoint_list:
+        device = f"{endpoint['device_hostname'] or ''} ({endpoint['device_ip_address']})"
+        print(f"{endpoint['mac']:<18} {', '.join(endpoint['ip_addresses']) or '-':<16} {device:<28} "
+            f"{endpoint['port'] or '-':<22} {endpoint['vlan'] or '-':<6} {endpoint['last_seen'] or '-':<20} {endpoint['vendor'] or '-'}")
+
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} {len(endpoint_list)} endpoints found in {elapsed * 1000:.1f} ms")
@@ -1,10 +1,15 @@
 import os
 import sys
 import time
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, Response, url_for
 
 from src.classes.client import Client
 from src.classes.colors import Colors
+from src.classes.jobs import JobManager
+from src.classes.locator import EndpointLocator
+from src.classes.metrics import METRICS
+from src.classes.session_pool import SessionPool
+from src.classes.store import ResultStore, get_store_filename
 
 
 CLIENT_NAME = "ANA Aeroportos"
@@ -34,6 +39,7 @@ CONFIG_OPTIONS = {
         ],
         'Others': [
             {'id': 'MAC Address Table', 'name': 'MAC Address Table', 'label': 'MAC Address Table', 'status': 'disabled'},
+            {'id': 'ARP Table', 'name': 'ARP Table', 'label': 'ARP Table', 'status': ''},
             {'id': 'Local Users', 'name': 'Local Users', 'label': 'Local Users', 'status': ''},
         ]
     },
@@ -64,6 +70,14 @@ CONFIG_OPTIONS = {
 
 
 app = Flask(__name__, template_folder='src/web/templates', static_folder='dep/')
+# Device sessions shared by all runs, so consecutive runs against the same devices reuse them
+SESSION_POOL = SessionPool()
+# Formats of the output parsed exported by the get configs runs (csv, jsonl, parquet and/or xlsx)
+EXPORT_FORMATS = ['csv', 'xlsx']
+# Information categories used to generate the network diagram, by discovery protocol (CDP first)
+DIAGRAM_INFO = {'CDP': 'Network Diagram CDP', 'LLDP': 'Network Diagram LLDP'}
+# Get and set configs runs, executed in the background
+JOBS = JobManager()
 
 @app.route('/')
 def index():
@@ -124,65 +138,238 @@ def get_checked_options(method: str):
     return checked_options
 
 
-@app.route('/run_get_configs', methods=['POST'])
-def run_get_configs():
+@app.route('/metrics')
+def metrics():
+    # Duration of each phase of all runs, in the Prometheus text format
+    return Response(METRICS.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def profile_requested() -> bool:
+    # Runs are profiled when requested with the profile parameter (e.g. /run_get_configs?profile=1)
+    return request.values.get('profile', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def diff_requested() -> bool:
+    # Only the commands missing in the running configurations are sent when requested (e.g. /run_set_configs?diff=1)
+    return request.values.get('diff', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_configs_job(job, root_directory: str, client_name: str, get_configs_info: list, profile: bool) -> dict:
     start_time = time.time()
 
+    # Create a new client object, reporting the progress of each device to the job
+    client = Client(root_directory, client_name, session_pool=SESSION_POOL)
+    client.progress = job.update_device
+    if profile:
+        client.start_profiler('run_get_configs')
+    try:
+        # Initialize all data (device and command list)
+        client.get_devices_from_csv()
+        for device in client.device_list:
+            job.update_device(device.ip_address, 'queued')
+        client.get_commands()
+
+        # Get device information for each information requested
+        # The output parsed is exported as each device finishes, and converted to excel at the end
+        # Each device is also saved in the result store, queried by the results view
+        client.get_concurrent_configs(get_configs_info=get_configs_info, parse_workers=os.cpu_count(),
+            export_formats=EXPORT_FORMATS, streaming=True, store=True)
+
+        # Generate diagrams using CDP or LLDP neighbors, loading back only the neighbors of each
+        # device saved as it finished, so the other outputs stay out of memory
+        for discovery_protocol, info in DIAGRAM_INFO.items():
+            if info in get_configs_info:
+                output_parsed = client.merge_config_parsed(client.load_data_dict(), info_list=[info])
+                graph = client.generate_graph(output_parsed=output_parsed, discovery_protocol=discovery_protocol)
+                client.generate_diagram(graph)
+                break
+    finally:
+        # Wait for the output files to be written
+        client.close()
+        client.stop_profiler()
+
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
+    return job_result(job, client, start_time)
+
+
+def set_configs_job(job, root_directory: str, client_name: str, config_blocks: list, profile: bool, diff: bool=False) -> dict:
+    start_time = time.time()
+
+    # Create a new client object, reporting the progress of each device to the job
+    client = Client(root_directory, client_name, session_pool=SESSION_POOL)
+    client.progress = job.update_device
+    if profile:
+        client.start_profiler('run_set_configs')
+    try:
+        # Initialize all data (device list, templates and templates data)
+        client.get_devices_from_csv()
+        for device in client.device_list:
+            job.update_device(device.ip_address, 'queued')
+        client.get_j2_template()
+        client.get_j2_data()
+
+        # Apply the configuration blocks requested to the devices
+        client.set_concurrent_configs(config_blocks=config_blocks, diff=diff)
+    finally:
+        # Wait for the output files to be written
+        client.close()
+        client.stop_profiler()
+
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
+    return job_result(job, client, start_time)
+
+
+def job_result(job, client, start_time: float) -> dict:
+    devices = job.to_dict()['devices']
+    return {
+        'devices': len(devices),
+        'failed': {ip_address: device['detail'] for ip_address, device in devices.items() if device['state'] == 'failed'},
+        'raw_data': client.raw_data_filename,
+        'execution_time': time.time() - start_time,
+    }
+
+
+def submit_job(kind: str, func, *args, params: dict=None):
+    # Runs are executed in the background, returning the job ID and where to follow it
+    try:
+        job = JOBS.submit(kind, func, *args, params=params)
+    except Exception as exception:
+        return jsonify(error=str(exception)), 429
+    return jsonify(
+        job_id=job.id,
+        status_url=url_for('job_status', job_id=job.id),
+        events_url=url_for('job_events', job_id=job.id),
+        result_url=url_for('job_result_view', job_id=job.id),
+    ), 202
+
+
+@app.route('/run_get_configs', methods=['POST'])
+def run_get_configs():
     if ROOT_DIRECTORY == None or CLIENT_NAME == None:
         print(f"{Colors.NOK_RED}[>]{Colors.END} Please specify the Client Name and Root Directory in the proper forms")
         return Response(status=200)
 
     get_configs_info = get_checked_options(method='get_configs')
-
-    # Create a new client object and initialize all data (command list)
-    client = Client(ROOT_DIRECTORY, CLIENT_NAME)
-    client.get_devices_from_csv()
-    client.get_commands()
-
-    # Get device information for each information requested
-    client.get_concurrent_configs(get_configs_info=get_configs_info)
-
-    # Generate script data, converting all class objects to nested dicts
-    script_data = client.generate_data_dict()
-    output_parsed = client.generate_config_parsed(script_data)
-
-    # Generate diagrams using CDP or LLDP neighbors
-    if 'Network Diagram CDP' in get_configs_info:
-        graph = client.generate_graph(output_parsed=output_parsed, discovery_protocol='CDP')
-        client.generate_diagram(graph)
-    elif 'Network Diagram LLDP' in get_configs_info:
-        graph = client.generate_graph(output_parsed=output_parsed, discovery_protocol='LLDP')
-        client.generate_diagram(graph)
-    
-    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
-    return Response(status=204)
+    return submit_job('get_configs', get_configs_job, ROOT_DIRECTORY, CLIENT_NAME, get_configs_info,
+        profile_requested(), params={'get_configs_info': get_configs_info})
 
 
 @app.route('/run_set_configs', methods=['POST'])
 def run_set_configs():
-    start_time = time.time()
-
     if ROOT_DIRECTORY == None or CLIENT_NAME == None:
         print(f"{Colors.NOK_RED}[>]{Colors.END} Please specify the Client Name and Root Directory in the proper forms")
         return Response(status=200)
 
     config_blocks = get_checked_options(method='set_configs')
-
-    # Create a new client object and initialize all data (command list)
-    client = Client(ROOT_DIRECTORY, CLIENT_NAME)
-    client.get_devices_from_csv()
-    client.get_j2_template()
-    client.get_j2_data()
-
-    # Get device information for each information requested
-    client.set_concurrent_configs(config_blocks=config_blocks)
-
-    # Generate script data, converting all class objects to nested dicts
-    # script_data = client.generate_data_dict()
-    # output_parsed = client.generate_config_parsed(script_data)
-
-    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
-    return Response(status=204)
+    return submit_job('set_configs', set_configs_job, ROOT_DIRECTORY, CLIENT_NAME, config_blocks,
+        profile_requested(), diff_requested(), params={'config_blocks': config_blocks, 'diff': diff_requested()})
+
+
+@app.route('/jobs')
+def job_list():
+    return jsonify(JOBS.list())
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    # Reconnecting clients continue after the last event received
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', '0'))
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else 0
+    return Response(JOBS.stream_events(job, last_event_id), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result_view(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(error='Job not found'), 404
+    if job.status == 'failed':
+        return jsonify(status=job.status, error=job.error), 500
+    if job.status != 'done':
+        return jsonify(status=job.status), 202
+    return jsonify(status=job.status, result=job.result)
+
+
+def open_result_store():
+    # Result store of the current root directory, if there is one yet
+    if ROOT_DIRECTORY == None or not os.path.exists(get_store_filename(ROOT_DIRECTORY)):
+        return None
+    return ResultStore(get_store_filename(ROOT_DIRECTORY))
+
+
+@app.route('/results')
+def results():
+    # Parsed rows matching the filters (e.g. /results?mac=aabb.ccdd.eeff or ?info=Device Information&version=15.0(2)SE11)
+    result_store = open_result_store()
+    if result_store is None:
+        return jsonify(error='There are no results stored'), 404
+    filters = {key: request.args.get(key) for key in ('info', 'ip_address', 'hostname', 'mac', 'vlan', 'port', 'version')}
+    try:
+        rows = result_store.find_rows(**filters, run_id=request.args.get('run_id', type=int),
+            latest=request.args.get('latest', 'true').lower() != 'false', limit=request.args.get('limit', 1000, type=int))
+    except ValueError as exception:
+        return jsonify(error=str(exception)), 400
+    finally:
+        result_store.close()
+    return jsonify(rows)
+
+
+@app.route('/locate')
+def locate():
+    # Device, port and VLAN where endpoints are connected (e.g. /locate?mac=aabb.ccdd.eeff, ?ip=10.0.0.1, ?oui=00:1b:54 or ?vendor=Cisco)
+    result_store = open_result_store()
+    if result_store is None:
+        return jsonify(error='There are no results stored'), 404
+    try:
+        locator = EndpointLocator(result_store)
+        locator.update()
+        endpoints = locator.locate(mac=request.args.get('mac'), ip=request.args.get('ip'), oui=request.args.get('oui'),
+            vendor=request.args.get('vendor'), limit=request.args.get('limit', 100, type=int))
+    except ValueError as exception:
+        return jsonify(error=str(exception)), 400
+    finally:
+        result_store.close()
+    return jsonify(endpoints)
+
+
+@app.route('/results/runs')
+def result_runs():
+    result_store = open_result_store()
+    if result_store is None:
+        return jsonify(error='There are no results stored'), 404
+    try:
+        return jsonify(result_store.get_runs(limit=request.args.get('limit', 100, type=int)))
+    finally:
+        result_store.close()
+
+
+@app.route('/results/devices')
+def result_devices():
+    # Devices stored, with the commands runned on each one and the files of their raw output
+    result_store = open_result_store()
+    if result_store is None:
+        return jsonify(error='There are no results stored'), 404
+    try:
+        devices = result_store.get_devices(run_id=request.args.get('run_id', type=int),
+            ip_address=request.args.get('ip_address'), hostname=request.args.get('hostname'),
+            limit=request.args.get('limit', 1000, type=int))
+        for device in devices:
+            device['commands'] = result_store.get_commands(device['id'])
+        return jsonify(devices)
+    finally:
+        result_store.close()
 
 
 if __name__ == "__main__":
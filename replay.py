@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+
+import argparse
+import os
+import time
+from src.classes.client import Client
+from src.classes.colors import Colors
+from src.classes.replay import find_recordings
+
+
+# Information categories used to generate the network diagram, by discovery protocol (CDP first)
+DIAGRAM_INFO = {'CDP': 'Network Diagram CDP', 'LLDP': 'Network Diagram LLDP'}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parse and export again the outputs recorded by get configs, without connecting to the devices')
+    parser.add_argument('root_dir', help='client directory, with the outputfiles folder')
+    parser.add_argument('--name', default='Replay', help='client name')
+    parser.add_argument('--date', action='append', help='date of the outputs to replay (YYYYmmdd), by default all dates recorded')
+    parser.add_argument('--info', action='append', help='information category to replay, by default all recorded')
+    parser.add_argument('--platform', default=None, help='vendor_os of all devices, when not in the device list')
+    parser.add_argument('--formats', default='csv,xlsx', help='export formats (csv, jsonl, parquet and/or xlsx)')
+    parser.add_argument('--store', action='store_true', help='save the replayed runs in the result store')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count(), help='processes used to parse outputs')
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    # Create a new client object and initialize all data (command list and, if any, device list)
+    client = Client(args.root_dir, args.name)
+    if os.path.exists(f"{args.root_dir}/inputfiles/device_list.csv"):
+        client.get_devices_from_csv()
+    client.get_commands()
+    device_list = client.device_list
+
+    # Each date recorded is replayed as a separate run, which replaces the device list
+    for date, recordings in find_recordings(args.root_dir, dates=args.date, get_configs_info=args.info).items():
+        client.device_list = device_list
+        client.replay_configs(date, get_configs_info=args.info, platform=args.platform,
+            parse_workers=args.parse_workers, export_formats=args.formats.split(','), streaming=True, store=args.store)
+
+        # Generate diagrams using CDP or LLDP neighbors, loading back only the neighbors of each
+        # device saved as it was replayed, so the other outputs stay out of memory
+        replayed_info = {info for device in recordings.values() for info, _ in device['outputs']}
+        for discovery_protocol, info in DIAGRAM_INFO.items():
+            if info in replayed_info:
+                output_parsed = client.merge_config_parsed(client.load_data_dict(), info_list=[info])
+                graph = client.generate_graph(output_parsed=output_parsed, discovery_protocol=discovery_protocol)
+                client.generate_diagram(graph)
+                break
+
+    # Wait for the output files to be written
+    client.close()
+
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} Execution time: {time.time() - start_time} seconds")
@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 
+import argparse
 import os
 import sys
 import time
@@ -7,6 +8,7 @@ from getpass import getpass
 from multiprocessing import Manager, Process
 from src.classes.client import Client
 from src.classes.colors import Colors
+from src.classes.config_push import CHUNK_SIZE
 
 
 def raise_exception(exception: str) -> None:
@@ -14,6 +16,18 @@ def raise_exception(exception: str) -> None:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate and apply the configuration blocks selected in set_configs.txt')
+    parser.add_argument('--profile', action='store_true', help='save a sampling profile of the run in outputfiles/Profiles')
+    parser.add_argument('--offline', action='store_true', help='only generate the configurations of device_list.csv, without applying them')
+    parser.add_argument('--diff', action='store_true', help='only send the commands missing in the running configuration of each device')
+    parser.add_argument('--max-age', type=int, default=None,
+        help='with --diff, reuse the running configurations stored by get configs runs up to this age (seconds)')
+    parser.add_argument('--on-error', choices=('continue', 'stop'), default='continue',
+        help='send the remaining commands when a command fails (continue), or stop without saving the configuration (stop)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='commands sent at once, before checking their output')
+    parser.add_argument('--processes', type=int, default=None, help='processes rendering the offline configurations (one per core by default)')
+    args = parser.parse_args()
+
     start_time = time.time()
     validations = {'yes': True, 'y': True, 'no': False, 'n': False}
 
@@ -37,7 +51,7 @@ if __name__ == '__main__':
                 config_blocks.append(info_requested)
 
     # Confirm the configurations to be generated and applied to the devices
-    print(f"{Colors.OK_YELLOW}[>]{Colors.END} Please confirm the following configuration blocks to be applied to the devices (Yes or No): ")
+    print(f"{Colors.OK_YELLOW}[>]{Colors.END} Please confirm the following configuration blocks to be {'generated' if args.offline else 'applied to the devices'} (Yes or No): ")
     for info_requested in config_blocks:
         print(f"       > {info_requested}")
     while True:
@@ -52,16 +66,28 @@ if __name__ == '__main__':
 
     # Create a new client object
     client = Client(root_dir, client_name, kdbx_filename=kdbx_filename)
+    if args.profile:
+        client.start_profiler('set_configs')
 
     # Initialize all data (templates, templates data)
     client.get_j2_template()
     client.get_j2_data()
     
-    # Get device information for each information requested
-    client.set_concurrent_configs(config_blocks=config_blocks)
+    if args.offline:
+        # Render the configurations in a pool of processes, without connecting to the devices
+        client.get_devices_from_csv()
+        client.generate_offline_configs(config_blocks=config_blocks, processes=args.processes)
+    else:
+        # Get device information for each information requested
+        client.set_concurrent_configs(config_blocks=config_blocks, diff=args.diff, max_age=args.max_age,
+            on_error=args.on_error, chunk_size=args.chunk_size)
 
     # # Generate script data, converting all class objects to nested dicts
     # script_data = client.generate_data_dict()
     # output_parsed_dict = client.generate_config_parsed(script_data)
 
+    # Close the device sessions kept by the client
+    client.close()
+    client.stop_profiler()
+
     print(f"Execution time: {time.time() - start_time} seconds")
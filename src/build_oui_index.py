@@ -0,0 +1,21 @@
+# -*- coding: UTF-8 -*-
+
+import sys
+import time
+
+from classes.colors import Colors
+from classes.oui_index import OUI_INDEX_PATH, build_index
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    # IEEE registries: oui.csv (MA-L), mam.csv (MA-M) and oui36.csv (MA-S)
+    registry_files = sys.argv[1:]
+    if not registry_files:
+        sys.exit(f"{Colors.NOK_RED}[!]{Colors.END} Usage: build_oui_index.py oui.csv [mam.csv] [oui36.csv]")
+
+    prefix_count = build_index(registry_files, OUI_INDEX_PATH)
+    print(f"{Colors.OK_GREEN}[>]{Colors.END} OUI index generated with {prefix_count} prefixes: {OUI_INDEX_PATH}")
+
+    print(f"Execution time: {time.time() - start_time} seconds")
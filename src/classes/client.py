@@ -2,23 +2,34 @@ import csv
 import json
 import os
 import sys
-import yaml
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 from getpass import getpass
-from jinja2 import Environment, FileSystemLoader
 from typing import Literal
 
 from .decorators import write_to_file
 
 import inspect
 from datetime import date
-from N2G import yed_diagram
-from pykeepass import PyKeePass
 from .device import Device
+from .discovery import MAX_HOPS, Discovery
 from .colors import Colors
-
-
-MAX_WORKERS = 40
+from .config_generator import generate_configs
+from .config_push import CHUNK_SIZE
+from .configs import SetConfigs
+from .engine import MAX_WORKERS, run_concurrently
+from .exporters import ExportStage
+from .j2_cache import BASE_TEMPLATE, J2_CACHE
+from .locator import EndpointLocator
+from .metrics import METRICS, RunMetrics
+from .output_writer import OutputWriter
+from .parse_stage import ParseStage
+from .profiler import SamplingProfiler, get_profile_path
+from .raw_data import RawDataReader, RawDataSink
+from .replay import Replay
+from .session_pool import SessionPool
+from .store import ResultStore, get_store_filename
+from .textfsm_cache import TEMPLATE_CACHE
+from .topology import DIAGRAM_MAX_NODES, Topology
 
 
 class Client:
@@ -27,40 +38,67 @@ class Client:
     to define the script main execution, namely import and export data.
     '''
 
-    def __init__(self, dir, name, kdbx_filename=None, cmd_list=None, ftp_server=None):
+    def __init__(self, dir, name, kdbx_filename=None, cmd_list=None, ftp_server=None, session_pool=None):
         '''
         Constructor used to create a new client object, definig its main directory, name and
         threading lock to avoid race conditions when accessing multiple devices at the same time
-        to perform operations.
+        to perform operations. A session pool can be shared between clients (e.g. by the web
+        application), otherwise the client creates its own pool, closed by the close function.
         '''
         self.dir = dir
         self.name = name
         self.device_list = []
+        self.owns_session_pool = session_pool is None
+        self.session_pool = SessionPool() if session_pool is None else session_pool
+        self.command_plans = {}
+        self.parse_stage = None
+        self.export_stage = None
+        self.raw_data_sink = None
+        self.raw_data_filename = None
+        self.result_store = None
+        self.store_run_id = None
+        self.streaming = False
+        self.output_writer = OutputWriter()
+        # Durations of the operations made outside of a run (replaced at the start of each run)
+        self.metrics = RunMetrics(METRICS, 'client')
+        self.profiler = None
+        # Function called with the IP address, state and detail of a device, as it progresses
+        self.progress = None
 
         if kdbx_filename is None:
             self.kdbx_database = None
         else:
             self.kdbx_database = self.get_kdbx_database(kdbx_filename)
 
+    def close(self) -> None:
+        '''
+        Release all resources used by the client, namely the output files still being written and
+        the device sessions kept in the pool. A shared pool is kept open, since it's owned by
+        whoever created it.
+        '''
+
+        self.output_writer.close()
+        if self.owns_session_pool:
+            self.session_pool.close()
+
     def get_j2_template(self):
         '''
         Define the directory of jinja2 templates and specify the base template (skeleton) to be loaded
         The base_config.j2 template will then be extended by the child templates, specified by the 
-        config_blocks variable passed in the constructor
+        config_blocks variable passed in the constructor. The templates are loaded from the jinja2
+        environment shared by the whole process, compiled only once (see J2Cache).
         '''
 
         # Load the base template and assign it to a variable for further usage
-        env = Environment(
-            loader=FileSystemLoader(f"{os.path.dirname(__file__)}/../jinja2_templates"), 
-            trim_blocks=True, 
-            lstrip_blocks=True)
-        self.j2_template = env.get_template('base_config.j2')
+        self.j2_template = J2_CACHE.get_template(BASE_TEMPLATE)
 
     def get_j2_data(self):
         '''
         Get the data to be used in the jinja2 template, from a YAML file
         '''
 
+        import yaml
+
         # Open the default config_data.yaml file and load the content to a variable
         with open(f"{self.dir}/inputfiles/config_data.yaml") as file:
             self.j2_data = yaml.safe_load(file)
@@ -108,7 +146,7 @@ class Client:
                         }
 
                 # Create a new Device object and append it to the list of devices
-                device = Device(self, row['vendor_os'], row['ip_address'], credentials)
+                device = Device(self, row['vendor_os'], row['ip_address'], credentials, port=row.get('port') or None)
                 self.device_list.append(device)
 
     def get_kdbx_database(self, filename):
@@ -116,6 +154,8 @@ class Client:
         Get keepass database from .kdbx file. This database will be later iterated through to get the device credentials
         '''
 
+        from pykeepass import PyKeePass
+
         try:
             kdbx_password = getpass(f"{Colors.OK_YELLOW}[>]{Colors.END} Please insert your Keepass password: ")
             # Load .kdbx file, passing in the argument the filename and respective password
@@ -165,40 +205,253 @@ class Client:
             self.command_list = json.load(cmds)
         # Define environment variable for TextFSM, so that the package can get the correct templates
         os.environ['NET_TEXTFSM'] = os.path.join(os.path.dirname(__file__), '../../dep/ntc-templates/ntc_templates/templates')
+        # Compile the TextFSM templates once, before getting information from the devices
+        TEMPLATE_CACHE.warm_up(self.command_list)
+
+
+    def get_command_plan(self, get_configs_info: list, vendor_os: str) -> list:
+        '''
+        Compile the list of commands to be runned on a device of a given vendor_os, to get all the
+        information requested. Commands shared by multiple information categories (e.g. CDP
+        Neighbors and Network Diagram CDP) are runned only once, and their output is used by all
+        the categories that requested it. The plan is compiled once per vendor_os.
+        '''
+
+        key = (vendor_os, tuple(get_configs_info))
+        if key in self.command_plans:
+            return self.command_plans[key]
+
+        # Map each command to the information categories that requested it, keeping the order
+        command_plan = {}
+        for info in get_configs_info:
+            for command in self.command_list[info]['commands'][vendor_os]:
+                info_list = command_plan.setdefault(command.strip(), [])
+                if info not in info_list:
+                    info_list.append(info)
 
+        self.command_plans[key] = list(command_plan.items())
+        return self.command_plans[key]
 
-    def get_concurrent_configs(self, get_configs_info: list) -> None:
+    def get_concurrent_configs(self, get_configs_info: list, max_workers: int=None,
+        parse_workers: int=None, export_formats: list=None, raw_data: bool=False, streaming: bool=False,
+        store: bool=False) -> None:
         '''
-        Function used to interact with the devices in a concurrent way (using concurrent.futures),
-        takind advantage of threading to get information from the devices at the same time
+        Function used to interact with the devices in a concurrent way, using a pool of
+        max_workers threads (see engine.run_concurrently) to get information from the devices at
+        the same time. If parse_workers is specified, the outputs are parsed by a pool of processes
+        while the devices are being read. If export_formats is specified (csv, jsonl, parquet
+        and/or xlsx), the output parsed of each device is exported as soon as the device finishes.
+        If raw_data is True, the script output is saved as JSON Lines, one device at a time, and
+        can be loaded afterwards with load_data_dict.
+        If streaming is True, the outputs of each device are released from memory once they are
+        saved and exported, keeping only a handle to the output files, so the memory used doesn't
+        depend on the number of devices. Since the output parsed is released too, streaming also
+        saves the script output as JSON Lines, to be loaded afterwards with load_data_dict.
+        If store is True, each device is also saved in the client result store, to be queried
+        afterwards (see ResultStore).
         '''
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_list = [executor.submit(device.get_configs, get_configs_info) for device in self.device_list]
-            for future in as_completed(future_list):
-                future.result()
+        self.metrics = METRICS.new_run('get_configs')
+        self.open_stages(parse_workers, export_formats, raw_data, streaming, store=store, flow='get_configs')
+        try:
+            run_concurrently(Device.get_configs, self.device_list, get_configs_info, max_workers=max_workers)
+        finally:
+            self.close_stages()
+            self.save_metrics()
+
+    def replay_configs(self, date: str, get_configs_info: list=None, platform: str=None,
+        parse_workers: int=None, export_formats: list=None, raw_data: bool=False, streaming: bool=False,
+        store: bool=False) -> None:
+        '''
+        Replay a previous run of get configs, from the outputs recorded on a given date (YYYYmmdd),
+        without connecting to the devices. The recorded outputs are parsed and exported again, as
+        in get_concurrent_configs, so the output parsed can be regenerated after a template fix.
+        The device list is replaced by the devices found in the recordings.
+        '''
+
+        replay = Replay(self, platform=platform)
+        self.device_list = replay.create_devices(date, get_configs_info=get_configs_info)
+
+        self.metrics = METRICS.new_run('replay_configs')
+        self.open_stages(parse_workers, export_formats, raw_data, streaming, export_date=date, store=store,
+            flow='replay_configs')
+        try:
+            for device in self.device_list:
+                replay.replay_device(device)
+        finally:
+            self.close_stages()
+            self.save_metrics()
+
+    def discover_devices(self, seed_list: list=None, protocols: list=('CDP', 'LLDP'), max_hops: int=MAX_HOPS,
+        subnets: list=None, max_workers: int=None, export_formats: list=None, raw_data: bool=False,
+        store: bool=False) -> Topology:
+        '''
+        Discover the network from the seed devices (by default, the device list), crawling their
+        CDP and/or LLDP neighbors up to max_hops from the seeds and, if subnets are specified,
+        only inside them (see Discovery). The outputs of the devices visited are saved, exported
+        and stored as in get_concurrent_configs, and the device list is replaced by the devices
+        visited. The inventory is saved in the device_list.csv format, to be used by the other
+        flows, along with the adjacencies found. Returns the topology of the devices found.
+        '''
+
+        discovery = Discovery(self, protocols=protocols, max_hops=max_hops, subnets=subnets,
+            max_workers=max_workers or MAX_WORKERS)
+
+        self.metrics = METRICS.new_run('discovery')
+        # The outputs are parsed by the device threads, since the neighbors are needed right away
+        self.open_stages(None, export_formats, raw_data, False, store=store, flow='discovery')
+        try:
+            self.device_list = discovery.run(seed_list if seed_list is not None else self.device_list)
+        finally:
+            self.close_stages()
+            self.save_metrics()
+
+        self.generate_inventory(discovery.get_inventory())
+        self.generate_discovery_dict(discovery.to_dict())
+        return discovery.get_topology()
+
+    @write_to_file
+    def generate_inventory(self, inventory: list) -> list:
+        return inventory
+
+    @write_to_file
+    def generate_discovery_dict(self, discovery_dict: dict) -> dict:
+        return discovery_dict
+
+    def open_stages(self, parse_workers: int=None, export_formats: list=None, raw_data: bool=False,
+        streaming: bool=False, export_date: str=None, store: bool=False, flow: str=None) -> None:
+        '''
+        Create the stages that parse, export and save the outputs of each device while the run
+        is in progress
+        '''
+
+        if parse_workers:
+            profile_path = self.profiler.path if self.profiler is not None else None
+            self.parse_stage = ParseStage(self.command_list, workers=parse_workers, profile_path=profile_path)
+        if export_formats:
+            self.export_stage = ExportStage(self.dir, export_formats, date=export_date)
+        self.streaming = streaming
+        if raw_data or streaming:
+            self.raw_data_sink = RawDataSink(self.dir)
+            self.raw_data_filename = self.raw_data_sink.filename
+            self.raw_data_sink.write_client(self.generate_client_dict())
+        if store:
+            self.result_store = ResultStore(get_store_filename(self.dir))
+            self.store_run_id = self.result_store.start_run(self.name, flow, raw_data=self.raw_data_filename)
+
+    def close_stages(self) -> None:
+        '''
+        Wait for all outputs to be parsed, exported and saved, and close the stages of the run
+        '''
+
+        if self.parse_stage is not None:
+            self.parse_stage.close()
+            self.parse_stage = None
+        if self.export_stage is not None:
+            self.export_stage.close()
+            self.export_stage = None
+        if self.raw_data_sink is not None:
+            self.raw_data_sink.close()
+            self.raw_data_sink = None
+        if self.result_store is not None:
+            self.result_store.finish_run(self.store_run_id)
+            # Add the MAC address and ARP tables of the run to the endpoint index
+            EndpointLocator(self.result_store).update()
+            self.result_store.close()
+            self.result_store = None
+        self.streaming = False
+
+    def start_profiler(self, name: str) -> None:
+        '''
+        Start profiling the script (and the parse workers created afterwards), until the
+        profiler is stopped. The profiles are saved in outputfiles/Profiles/<datetime>.
+        '''
+
+        self.profiler = SamplingProfiler(get_profile_path(self.dir), name)
+        self.profiler.start()
+
+    def stop_profiler(self) -> None:
+        '''
+        Stop profiling the script and save the profile
+        '''
+
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+
+    def save_metrics(self) -> None:
+        '''
+        Wait for the output files of the run to be written and save the summary of its metrics
+        '''
+
+        self.output_writer.flush()
+        self.metrics.save(self.dir)
     
-    def set_concurrent_configs(self, config_blocks: list) -> None:
+    def set_concurrent_configs(self, config_blocks: list, max_workers: int=None, diff: bool=False,
+        max_age: int=None, on_error: str='continue', chunk_size: int=CHUNK_SIZE) -> None:
         '''
-        Function used to interact with the devices in a concurrent way (using concurrent.futures),
-        takind advantage of threading to get information from the devices at the same time
+        Function used to interact with the devices in a concurrent way, using a pool of
+        max_workers threads (see engine.run_concurrently) to set configurations on the devices at
+        the same time. With diff, only the commands missing in the running configuration of each
+        device are sent (see Device.set_configs). The commands are sent in chunks of chunk_size,
+        and on_error decides if the remaining ones are sent after a command fails.
         '''
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_list = [executor.submit(device.set_configs, config_blocks) for device in self.device_list]
-            for future in as_completed(future_list):
-                future.result()
+        self.metrics = METRICS.new_run('set_configs')
+        # The running configurations are read with the command of the Configuration category, or
+        # from the result store, when recent enough
+        if diff and not hasattr(self, 'command_list'):
+            self.get_commands()
+        owns_result_store = diff and max_age is not None and self.result_store is None and os.path.exists(get_store_filename(self.dir))
+        if owns_result_store:
+            self.result_store = ResultStore(get_store_filename(self.dir))
+        try:
+            run_concurrently(Device.set_configs, self.device_list, config_blocks, max_workers=max_workers,
+                diff=diff, max_age=max_age, on_error=on_error, chunk_size=chunk_size)
+        finally:
+            if owns_result_store:
+                self.result_store.close()
+                self.result_store = None
+            self.save_metrics()
     
-    def generate_concurrent_configs(self, config_blocks: list) -> None:
+    def generate_concurrent_configs(self, config_blocks: list, max_workers: int=None) -> None:
         '''
-        Function used to interact with the devices in a concurrent way (using concurrent.futures),
-        takind advantage of threading to get information from the devices at the same time
+        Function used to generate the device configurations in a concurrent way, using a pool of
+        threads (see engine.run_concurrently). To render the configurations offline, in a pool of
+        processes, see generate_offline_configs.
         '''
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_list = [executor.submit(device.generate_config, config_blocks) for device in self.device_list]
-            for future in as_completed(future_list):
-                future.result()
+        run_concurrently(Device.generate_config, self.device_list, config_blocks, max_workers=max_workers)
+
+    def generate_offline_configs(self, config_blocks: list, processes: int=None, chunk_size: int=None) -> int:
+        '''
+        Generate the configurations of all devices without connecting to them. Rendering is CPU
+        bound, so the device list is split in chunks rendered by a pool of processes (one per core,
+        by default), and each configuration is sent to the output writer as soon as its chunk is
+        finished. Returns the number of configurations generated.
+        '''
+
+        self.metrics = METRICS.new_run('generate_configs')
+        start_time = time.perf_counter()
+        generated = 0
+        try:
+            for device, config, error, seconds in generate_configs(self.device_list, config_blocks, self.j2_data,
+                processes=processes, chunk_size=chunk_size):
+                self.metrics.observe(device.ip_address, 'render', seconds)
+                if error is not None:
+                    print(f"{Colors.NOK_RED}[{device.ip_address}]{Colors.END} Couldn't generate the configuration: {error}")
+                    continue
+                SetConfigs(device).save_config(config)
+                generated += 1
+
+            # The configurations are only generated once they are written
+            self.output_writer.flush()
+            elapsed = time.perf_counter() - start_time
+            print(f"{Colors.OK_GREEN}[>]{Colors.END} {generated} configurations generated in {elapsed:.2f} seconds "
+                f"({generated / elapsed if elapsed else 0:.0f} configs/s)")
+        finally:
+            self.save_metrics()
+        return generated
 
     @write_to_file
     def generate_data_dict(self) -> dict:
@@ -209,122 +462,217 @@ class Client:
 
         print(f"{Colors.OK_GREEN}[>]{Colors.END} Generating script output")
 
+        # Replace the device object list by a device dict list
+        client_dict = self.generate_client_dict()
+        client_dict['device_list'] = [self.generate_device_dict(device_obj) for device_obj in self.device_list]
+        return client_dict
+
+    def load_data_dict(self, filename: str=None) -> dict:
+        '''
+        Load the script output saved as JSON Lines (by default, the one of the last run), in the
+        same structure returned by generate_data_dict. Devices are read from the file lazily.
+        '''
+
+        filename = self.raw_data_filename if filename is None else filename
+        if filename is None:
+            raise Exception('There is no script output saved as JSON Lines for this client')
+        return RawDataReader(filename).to_dict()
+
+    def generate_client_dict(self) -> dict:
+        '''
+        Transform the client object in a dict with only the relevant data, without the devices
+        '''
+
         # Transform client object in dict and remove unnecessary key/values
         client_dict = self.__dict__.copy()
         del client_dict['kdbx_database']
         del client_dict['command_list']
-
-        # Transform device objects in dict and remove unnecessary key/values
-        device_list = []
-        for device_obj in self.device_list:
-            device_dict = device_obj.__dict__.copy()
-            del device_dict['client']
-            del device_dict['credentials']
-            del device_dict['connection']
-
-            # Transform config objects in dict and remove unnecessary key/values
-            config_list = []
-            for config_obj in device_obj.config_list:
-                config_dict = config_obj.__dict__.copy()
-                del config_dict['device']
-                config_list.append(config_dict)
-
-            # Replace the config object list by a config dict list
-            device_dict['config_list'] = config_list
-            device_list.append(device_dict)
-        # Replace the device object list by a device dict list
-        client_dict['device_list'] = device_list
+        del client_dict['command_plans']
+        del client_dict['parse_stage']
+        del client_dict['export_stage']
+        del client_dict['raw_data_sink']
+        del client_dict['result_store']
+        del client_dict['store_run_id']
+        del client_dict['streaming']
+        del client_dict['output_writer']
+        del client_dict['metrics']
+        del client_dict['profiler']
+        del client_dict['progress']
+        del client_dict['owns_session_pool']
+        del client_dict['session_pool']
+        del client_dict['device_list']
         return client_dict
 
-    @write_to_file
-    def generate_config_parsed(self, script_data: dict) -> dict:
+    def generate_device_dict(self, device_obj) -> dict:
         '''
-        Merge output parsed from TextFSM package from all devices in a single file
+        Transform a device object, and its config objects, in a dict with only the relevant data
         '''
 
-        print(f"{Colors.OK_GREEN}[>]{Colors.END} Merging output parsed")
-        output_parsed_dict = {}
+        # Transform device object in dict and remove unnecessary key/values
+        device_dict = device_obj.__dict__.copy()
+        del device_dict['client']
+        del device_dict['credentials']
+        del device_dict['connection']
+        del device_dict['pooled_session']
+        del device_dict['session_failed']
+
+        # Transform config objects in dict and remove unnecessary key/values
+        config_list = []
+        for config_obj in device_obj.config_list:
+            config_dict = config_obj.__dict__.copy()
+            config_dict.pop('device', None)
+            config_list.append(config_dict)
+
+        # Replace the config object list by a config dict list
+        device_dict['config_list'] = config_list
+        return device_dict
+
+    def merge_device_output(self, device: dict) -> dict:
+        '''
+        Merge the output parsed of each config of a device (in dict format), adding the device
+        hostname and IP address to each entry, grouped by information category
+        '''
 
-        for device in script_data['device_list']:
-            merged_output = {
-                'device_hostname': device['hostname'],
-                'device_ip_address': device['ip_address']
-            }
-            for config in device['config_list']:
-                config_info = config.get('info')
-                output_parsed_list = []
-                if config and len(config) > 0 and 'output_parsed' in config.keys() and config['output_parsed']:
-                    for output_parsed in config['output_parsed']:
-                        merged_output.update(output_parsed)
-                        output_parsed_list.append(merged_output.copy())
-                else:
-                    output_parsed_list.append(merged_output)
+        output_parsed_dict = {}
+        merged_output = {
+            'device_hostname': device['hostname'],
+            'device_ip_address': device['ip_address']
+        }
+        for config in device['config_list']:
+            config_info = config.get('info')
+            output_parsed_list = []
+            if config and len(config) > 0 and 'output_parsed' in config.keys() and config['output_parsed']:
+                for output_parsed in config['output_parsed']:
+                    merged_output.update(output_parsed)
+                    output_parsed_list.append(merged_output.copy())
+            else:
+                output_parsed_list.append(merged_output)
             output_parsed_dict.setdefault(config_info, []).extend(output_parsed_list)
 
         return output_parsed_dict
 
-    def generate_graph(self, output_parsed:dict, discovery_protocol:Literal['CDP', 'LLDP']) -> dict:
+    @write_to_file
+    def generate_config_parsed(self, script_data: dict, store: bool=False) -> dict:
         '''
-        Generate a dict variable representing network diagram based on neighbors adjancies
+        Merge output parsed from TextFSM package from all devices in a single file. If store is
+        True, the run is also saved in the client result store.
         '''
+        if store:
+            self.store_data_dict(script_data)
+        return self.merge_config_parsed(script_data)
 
-        if discovery_protocol == 'CDP':
-            output_parsed = output_parsed['Network Diagram CDP']
-        elif discovery_protocol == 'LLDP':
-            output_parsed = output_parsed['Network Diagram LLDP']
+    def store_data_dict(self, script_data: dict, flow: str='import') -> int:
+        '''
+        Save a whole run, from its script data (e.g. loaded with load_data_dict), in the client
+        result store and return the ID of the run
+        '''
 
-        graph = {'nodes': [], 'links': []}
-        for entry in output_parsed:
-            device_ip_address = entry['device_ip_address'] if 'device_ip_address' in entry else ''
-            device_hostname = entry['device_hostname'] if 'device_hostname' in entry else ''
-            remote_ip_address = entry['remote_ip_address'] if 'remote_ip_address' in entry else ''
-            remote_host = entry['remote_host'] if 'remote_host' in entry else ''
-            local_port = entry['local_port'] if 'local_port' in entry else ''
-            remote_port = entry['remote_port'] if 'remote_port' in entry else ''
-
-            graph['nodes'].append({
-                'id': remote_ip_address,
-                'top_label': remote_host,
-                'bottom_label': remote_ip_address
-            })
-            graph['links'].append({
-                'source': device_ip_address, 
-                'target': remote_ip_address,
-                'src_label':local_port,
-                'trgt_label': remote_port
-            })
-        graph['nodes'].append({
-            'id': device_ip_address,
-            'top_label': device_hostname,
-            'bottom_label': device_ip_address
-        })
-
-        print(graph)
-        return graph
+        result_store = ResultStore(get_store_filename(self.dir))
+        try:
+            return result_store.add_script_data(script_data, flow=flow)
+        finally:
+            result_store.close()
 
-    @write_to_file
-    def generate_diagram(self, graph):
+    def merge_config_parsed(self, script_data: dict, info_list: list=None) -> dict:
         '''
-        Generate network diagram in drawio format, based on neighbors adjancies
+        Merge output parsed from TextFSM package from all devices, grouped by information category.
+        If info_list is specified, only those information categories are kept in memory.
         '''
 
-        print(f"{Colors.OK_GREEN}[>]{Colors.END} Generating Network Diagram")
-        diagram = yed_diagram()
-        diagram.from_dict(graph)
-        diagram.layout(algo='tree')
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Merging output parsed")
+        output_parsed_dict = {}
+
+        for device in script_data['device_list']:
+            for config_info, output_parsed_list in self.merge_device_output(device).items():
+                if info_list is None or config_info in info_list:
+                    output_parsed_dict.setdefault(config_info, []).extend(output_parsed_list)
 
-        return diagram
+        return output_parsed_dict
+
+    def device_completed(self, device_obj) -> None:
+        '''
+        Called when all the information of a device was collected and parsed, to save its data and
+        export its output parsed as soon as possible
+        '''
 
+        self.report_progress(device_obj, 'parsed')
+        if self.export_stage is None and self.raw_data_sink is None and self.result_store is None:
+            self.report_progress(device_obj, 'written')
+            return
+
+        device_dict = self.generate_device_dict(device_obj)
+        with self.metrics.timer(device_obj.ip_address, 'write'):
+            # The stored commands point to their output files, read back afterwards (e.g. by the
+            # diff of set configs), so the files must be written before the device is stored
+            if self.result_store is not None:
+                for config in device_obj.config_list:
+                    self.output_writer.wait(getattr(config, 'output_file', None))
+            if self.raw_data_sink is not None:
+                self.raw_data_sink.write_device(device_dict)
+            if self.export_stage is not None:
+                self.export_stage.export_rows(self.merge_device_output(device_dict))
+            if self.result_store is not None:
+                self.result_store.add_device(self.store_run_id, device_dict)
+
+        self.report_progress(device_obj, 'written')
+
+        # Release the outputs, already saved and exported, from memory
+        if self.streaming:
+            device_obj.release_configs()
+
+    def report_progress(self, device_obj, state: str, detail: str=None) -> None:
+        '''
+        Report the state of a device (e.g. connected, collecting, parsed, written or failed) to
+        whoever is following the progress of the run
+        '''
 
+        if self.progress is not None:
+            self.progress(device_obj.ip_address, state, detail)
 
+    def generate_graph(self, output_parsed:dict, discovery_protocol:Literal['CDP', 'LLDP']) -> Topology:
+        '''
+        Generate the network topology based on neighbors adjancies, with a single node per device
+        and a single link per adjacency, even when reported by both ends
+        '''
 
+        if discovery_protocol == 'CDP':
+            output_parsed = output_parsed['Network Diagram CDP']
+        elif discovery_protocol == 'LLDP':
+            output_parsed = output_parsed['Network Diagram LLDP']
 
+        topology = Topology()
+        topology.add_neighbors(output_parsed, protocol=discovery_protocol)
 
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Network topology with {len(topology.nodes)} devices and {len(topology.links)} links")
+        return topology
 
+    @write_to_file
+    def generate_diagram(self, graph, partition_by: Literal['component', 'site', 'subnet']=None,
+        max_nodes: int=DIAGRAM_MAX_NODES) -> dict:
+        '''
+        Generate network diagrams in yEd format (.graphml), based on neighbors adjancies. Topologies
+        with more than max_nodes devices (or whenever partition_by is specified) are partitioned by
+        connected component, site or subnet, with a diagram per partition, so the layout of each
+        diagram stays fast. Returns the diagrams by partition name.
+        '''
 
+        from N2G import yed_diagram
 
+        topology = graph if isinstance(graph, Topology) else Topology.from_graph(graph)
+        if partition_by is None and len(topology.nodes) <= max_nodes:
+            partitions = {'': topology}
+        else:
+            partitions = topology.partition(by=partition_by or 'component', max_nodes=max_nodes)
 
+        diagrams = {}
+        for name, partition in partitions.items():
+            print(f"{Colors.OK_GREEN}[>]{Colors.END} Generating Network Diagram {name}".rstrip())
+            diagram = yed_diagram()
+            diagram.from_dict(partition.to_graph())
+            diagram.layout(algo='tree')
+            diagrams[name] = diagram
 
+        return diagrams
 
     def generate_config_report(self):
         ''' Generate report for commands executed on the device'''
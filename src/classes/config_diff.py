@@ -0,0 +1,289 @@
+import re
+from .locator import normalize_port
+from .port_range import expand_ports, port_ranges
+
+
+# vendor_os with hierarchical configurations (commands indented under sections), diffed section
+# by section. The configurations of the other vendors are diffed line by line.
+HIERARCHICAL_VENDORS = ('cisco_ios', 'cisco_nxos')
+# Lines that aren't commands: comments and the banners of the show commands
+IGNORED_LINES = re.compile(r'^(!|#|Building configuration|Current configuration|end$|exit$)')
+# Commands that start a section, followed by the commands of the section (the rendered
+# configurations aren't indented, so the sections are recognized by their first command)
+SECTION_PATTERN = re.compile(r'^(interface|router|line|vlan \d+|ip access-list|ipv6 access-list|ip vrf|vrf definition|'
+    r'vrf context|class-map|policy-map|route-map|key chain|aaa group|archive|ip dhcp pool|spanning-tree mst configuration|'
+    r'control-plane|redundancy|object-group|track|crypto pki trustpoint)\b')
+# Commands followed by the text of a banner, until an empty line (configure banner of
+# extreme_exos) or until the delimiter that follows the command (banner motd ^C of cisco)
+BANNER_PATTERN = re.compile(r'^(configure banner \S+|banner \S+)(.*)$')
+# Port list of the flat configurations (e.g. configure vlan 10 add ports 1:1-24,2:1 tagged)
+PORT_LIST_PATTERN = re.compile(r'\bports? ((?:\d+:)?\d+(?:-\d+)?(?:,(?:\d+:)?\d+(?:-\d+)?)*)(?=\s|$)')
+
+
+def get_lines(config: str) -> list:
+    '''
+    Get the commands of a configuration, without comments and with the spaces normalized
+    '''
+
+    line_list = []
+    for line in config.splitlines():
+        line = ' '.join(line.split())
+        if line and not IGNORED_LINES.match(line):
+            line_list.append(line)
+    return line_list
+
+
+def get_banner(line_list: list, index: int) -> tuple:
+    '''
+    Get the banner that starts at the given line of a configuration, if there's one. Returns the
+    command (e.g. configure banner before-login), the text of the banner, its lines as they must be
+    sent (terminator included) and the index of the line that follows the banner.
+    '''
+
+    match = BANNER_PATTERN.match(line_list[index])
+    if match is None:
+        return None
+    command, rest = match.group(1), match.group(2).strip()
+    block = [line_list[index]]
+    text = []
+    index += 1
+    if command.startswith('configure '):
+        # The text ends with an empty line, added if the configuration ends with the banner
+        while index < len(line_list) and line_list[index].strip():
+            block.append(line_list[index])
+            text.append(line_list[index])
+            index += 1
+        block.append('')
+        index += 1
+    else:
+        delimiter = rest[:2] if rest.startswith('^C') else rest[:1]
+        first_line = rest[len(delimiter):]
+        if delimiter and delimiter in first_line:
+            text.append(first_line.split(delimiter)[0])
+        else:
+            text.append(first_line)
+            while index < len(line_list) and (not delimiter or delimiter not in line_list[index]):
+                block.append(line_list[index])
+                text.append(line_list[index])
+                index += 1
+            if index < len(line_list):
+                block.append(line_list[index])
+                text.append(line_list[index].split(delimiter)[0])
+                index += 1
+    return command, '\n'.join(line.rstrip() for line in text).strip('\n'), block, index
+
+
+def split_banners(config: str) -> tuple:
+    '''
+    Split the banners from the other lines of a configuration, since the text of a banner isn't
+    made of commands. Returns the configuration without the banners and the banners by command,
+    each one with its text, used to compare the banners, and its lines as they must be sent.
+    '''
+
+    line_list = config.splitlines()
+    other_lines = []
+    banners = {}
+    index = 0
+    while index < len(line_list):
+        banner = get_banner(line_list, index)
+        if banner is None:
+            other_lines.append(line_list[index])
+            index += 1
+            continue
+        command, text, block, index = banner
+        banners[command] = (text, block)
+    return '\n'.join(other_lines), banners
+
+
+def is_configured(line: str, line_set: set) -> bool:
+    '''
+    Check if a command is already in the configuration. The "no" commands are configured when
+    the command they negate isn't (e.g. no shutdown, never shown by the running configuration).
+    '''
+
+    if line in line_set:
+        return True
+    if line.startswith('no '):
+        command = line[3:]
+        return not any(other == command or other.startswith(f"{command} ") for other in line_set)
+    return False
+
+
+def get_section_key(header: str) -> str:
+    '''
+    Get the key used to compare the sections, so interface names match when abbreviated
+    '''
+
+    if header.startswith('interface '):
+        return f"interface {normalize_port(header[10:])}"
+    return header
+
+
+def parse_running_config(config: str) -> tuple:
+    '''
+    Parse a hierarchical running configuration into its top level commands and the commands of
+    each section (by section key). Commands of nested sections are kept in their top level section.
+    '''
+
+    top_level = set()
+    sections = {}
+    children = None
+    for raw_line in config.splitlines():
+        line = ' '.join(raw_line.split())
+        if not line or IGNORED_LINES.match(line):
+            continue
+        if raw_line[0].isspace() and children is not None:
+            children.add(line)
+        else:
+            top_level.add(line)
+            children = sections.setdefault(get_section_key(line), set())
+    return top_level, sections
+
+
+def parse_intent(config: str) -> list:
+    '''
+    Parse a rendered configuration into a list of (command, None) for the top level commands and
+    (header, commands) for the sections
+    '''
+
+    entry_list = []
+    section = None
+    for line in get_lines(config):
+        if SECTION_PATTERN.match(line):
+            section = (line, [])
+            entry_list.append(section)
+        elif section is None:
+            entry_list.append((line, None))
+        else:
+            section[1].append(line)
+    return entry_list
+
+
+def expand_interfaces(header: str) -> list:
+    '''
+    Get the interfaces configured by an interface (or interface range) header
+    '''
+
+    interfaces = header[10:]
+    if interfaces.startswith('range '):
+        interfaces = interfaces[6:]
+    try:
+        return expand_ports(interfaces)
+    except ValueError:
+        return [interfaces]
+
+
+def get_interface_headers(interfaces: list, vendor_os: str) -> list:
+    '''
+    Get the headers configuring a list of interfaces, by interface range whenever possible
+    '''
+
+    try:
+        ranges = port_ranges(interfaces, vendor_os)
+    except ValueError:
+        return [f"interface {interface}" for interface in interfaces]
+    # Only cisco_ios needs the range keyword to configure many interfaces at once
+    return [f"interface range {ports}" if vendor_os == 'cisco_ios' and re.search(r'[,-]', ports) else f"interface {ports}"
+        for ports in ranges]
+
+
+def diff_hierarchical(intent: str, running_config: str, vendor_os: str) -> list:
+    '''
+    Get the commands of the intent missing in a hierarchical running configuration. Sections
+    already configured only get their missing commands, and the interfaces missing the same
+    commands are configured together, by interface range.
+    '''
+
+    top_level, sections = parse_running_config(running_config)
+    delta = []
+    # Missing commands of the interfaces, configured where the first interface of the intent is
+    interfaces = {}
+    interfaces_index = None
+
+    for header, children in parse_intent(intent):
+        if children is None:
+            if not is_configured(header, top_level):
+                delta.append(header)
+                # The same command may be rendered by more than one block
+                top_level.add(header)
+            continue
+
+        headers = [f"interface {interface}" for interface in expand_interfaces(header)] if header.startswith('interface ') else [header]
+        for header in headers:
+            section = sections.get(get_section_key(header))
+            # Commands of the intent may be global commands, accepted by the device inside a section
+            missing = children if section is None else [child for child in children
+                if not is_configured(child, section) and child not in top_level]
+            if section is not None and not missing:
+                continue
+            if header.startswith('interface '):
+                if interfaces_index is None:
+                    interfaces_index = len(delta)
+                interfaces.setdefault(tuple(missing), []).append(header[10:])
+            else:
+                delta.append(header)
+                delta.extend(missing)
+
+    if interfaces:
+        interface_delta = []
+        for missing, interface_list in interfaces.items():
+            for header in get_interface_headers(interface_list, vendor_os):
+                interface_delta.append(header)
+                interface_delta.extend(missing)
+        delta[interfaces_index:interfaces_index] = interface_delta
+    return delta
+
+
+def diff_flat(intent: str, running_config: str, vendor_os: str) -> list:
+    '''
+    Get the commands of the intent missing in a flat running configuration. Commands with a port
+    list are compared port by port, so only the ports missing are configured.
+    '''
+
+    line_set = set()
+    # Ports of each command with a port list, by the text before and after the port list
+    port_commands = {}
+    for line in get_lines(running_config):
+        line_set.add(line)
+        match = PORT_LIST_PATTERN.search(line)
+        if match:
+            key = (line[:match.start(1)], line[match.end(1):])
+            port_commands.setdefault(key, set()).update(expand_ports(match.group(1)))
+
+    delta = []
+    for line in get_lines(intent):
+        if is_configured(line, line_set):
+            continue
+        match = PORT_LIST_PATTERN.search(line)
+        if match is None:
+            delta.append(line)
+            # The same command may be rendered by more than one block
+            line_set.add(line)
+            continue
+        key = (line[:match.start(1)], line[match.end(1):])
+        configured = port_commands.setdefault(key, set())
+        missing = [port for port in expand_ports(match.group(1)) if port not in configured]
+        delta.extend(f"{key[0]}{ports}{key[1]}" for ports in port_ranges(missing, vendor_os))
+        configured.update(missing)
+    return delta
+
+
+def diff_config(intent: str, running_config: str, vendor_os: str) -> str:
+    '''
+    Get the commands of the rendered configuration (intent) that aren't in the running
+    configuration yet, in the order they must be sent. The configuration is additive, so commands
+    of the running configuration not in the intent are kept. Banners are compared as a whole and,
+    when different, sent first, as they are. Returns an empty string if the running configuration
+    already has the whole intent.
+    '''
+
+    intent, banners = split_banners(intent)
+    running_config, running_banners = split_banners(running_config)
+    banner_delta = [line for command, (text, block) in banners.items()
+        if command not in running_banners or running_banners[command][0] != text for line in block]
+
+    if vendor_os in HIERARCHICAL_VENDORS:
+        delta = diff_hierarchical(intent, running_config, vendor_os)
+    else:
+        delta = diff_flat(intent, running_config, vendor_os)
+    return '\n'.join(banner_delta + delta)
@@ -0,0 +1,72 @@
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator
+from .configs import render_config
+
+
+# Maximum number of devices rendered by each task sent to the workers
+MAX_CHUNK_SIZE = 256
+# Tasks submitted per worker, so the configurations are received as they are rendered
+CHUNKS_PER_WORKER = 4
+
+# YAML data used by the generation worker, received once when the worker starts
+WORKER_J2_DATA = None
+
+
+def init_worker(j2_data: dict) -> None:
+    '''
+    Initialize a generation worker with the YAML data, so it isn't sent again with each chunk
+    '''
+
+    global WORKER_J2_DATA
+    WORKER_J2_DATA = j2_data
+
+
+def render_chunk(device_list: list, config_blocks: list) -> list:
+    '''
+    Render the configurations of a chunk of devices (vendor_os and IP address), returning, for
+    each one, the configuration (or the error that prevented it) and the time spent rendering it.
+    Runned by the generation workers.
+    '''
+
+    results = []
+    for vendor_os, ip_address in device_list:
+        start_time = time.perf_counter()
+        try:
+            config, error = render_config(vendor_os, ip_address, config_blocks, WORKER_J2_DATA), None
+        except Exception as exception:
+            config, error = None, f"{type(exception).__name__}: {exception}"
+        results.append((config, error, time.perf_counter() - start_time))
+    return results
+
+
+def generate_configs(device_list: list, config_blocks: list, j2_data: dict, processes: int=None,
+    chunk_size: int=None) -> Iterator[tuple]:
+    '''
+    Render the configurations of the devices in a pool of processes, yielding the device, its
+    configuration (or None), the error (if any) and the time spent rendering it, as each chunk
+    of devices is finished. The devices are sent to the workers as (vendor_os, IP address), since
+    the device objects can't be shared between processes.
+    '''
+
+    if not device_list:
+        return
+    processes = processes or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = min(MAX_CHUNK_SIZE, math.ceil(len(device_list) / (processes * CHUNKS_PER_WORKER)))
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(j2_data,)) as executor:
+        chunks = {}
+        for index in range(0, len(device_list), chunk_size):
+            chunk = device_list[index:index + chunk_size]
+            future = executor.submit(render_chunk, [(device.vendor_os, device.ip_address) for device in chunk], config_blocks)
+            chunks[future] = chunk
+
+        pending = set(chunks)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for device, (config, error, seconds) in zip(chunks.pop(future), future.result()):
+                    yield device, config, error, seconds
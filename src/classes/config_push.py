@@ -0,0 +1,157 @@
+import re
+import time
+from .config_diff import get_banner
+
+
+# Lines sent to the device at once, before waiting for their output
+CHUNK_SIZE = 50
+# Seconds to wait for the output of each chunk
+READ_TIMEOUT = 60
+# Seconds between reads of the channel, while waiting for the output of a chunk
+READ_INTERVAL = 0.01
+# What to do when a line fails: stop sending the configuration, or send the remaining lines
+ERROR_POLICIES = ('stop', 'continue')
+# Output of the devices when a line of the configuration fails, by vendor_os
+ERROR_PATTERNS = {
+    'cisco_ios': r'^\s*% ?(Invalid input|Incomplete command|Ambiguous command|Unrecognized command|Unknown command|Bad mask|Error)',
+    'cisco_nxos': r'^\s*% ?(Invalid|Incomplete command|Ambiguous command|Error)|^\s*ERROR:',
+    'extreme_exos': r'^\s*(Error:|%% ?(Invalid input|Incomplete command|Ambiguous command|Unrecognized command))',
+    'extreme': r'^\s*(Error:|%% ?(Invalid input|Incomplete command|Ambiguous command|Unrecognized command))',
+}
+DEFAULT_ERROR_PATTERN = r'^\s*(%|Error:|ERROR:)'
+# Lines not sent to the device: comments (empty lines are sent, since they end some input blocks)
+IGNORED_LINE = re.compile(r'^\s*[!#]')
+
+
+class ConfigPush():
+    '''
+    Class used to send a configuration to a device in chunks of lines. The lines of each chunk are
+    written at once, without waiting for the echo of each line, and the output of the chunk is
+    read until the device shows a prompt for each line. The output between two prompts belongs to
+    a single line, so the line that failed is known exactly. Banners are sent as a single block,
+    since the device only shows a prompt after their last line. Lines of a chunk after the failing
+    line were already sent, so the stop policy only prevents the following chunks.
+    '''
+
+    def __init__(self, connection, vendor_os: str, chunk_size: int=CHUNK_SIZE, on_error: str='continue',
+        read_timeout: float=READ_TIMEOUT):
+        '''
+        Constructor used to create a new push over an established netmiko connection
+        '''
+        if on_error not in ERROR_POLICIES:
+            raise ValueError(f"Unknown error policy: {on_error}")
+        self.connection = connection
+        self.vendor_os = vendor_os
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.read_timeout = read_timeout
+        self.error_pattern = re.compile(ERROR_PATTERNS.get(vendor_os, DEFAULT_ERROR_PATTERN), flags=re.M)
+        # Prompt shown after each line, in any configuration mode (e.g. sw(config-if)#)
+        self.prompt_pattern = re.compile(rf"(?:^|[\r\n])\*? ?{re.escape(connection.base_prompt)}[^\r\n#>]*[#>]")
+        self.output = ''
+        self.errors = []
+        self.lines_sent = 0
+        self.elapsed = 0.0
+        # Set when the device didn't show all the prompts expected, leaving output unread
+        self.timed_out = False
+
+    def run(self, config: str) -> str:
+        '''
+        Send the configuration, chunk by chunk, in configuration mode. Returns the output of the
+        device, while the failed lines (line number in the configuration, command and output) are
+        kept in errors.
+        '''
+
+        line_list = self.get_blocks(config)
+        start_time = time.perf_counter()
+        self.output += self.connection.config_mode()
+        try:
+            for index in range(0, len(line_list), self.chunk_size):
+                chunk = line_list[index:index + self.chunk_size]
+                errors = self.send_chunk(chunk)
+                self.errors.extend(errors)
+                if errors and self.on_error == 'stop':
+                    break
+        finally:
+            self.output += self.connection.exit_config_mode()
+            self.elapsed = time.perf_counter() - start_time
+        return self.output
+
+    def get_blocks(self, config: str) -> list:
+        '''
+        Split the configuration in blocks followed by a single prompt: a line, or all the lines of
+        a banner. Each block is kept with the number of its first line in the configuration, used
+        to report the failed lines.
+        '''
+
+        config_lines = config.split('\n')
+        line_list = []
+        index = 0
+        while index < len(config_lines):
+            banner = get_banner(config_lines, index)
+            if banner is not None:
+                block, next_index = banner[2], banner[3]
+                line_list.append((index + 1, block))
+                index = next_index
+                continue
+            if not IGNORED_LINE.match(config_lines[index]):
+                line_list.append((index + 1, [config_lines[index]]))
+            index += 1
+        return line_list
+
+    def send_chunk(self, chunk: list) -> list:
+        '''
+        Write the blocks of a chunk (list of line number and lines) at once and check the output
+        of each block, returning the lines that failed
+        '''
+
+        self.connection.write_channel(''.join(self.connection.normalize_cmd(line) for _, block in chunk for line in block))
+        output, prompts = self.read_prompts(len(chunk))
+        self.output += output
+        self.lines_sent += sum(len(block) for _, block in chunk[:prompts])
+
+        errors = []
+        # Output of each block: from its echo until the prompt that follows it
+        for index, block_output in enumerate(self.prompt_pattern.split(output)[:len(chunk)]):
+            match = self.error_pattern.search(block_output)
+            if match:
+                number, block = chunk[index]
+                # Line of the output with the error message
+                message = block_output[match.start():].strip().splitlines()[0]
+                errors.append({'line': number, 'command': block[0].strip(), 'output': message})
+        # The device stopped answering, waiting for the block after the last prompt
+        if prompts < len(chunk):
+            self.timed_out = True
+            number, block = chunk[prompts]
+            errors.append({'line': number, 'command': block[0].strip(), 'output': f"No prompt after {self.read_timeout} seconds"})
+        return errors
+
+    def read_prompts(self, count: int) -> tuple:
+        '''
+        Read the channel until the device shows the given number of prompts (or the timeout),
+        returning the output and the number of prompts shown
+        '''
+
+        output = ''
+        deadline = time.monotonic() + self.read_timeout
+        while True:
+            output += self.connection.read_channel()
+            prompts = len(self.prompt_pattern.findall(output))
+            if prompts >= count or time.monotonic() > deadline:
+                return output, prompts
+            time.sleep(READ_INTERVAL)
+
+    def get_status(self) -> str:
+        '''
+        Get the status of the push: Done, or the first line that failed
+        '''
+
+        if not self.errors:
+            return 'Done'
+        error = self.errors[0]
+        if self.on_error == 'stop':
+            return f"Error at line {error['line']}: {error['command']}"
+        return f"{len(self.errors)} errors, first at line {error['line']}: {error['command']}"
+
+    def get_lines_per_second(self) -> float:
+        return self.lines_sent / self.elapsed if self.elapsed else 0.0
@@ -1,9 +1,94 @@
-import textfsm
-from datetime import datetime
-from netmiko.utilities import get_structured_data
-#from OuiLookup import OuiLookup
+import os
+from datetime import datetime, timedelta
 from .colors import Colors 
+from .config_diff import diff_config
+from .config_push import CHUNK_SIZE, ConfigPush
 from .decorators import write_to_file
+from .j2_cache import BASE_TEMPLATE, J2_CACHE
+from .oui_index import get_oui_index
+from .textfsm_cache import TEMPLATE_CACHE
+
+
+# List of characters used by devices to comment a line
+COMMENT_CHARS = {
+    'cisco_ios': '!',
+    'extreme': '!',
+    'extreme_exos': '#'
+}
+
+
+def post_process_output(vendor_os: str, info: str, output_parsed: list) -> list:
+    '''
+    Apply the post-processing specific to the vendor and information category to the output
+    parsed by TextFSM. This function doesn't depend on the device object, so it can also be
+    runned by the parse workers.
+    '''
+
+    # For the extreme OS, consider all entries where the protocol is equal to CDP
+    if vendor_os == 'extreme' and info == 'CDP Neighbors':
+        output_parsed_tmp = []
+        for item in output_parsed:
+            if item.get('protocol') == 'ciscodp' or item.get('protocol') == 'Ci':
+                del item['protocol']
+                output_parsed_tmp.append(item)
+        output_parsed = output_parsed_tmp
+    # For the extreme OS, consider all entries where the protocol is equal to LLDP
+    elif vendor_os == 'extreme' and info == 'CDP Neighbors':
+        output_parsed_tmp = []
+        for item in output_parsed:
+            if item.get('protocol') == 'lldp' or item.get('protocol') == 'LL':
+                del item['protocol']
+                output_parsed_tmp.append(item)
+        output_parsed = output_parsed_tmp
+
+    # For the extreme EXOS, split the switch-stacks into multiple entries
+    elif vendor_os == 'extreme_exos' and info == 'Device Information':
+        output_parsed_tmp = []
+        # For each device in the stack, create a new entry
+        for entry in output_parsed:
+            serial_numbers = entry['serial_number']
+            hardware_items = entry['hardware']
+            # Create a new entry for each combination of serial number and hardware item
+            for serial_number, hardware_item in zip(serial_numbers, hardware_items):
+                new_entry = {
+                    'location': entry['location'],
+                    'mac_addr': entry['mac_addr'],
+                    'current_time': entry['current_time'],
+                    'last_boot': entry['last_boot'],
+                    'uptime': entry['uptime'],
+                    'version': entry['version'],
+                    'serial_number': serial_number,
+                    'hardware': hardware_item,
+                }
+                output_parsed_tmp.append(new_entry)
+        output_parsed = output_parsed_tmp
+
+    return output_parsed
+
+
+def render_config(vendor_os: str, ip_address: str, config_blocks: list, j2_data: dict, template=None) -> str:
+    '''
+    Render the configuration of a device from the base template, with the configuration blocks
+    requested. This function doesn't depend on the device object, so it can also be runned by the
+    offline generation workers.
+    '''
+
+    data = {
+        'config_blocks': config_blocks,
+        'vendor_os': vendor_os,
+        'ip_address': ip_address,
+        'timestamp': datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+        'comment_char': COMMENT_CHARS[vendor_os],
+        **j2_data
+    }
+
+    # Each block is rendered once for all devices with the same values of the variables it uses,
+    # and spliced in the base template, rendered for each device
+    template = J2_CACHE.get_template(BASE_TEMPLATE) if template is None else template
+    rendered_blocks = {block: J2_CACHE.render_block(vendor_os, block, data) for block in config_blocks}
+    config = template.render(data, rendered_blocks=rendered_blocks)
+    return '\n'.join(line.strip() for line in config.split('\n'))
+
 
 class Configs:
     '''
@@ -39,32 +124,70 @@ class SetConfigs(Configs):
         templates accordingly 
         '''
 
-        # List of characters used by devices to comment a line
-        comment_char = {
-            'cisco_ios': '!',
-            'extreme': '!',
-            'extreme_exos': '#'
-        }
-
-        data = {
-            'config_blocks': config_blocks,
-            'vendor_os': self.device.vendor_os,
-            'ip_address': self.device.ip_address,
-            'timestamp': datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
-            'comment_char': comment_char[self.device.vendor_os],
-            **j2_data
-        }
-        
-        config = self.device.client.j2_template.render(data)
-        self.config = '\n'.join(line.strip() for line in config.split('\n'))
+        self.config = render_config(self.device.vendor_os, self.device.ip_address, config_blocks, j2_data,
+            self.device.client.j2_template)
         return self.config
 
-    ### TO BE DONE: Check if configuration was successfully applied to the device
     @write_to_file
-    def send_config(self, data: str) -> str:
+    def save_config(self, config: str) -> str:
         '''
-        Send new configurations to the device, in a text format. The function will then split the
-        text configuration into a list of commands.
+        Save a configuration already rendered (e.g. by the offline generation workers), as if it
+        was generated by render_template
+        '''
+
+        self.config = config
+        return self.config
+
+    def get_running_config(self) -> str:
+        '''
+        Get the running configuration of the device, with the command of the Configuration
+        information category, saved as the get configs outputs
+        '''
+
+        command = self.device.client.command_list['Configuration']['commands'][self.device.vendor_os][0]
+        get_config = GetConfigs(self.device, info='Configuration')
+        output = get_config.get_config(command=command)
+        if output is None or getattr(get_config, 'status', None) != 'Done':
+            raise Exception(f"[{self.device.ip_address}] Couldn't get the running configuration")
+        return output
+
+    def get_stored_running_config(self, max_age: int) -> str|None:
+        '''
+        Get the running configuration collected by a get configs run in the result store, if it
+        isn't older than max_age seconds, so the device doesn't need to be connected to compute
+        the configuration to be sent
+        '''
+
+        result_store = self.device.client.result_store
+        if result_store is None:
+            return None
+        since = (datetime.now() - timedelta(seconds=max_age)).isoformat(timespec='seconds')
+        command = result_store.get_latest_output(self.device.ip_address, 'Configuration', since=since)
+        # The output may still be written in the background, by the writer of this client
+        if command is None or not self.device.client.output_writer.wait(command['output_file']) or \
+            not os.path.exists(command['output_file']):
+            return None
+        with open(command['output_file'], mode='r', encoding='utf-8') as file:
+            return file.read()
+
+    @write_to_file
+    def diff_running_config(self, config: str, running_config: str) -> str:
+        '''
+        Get the commands of the configuration missing in the running configuration of the device
+        (see config_diff.diff_config), the only ones to be sent
+        '''
+
+        self.config = diff_config(config, running_config, self.device.vendor_os)
+        return self.config
+
+    @write_to_file
+    def send_config(self, data: str, chunk_size: int=CHUNK_SIZE, on_error: str='continue') -> str:
+        '''
+        Send new configurations to the device, in a text format. The commands are sent in chunks,
+        without waiting for the echo of each command, and the output of each chunk is checked for
+        errors (see config_push.ConfigPush). When a command fails, the remaining chunks are sent
+        or not, according to on_error (continue or stop), and the configuration is only saved if
+        all of them are sent.
         '''
 
         # Connection to the device couln't be made
@@ -77,24 +200,33 @@ class SetConfigs(Configs):
             print(f"{Colors.OK_YELLOW}[{self.device.ip_address}]{Colors.END} Connecting again to the device")
 
         try:
-            # Apply configuration on the device, sending a list of commands
+            # Apply configuration on the device, sending the commands in chunks
             print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Applying configuration")
-            x = data.split('\n')
-            print(x)
-            self.output = self.device.connection.send_config_set(data.split('\n'))
+            metrics = self.device.client.metrics
+            push = ConfigPush(self.device.connection, self.device.vendor_os, chunk_size=chunk_size, on_error=on_error)
+            with metrics.timer(self.device.ip_address, 'command', command='send_config_set'):
+                self.output = push.run(data)
+            self.errors = push.errors
+            self.status = push.get_status()
+            # The device stopped answering in the middle of the configuration
+            if push.timed_out:
+                self.device.session_failed = True
+            print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Sent {push.lines_sent} lines in "
+                f"{push.elapsed:.2f} seconds ({push.get_lines_per_second():.0f} lines/s)")
+            for error in push.errors:
+                print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Error at line {error['line']}: "
+                    f"{error['command']} ({error['output']})")
 
-            # Method save_config doesn't work in extreme devices
-            if self.device.vendor_os == 'extreme':
+            # Method save_config doesn't work in extreme devices. A stopped configuration isn't
+            # saved, so the device goes back to the saved configuration when reloaded.
+            if self.device.vendor_os == 'extreme' or (push.errors and on_error == 'stop'):
                 pass
             else:
-                self.device.connection.save_config()
-            self.status = "Done"
-
-            if 'Invalid input detected' in self.output:
-                print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Command not found: {data}")
-                self.status = 'Command not found'
+                with metrics.timer(self.device.ip_address, 'save_config'):
+                    self.device.connection.save_config()
 
         except Exception as exception:
+            self.device.session_failed = True
             if 'Pattern not detected' in str(exception):
                 print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Pattern not detected on command: {data}")
                 self.status = f"Error running command: {data}"
@@ -121,6 +253,7 @@ class GetConfigs(Configs):
         Get configurations from the device, running a "show" command and parsing the output
         whenever possible
         '''
+        self.command = command
 
         # Connection to the device couln't be made
         if self.device.connection == None:
@@ -135,7 +268,8 @@ class GetConfigs(Configs):
             print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Getting configuration: {command}")
             # For commands with bigger output, increase the read_timeout
             read_timeout = 600 if self.info == 'Configuration' else 100
-            self.output = self.device.connection.send_command_expect(command, read_timeout=read_timeout, expect_string=expect_string)
+            with self.device.client.metrics.timer(self.device.ip_address, 'command', command=command):
+                self.output = self.device.connection.send_command_expect(command, read_timeout=read_timeout, expect_string=expect_string)
             self.status = "Done"
 
             if 'Invalid input detected' in self.output:
@@ -143,6 +277,8 @@ class GetConfigs(Configs):
                 self.status = 'Command not found'
 
         except Exception as exception:
+            # The output of the command may still be unread, so the session can't be reused
+            self.device.session_failed = True
             if 'Pattern not detected' in str(exception):
                 print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Pattern not detected on command: {command}")
                 self.status = f"Error running command: {command}"
@@ -151,68 +287,101 @@ class GetConfigs(Configs):
 
         return self.output
     
-    def parse_output(self, **kwargs) -> list|None:
+    @write_to_file
+    def share_output(self, config, command: str) -> str:
+        '''
+        Reuse the output of a command already runned on the device by another information
+        category, so the same command doesn't need to be sent to the device again
+        '''
+
+        self.command = command
+        self.status = getattr(config, 'status', self.device.status)
+        if hasattr(config, 'output'):
+            self.output = config.output
+            return self.output
+        return None
+
+    def structure_output(self, **kwargs) -> list|None:
         '''
-        Use TextFSM to parse the output of the command. The get_structured_data receives the raw
-        output, device platform and command issued.
+        Use TextFSM to convert the raw output of the command into a list of entries. The template
+        cache receives the raw output, device platform and command issued.
         '''
         try:
-            print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Parsing output: {kwargs['command']}")
-            self.output_parsed = get_structured_data(**kwargs)
-            # Delete output_parsed variable since output couldn't be converted
-            if isinstance(self.output_parsed, str):
-                print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Couldn't parse the output of the command: {kwargs['command']}")
-                del self.output_parsed
+            structured_output = TEMPLATE_CACHE.parse(**kwargs)
+            # Output couldn't be converted
+            if isinstance(structured_output, str):
                 return None
-            
-            # For the extreme OS, consider all entries where the protocol is equal to CDP
-            if self.device.vendor_os == 'extreme' and self.info == 'CDP Neighbors':
-                output_parsed_tmp = []
-                for item in self.output_parsed:
-                    if item.get('protocol') == 'ciscodp' or item.get('protocol') == 'Ci':
-                        del item['protocol']
-                        output_parsed_tmp.append(item)
-                self.output_parsed = output_parsed_tmp
-            # For the extreme OS, consider all entries where the protocol is equal to LLDP
-            elif self.device.vendor_os == 'extreme' and self.info == 'CDP Neighbors':
-                output_parsed_tmp = []
-                for item in self.output_parsed:
-                    if item.get('protocol') == 'lldp' or item.get('protocol') == 'LL':
-                        del item['protocol']
-                        output_parsed_tmp.append(item)
-                self.output_parsed = output_parsed_tmp
-            
-            # For the extreme EXOS, split the switch-stacks into multiple entries
-            elif self.device.vendor_os == 'extreme_exos' and self.info == 'Device Information':
-                output_parsed_tmp = []
-                # For each device in the stack, create a new entry
-                for entry in self.output_parsed:
-                    serial_numbers = entry['serial_number']
-                    hardware_items = entry['hardware']
-                    # Create a new entry for each combination of serial number and hardware item
-                    for serial_number, hardware_item in zip(serial_numbers, hardware_items):
-                        new_entry = {
-                            'location': entry['location'],
-                            'mac_addr': entry['mac_addr'],
-                            'current_time': entry['current_time'],
-                            'last_boot': entry['last_boot'],
-                            'uptime': entry['uptime'],
-                            'version': entry['version'],
-                            'serial_number': serial_number,
-                            'hardware': hardware_item,
-                        }
-                        output_parsed_tmp.append(new_entry)
-                self.output_parsed = output_parsed_tmp
+            return structured_output
 
+        except Exception as exception:
+            print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Couldn't parse the output of the command: {kwargs['command']}")
+            print(exception)
+
+    def parse_output(self, command: str, structured_output: list|None) -> list|None:
+        '''
+        Apply to the output structured by TextFSM the post-processing specific to the vendor and
+        information category. Since the structured output can be shared by several categories,
+        the entries are copied before being changed.
+        '''
+        try:
+            print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Parsing output: {command}")
+            # Output couldn't be converted
+            if structured_output is None:
+                print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Couldn't parse the output of the command: {command}")
+                return None
+            self.output_parsed = [dict(entry) for entry in structured_output]
+            
+            self.output_parsed = post_process_output(self.device.vendor_os, self.info, self.output_parsed)
             return self.output_parsed
 
         except Exception as exception:
-            print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Couldn't parse the output of the command: {kwargs['command']}")
+            print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Couldn't parse the output of the command: {command}")
             print(exception)
     
-    def get_mac_vendor(self, mac: str) -> str:
+    def get_mac_vendor(self, mac: str) -> str|None:
+        '''
+        Function used to get the vendor name/designation of a mac address. It uses the local OUI
+        index to get the data
+        '''
+        oui_index = get_oui_index()
+        return oui_index.lookup(mac) if oui_index else None
+
+    def add_mac_vendors(self) -> None:
+        '''
+        Append to each entry of the output parsed the vendor of its MAC address, resolving all the
+        addresses of the table in a single pass over the OUI index
+        '''
+        oui_index = get_oui_index()
+        mac_list = [entry.get('destination_address') for entry in self.output_parsed]
+        vendor_list = oui_index.lookup_many(mac_list) if oui_index else [None] * len(mac_list)
+        for entry, vendor in zip(self.output_parsed, vendor_list):
+            entry['vendor'] = vendor
+
+
+class OutputHandle():
+    '''
+    Lightweight replacement of a GetConfigs object, kept after its output was persisted and
+    exported, so the raw output and output parsed don't stay in memory until the end of the run.
+    The raw output is read again from the file where it was saved, only when needed, so handles
+    are only created once the file is written (see Device.release_configs).
+    '''
+
+    def __init__(self, config: GetConfigs) -> None:
         '''
-        Function used to get the vendor name/designation from a list of mac addresses. It uses the
-        package OuiLookup to get the data
+        Constructor used to create a handle with the information category, status and output file
+        of a GetConfigs object
         '''
-        return list(OuiLookup().query(mac)[0].values())[0]
\ No newline at end of file
+        self.info = config.info
+        self.command = getattr(config, 'command', None)
+        self.status = getattr(config, 'status', None)
+        self.output_file = getattr(config, 'output_file', None)
+
+    @property
+    def output(self) -> str|None:
+        '''
+        Read the raw output from the file where it was saved (None if no output was saved)
+        '''
+        if self.output_file is None:
+            return None
+        with open(self.output_file, mode='r', encoding='utf-8') as file:
+            return file.read()
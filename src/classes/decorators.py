@@ -1,9 +1,25 @@
+import csv
 import json
 import os
 import re
-import pandas as pd
+import time
 from datetime import datetime
 from .colors import Colors
+from .exporters import write_excel
+
+
+def report_failure(func):
+    '''
+    Decorator used to report a device as failed in the client progress, when the interaction with
+    the device raises an exception
+    '''
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        except Exception as exception:
+            self.client.report_progress(self, 'failed', str(exception))
+            raise
+    return wrapper
 
 
 def write_to_file(func):
@@ -15,26 +31,43 @@ def write_to_file(func):
 
         def save_file(path, filename, data):
             '''
-            Save the data in the corresponding file, using the appropriate method to do it
+            Save the data in the corresponding file, using the appropriate method to do it, and
+            return the full filename
             '''
 
             # If there ir nothing to write in the file, exit this function
             if not data:
                 print(f"{Colors.NOK_RED}[{self.device.ip_address}]{Colors.END} Output not saved due to lack of data")
                 return
-            # Create the folder where the file will be written, only if doesn't exist yet
-            os.makedirs(f"{path}", exist_ok=True)
 
             # Remove special characters from the filename
             filename = re.sub(r'[\\/*?:"<>|]', '', filename)
 
-            # Save .xlsx files using pandas
+            # Save .txt and .json files in the background, using the client output writer
+            output_writer = getattr(client, 'output_writer', None)
+            if output_writer is not None and filename.endswith(('.txt', '.json')):
+                on_written = None
+                if metrics is not None:
+                    on_written = lambda seconds: metrics.observe(ip_address, 'write', seconds)
+                output_writer.submit(path, filename, data, on_written=on_written)
+                return f"{path}/{filename}"
+
+            start_time = time.perf_counter()
+            # Create the folder where the file will be written, only if doesn't exist yet
+            os.makedirs(f"{path}", exist_ok=True)
+
+            # Save .xlsx files using a write-only workbook
             if filename.endswith('.xlsx'):
-                df = pd.DataFrame(data=data)
-                df.to_excel(f"{path}/{filename}", index=False)
+                write_excel(path, filename, data)
             # Save .grphml files
             elif filename.endswith('.graphml'):
                 data.dump_file(filename=filename, folder=path)
+            # Save .csv files, from a list of dicts with the same keys
+            elif filename.endswith('.csv'):
+                with open(f"{path}/{filename}", mode='w', encoding='utf-8', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=list(data[0].keys()))
+                    writer.writeheader()
+                    writer.writerows(data)
             # Save remaining types of files, with opening a file with write permissions
             else:
                 with open(f"{path}/{filename}", mode='w', encoding='utf-8') as file:
@@ -44,23 +77,38 @@ def write_to_file(func):
                     # Save .json files
                     elif filename.endswith('.json'):
                         json.dump(data, file, indent=2)
+            if metrics is not None:
+                metrics.observe(ip_address, 'write', time.perf_counter() - start_time)
+            return f"{path}/{filename}"
 
         # Get current date and datetime for output organization purposes    
-        current_date = datetime.now().strftime('%Y%m%d')
-        current_datetime = datetime.now().strftime('%Y%m%d%H%M%S')
+        now = datetime.now()
+        current_date = now.strftime('%Y%m%d')
+        current_datetime = now.strftime('%Y%m%d%H%M%S')
+        # Client that owns the output, used to get the output writer
+        client = self.device.client if hasattr(self, 'device') else self
+        # Time spent writing the files, attributed to the device when there is one
+        metrics = getattr(client, 'metrics', None)
+        ip_address = self.device.ip_address if hasattr(self, 'device') else None
 
         # Create the filename for the command runned on the device or configuration generated
-        if func.__qualname__ == 'GetConfigs.get_config':
+        if func.__qualname__ in ('GetConfigs.get_config', 'GetConfigs.share_output'):
             command = kwargs['command']
             path = f"{self.device.client.dir}/outputfiles/{func.__qualname__.split('.')[0]}/{self.info}/{current_date}/{command.replace(' ', '_')}"
             filename = f"[{current_datetime}] {self.device.hostname} ({self.device.ip_address}) - {command}.txt"
             print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Saving output: {command}")
-            save_file(path, filename, output_data)
-        elif func.__qualname__ == 'SetConfigs.render_template':
+            # Keep the location of the output, so the output can be released from memory
+            self.output_file = save_file(path, filename, output_data)
+        elif func.__qualname__ in ('SetConfigs.render_template', 'SetConfigs.save_config'):
             path = f"{self.device.client.dir}/outputfiles/{func.__qualname__.split('.')[0]}/jinja2_config/{current_date}"
             filename = f"[{current_datetime}] {self.device.hostname} ({self.device.ip_address}) - jinja2_config.txt"
             print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Saving output: jinja2_config")
             save_file(path, filename, output_data)
+        elif func.__qualname__ == 'SetConfigs.diff_running_config':
+            path = f"{self.device.client.dir}/outputfiles/{func.__qualname__.split('.')[0]}/jinja2_config_diff/{current_date}"
+            filename = f"[{current_datetime}] {self.device.hostname} ({self.device.ip_address}) - jinja2_config_diff.txt"
+            print(f"{Colors.OK_GREEN}[{self.device.ip_address}]{Colors.END} Saving output: jinja2_config_diff")
+            save_file(path, filename, output_data)
         elif func.__qualname__ == 'SetConfigs.send_config':
             path = f"{self.device.client.dir}/outputfiles/{func.__qualname__.split('.')[0]}/jinja2_config_output/{current_date}"
             filename = f"[{current_datetime}] {self.device.hostname} ({self.device.ip_address}) - jinja2_config_output.txt"
@@ -79,12 +127,26 @@ def write_to_file(func):
                 filename = f"[{current_datetime}] {config}.xlsx"
                 print(f"{Colors.OK_GREEN}[>]{Colors.END} Saving data to excel - {config}")
                 save_file(path, filename, output_data[config])
+        # Create the inventory and the adjacencies found by the network discovery
+        elif func.__qualname__ == 'Client.generate_inventory':
+            path = f"{self.dir}/outputfiles/Discovery/{current_date}"
+            filename = f"[{current_datetime}] device_list.csv"
+            print(f"{Colors.OK_GREEN}[>]{Colors.END} Saving discovered inventory")
+            save_file(path, filename, output_data)
+        elif func.__qualname__ == 'Client.generate_discovery_dict':
+            path = f"{self.dir}/outputfiles/Discovery/{current_date}"
+            filename = f"[{current_datetime}] discovery.json"
+            print(f"{Colors.OK_GREEN}[>]{Colors.END} Saving discovered topology")
+            save_file(path, filename, output_data)
         # Create network diagram
         elif func.__qualname__ == 'Client.generate_diagram':
             path = f"{self.dir}/outputfiles/GetConfigs/Network Diagram/{current_date}"
-            filename = f"[{current_datetime}] Network Diagram.graphml"
-            print(f"{Colors.OK_GREEN}[>]{Colors.END} Saving diagram")
-            save_file(path, filename, output_data)
+            # A diagram per partition of the topology (a single one, without name, if not partitioned)
+            for partition, diagram in output_data.items():
+                name = f"Network Diagram - {partition}" if partition else 'Network Diagram'
+                filename = f"[{current_datetime}] {name}.graphml"
+                print(f"{Colors.OK_GREEN}[>]{Colors.END} Saving diagram {partition}".rstrip())
+                save_file(path, filename, diagram)
 
         return output_data
     return wrapper
\ No newline at end of file
@@ -1,9 +1,10 @@
 
 import inspect
-from netmiko import ConnectHandler
 from .colors import Colors
 from .upgrade import Upgrade
-from .configs import GetConfigs, SetConfigs
+from .config_push import CHUNK_SIZE
+from .configs import GetConfigs, OutputHandle, SetConfigs
+from .decorators import report_failure
 
 
 WITHOUT_ENABLE_SECRET = ['extreme', 'extreme_exos']
@@ -23,27 +24,59 @@ class Device():
     Class used to interact with the network devices using netmiko package
     '''
 
-    def __init__(self, client, vendor_os, ip_address, credentials):
+    def __init__(self, client, vendor_os, ip_address, credentials, port=None):
         '''
         Constructor used to initilize a new Device object, specifying its client, vendor_os (
         according to netmiko and textfsm packages), ip address and credentials for remote access.
+        The port is optional, otherwise the default SSH and Telnet ports are used.
         '''
         self.client = client
         self.vendor_os = vendor_os
         self.ip_address = ip_address
+        self.port = int(port) if port else None
         self.credentials = credentials
         self.hostname = None
         self.connection = None
+        self.connect_method = None
+        self.pooled_session = None
+        # Set when an operation didn't finish cleanly, so the session isn't reused
+        self.session_failed = False
         self.config_list = []
 
+    def release_configs(self) -> None:
+        '''
+        Replace the GetConfigs objects, already persisted, by lightweight handles to their files.
+        The output files are written in the background, so each one is waited for, and the outputs
+        that couldn't be written are kept in memory.
+        '''
+
+        output_writer = self.client.output_writer
+        self.config_list = [OutputHandle(config) if output_writer.wait(getattr(config, 'output_file', None)) else config
+            for config in self.config_list]
+
+    def report_connection(self) -> None:
+        '''
+        Report to the client progress if the connection to the device was made
+        '''
+
+        if self.connection:
+            self.client.report_progress(self, 'connected')
+        else:
+            self.client.report_progress(self, 'failed', getattr(self, 'status', None))
+
     def clear_counters(self):
         ''' Clear device counters '''
 
         self.connection.send_command('clear counters', expect_string=r'confirm')
         self.connection.send_command('\n')
 
-    def connect(self, method='ssh'):
-        ''' Connect to the device in the following order: SSH, Telnet '''
+    def connect(self, method='ssh', save_config=True):
+        '''
+        Connect to the device in the following order: SSH, Telnet. The running configuration is
+        saved once connected, unless save_config is False.
+        '''
+
+        from netmiko import ConnectHandler
 
         def ssh_connect():
             ''' Establish a SSH connection with the device '''
@@ -51,6 +84,7 @@ class Device():
             self.connection = ConnectHandler(
                 device_type = self.vendor_os,
                 ip = self.ip_address, 
+                port = self.port,
                 username = self.credentials['username'],
                 password = self.credentials['password'],
                 banner_timeout = 10,
@@ -62,26 +96,45 @@ class Device():
             self.connection = ConnectHandler(
                 device_type = f"{self.vendor_os}_telnet",
                 ip = self.ip_address,
+                port = self.port,
                 username = self.credentials['username'],
                 password = self.credentials['password'],
                 banner_timeout = 10,
             )
 
+        self.session_failed = False
+        # Reuse an initialised session from the client pool, if there's one available
+        session_pool = getattr(self.client, 'session_pool', None)
+        if session_pool is not None:
+            self.pooled_session = session_pool.acquire(self, method)
+            if self.pooled_session is not None:
+                self.connection = self.pooled_session.connection
+                self.connect_method = method
+                self.hostname = self.pooled_session.hostname
+                self.status = 'Connected'
+                print(f"{Colors.OK_GREEN}[{self.ip_address}]{Colors.END} Connected (reused session)")
+                # The configuration is saved on each connection, as with a new session
+                if save_config:
+                    self.save_config()
+                return
+
+        metrics = self.client.metrics
         try:
-            # Connect to the device through SSH
-            if method == 'ssh': ssh_connect()
-            # Connect to the device through Telnet
-            else: telnet_connect()
+            # Connect to the device (TCP, SSH/Telnet session and authentication, all made by netmiko)
+            with metrics.timer(self.ip_address, 'connect'):
+                # Connect to the device through SSH
+                if method == 'ssh': ssh_connect()
+                # Connect to the device through Telnet
+                else: telnet_connect()
+            self.connect_method = method
             
             # Disable paging to specific devices
             if self.vendor_os in PAGING_DISABLE.keys():
-                self.connection.send_command(PAGING_DISABLE[self.vendor_os]['disable'])
+                with metrics.timer(self.ip_address, 'paging_disable'):
+                    self.connection.send_command(PAGING_DISABLE[self.vendor_os]['disable'])
 
-            # Method save_config doesn't work in extreme devices
-            if self.vendor_os == 'extreme':
-                pass
-            else:
-                self.connection.save_config()
+            if save_config:
+                self.save_config()
 
         except Exception as exception:
             if 'No connection could be made because the target machine actively refused it' in str(exception) or \
@@ -89,7 +142,7 @@ class Device():
                 # Connect to the device through Telnet
                 if method == 'ssh':
                     print(f"{Colors.OK_YELLOW}[{self.ip_address}]{Colors.END} Couldn't connect via SSH, trying via Telnet")
-                    self.connect('telnet')
+                    self.connect('telnet', save_config)
                 else:          
                     print(f"{Colors.NOK_RED}[{self.ip_address}]{Colors.END} Connection refused by device")
                     self.status = 'Device refused connection'
@@ -97,7 +150,7 @@ class Device():
             elif 'TCP connection to device failed' in str(exception) or 'Operation timed out' in str(exception):
                 if method == 'ssh':
                     print(f"{Colors.OK_YELLOW}[{self.ip_address}]{Colors.END} Couldn't connect via SSH, trying via Telnet")
-                    self.connect('telnet')
+                    self.connect('telnet', save_config)
                 else:
                     print(f"{Colors.NOK_RED}[{self.ip_address}]{Colors.END} TCP connection failed")
                     self.status = 'TCP connection failed'
@@ -109,7 +162,7 @@ class Device():
             elif 'must be exactly 1024, 2048, 3072, or 4096 bits long' in str(exception):
                 if method == 'ssh':
                     print(f"{Colors.OK_YELLOW}[{self.ip_address}]{Colors.END} Couldn't connect via SSH, trying via Telnet")
-                    self.connect('telnet')
+                    self.connect('telnet', save_config)
                 else:
                     print(f"{Colors.NOK_RED}[{self.ip_address}]{Colors.END} Issue with the SSH keys")
                     self.status = 'Issue with the SSH keys'
@@ -129,13 +182,23 @@ class Device():
         # If not in enable secret mode, enter the enable secret password 
         if not self.connection.check_enable_mode() and self.vendor_os not in WITHOUT_ENABLE_SECRET:
             self.connection.secret = self.credentials['enable_secret']
-            self.connection.enable()
+            with metrics.timer(self.ip_address, 'enable'):
+                self.connection.enable()
 
         # Get the hostname of the device 
         self.hostname = self.connection.find_prompt()[:-1]
         self.status = 'Connected'
         print(f"{Colors.OK_GREEN}[{self.ip_address}]{Colors.END} Connected")
 
+    def save_config(self) -> None:
+        ''' Save the running configuration of the device '''
+
+        # Method save_config doesn't work in extreme devices
+        if self.vendor_os == 'extreme':
+            return
+        with self.client.metrics.timer(self.ip_address, 'save_config'):
+            self.connection.save_config()
+
     def delete_file(self, flash, file):
         ''' Delete file from deviice flash '''
 
@@ -159,12 +222,25 @@ class Device():
         # Connection to the device couln't be mande
         if self.connection == None: return
 
-        # Disable paging to specific devices
-        if self.vendor_os in PAGING_DISABLE.keys():
-            self.connection.send_command(PAGING_DISABLE[self.vendor_os]['enable'])
+        # Keep the session in the client pool, so it can be reused by the next operation, unless
+        # the operation didn't finish cleanly
+        session_pool = getattr(self.client, 'session_pool', None)
+        if session_pool is not None:
+            if self.session_failed:
+                session_pool.discard(self)
+            else:
+                session_pool.release(self)
+            self.connection = None
+            self.pooled_session = None
+            return
 
-        # Disconnect from the device
-        self.connection.disconnect()
+        with self.client.metrics.timer(self.ip_address, 'disconnect'):
+            # Enable paging to specific devices
+            if self.vendor_os in PAGING_DISABLE.keys():
+                self.connection.send_command(PAGING_DISABLE[self.vendor_os]['enable'])
+
+            # Disconnect from the device
+            self.connection.disconnect()
         print(f"{Colors.OK_GREEN}[{self.ip_address}]{Colors.END} Disconnected")
 
     def flash_has_space(self, flash, needed_space):
@@ -186,6 +262,8 @@ class Device():
         del device_dict['client']
         del device_dict['credentials']
         del device_dict['connection']
+        del device_dict['pooled_session']
+        del device_dict['session_failed']
 
         command_list = []
         for command in self.command_list:
@@ -276,27 +354,59 @@ class Device():
         except Exception as exception:
             raise Exception(f"Error in {inspect.currentframe().f_code.co_name}", exception, self.ip_address)
 
-    def set_configs(self, config_blocks: list, j2_data: dict=None, config: list=None) -> None:
+    @report_failure
+    def set_configs(self, config_blocks: list, j2_data: dict=None, config: list=None, diff: bool=False,
+        max_age: int=None, on_error: str='continue', chunk_size: int=CHUNK_SIZE) -> None:
         '''
         Connect to the device in order to generate and apply a set of configurations using 
         pre-defined templates and user data. The template is generated based on a list of 
-        configuration blocks defined by the user.
+        configuration blocks defined by the user. With diff, only the commands missing in the
+        running configuration are sent, reusing the running configuration stored by a get configs
+        run if it isn't older than max_age seconds. Devices already configured are left untouched. When a command
+        fails, the remaining ones are sent or not according to on_error (see SetConfigs.send_config).
         '''
         
         # jinja2 is the default generated in no other is provided in the function
         j2_data = self.client.j2_data if j2_data == None else j2_data
 
-        # Connect to the device
-        self.connect()
+        set_config = SetConfigs(self)
+        # The running configuration stored is enough to know if the device needs to be configured
+        running_config = set_config.get_stored_running_config(max_age) if diff and max_age is not None else None
+        if running_config is not None:
+            config = set_config.render_template(config_blocks, j2_data=j2_data) if config == None else config
+            config = set_config.diff_running_config(config, running_config)
+            if not config:
+                print(f"{Colors.OK_GREEN}[{self.ip_address}]{Colors.END} Configuration already applied")
+                self.client.report_progress(self, 'unchanged')
+                return
+
+        # Connect to the device. With diff, the configuration is only saved if it will be changed.
+        self.connect(save_config=not diff)
+        self.report_connection()
         # Couldn't connect to the device
         if not self.connection: return
 
-        # Create a SetConfigs object, generate the configuration and send it to the device 
-        set_config = SetConfigs(self)
+        # Generate the configuration to be sent to the device
         config = set_config.render_template(config_blocks, j2_data=j2_data) if config == None else config
+        if diff and running_config is None:
+            config = set_config.diff_running_config(config, set_config.get_running_config())
+            # Nothing to send, so the configuration mode and save_config are skipped
+            if not config:
+                print(f"{Colors.OK_GREEN}[{self.ip_address}]{Colors.END} Configuration already applied")
+                self.client.report_progress(self, 'unchanged')
+                self.disconnect()
+                return
+        if diff:
+            self.save_config()
+
         print(config)
         self.config_list.append(config)
-        set_config.send_config(data=config)
+        self.client.report_progress(self, 'applying')
+        set_config.send_config(data=config, chunk_size=chunk_size, on_error=on_error)
+        if getattr(set_config, 'status', None) == 'Done':
+            self.client.report_progress(self, 'applied')
+        else:
+            self.client.report_progress(self, 'failed', getattr(set_config, 'status', None))
         
         # Disconnect from the device
         self.disconnect()
@@ -315,6 +425,7 @@ class Device():
         config = set_config.render_template(config_blocks, j2_data=j2_data) if config == None else config
         print(config)
     
+    @report_failure
     def get_configs(self, get_configs_info: list) -> None:
         '''
         Connect to the device and get the information requested, command by command. For each
@@ -323,30 +434,60 @@ class Device():
 
         # Connect to the device
         self.connect()
-
-        for info in get_configs_info:
-            # Get each command to be runned on the device
-            for command in self.client.command_list[info]['commands'][self.vendor_os]:
-                # Create a GetConfigs object and run the command on the device 
-                config = GetConfigs(self, info=info)
-                self.config_list.append(config)
-                
-                # If there is a connection to the device, execute the commands
-                if self.connection:
-                    if self.vendor_os == 'extreme_exos':
-                        output = config.get_config(command=command, expect_string=self.connection.find_prompt())
-                    else:
-                        output = config.get_config(command=command)
-                    # Parse the output of the command executed
-                    output_parsed = config.parse_output(raw_output=output, platform=self.vendor_os, command=command)
-
-                    # Append to the output_parsed, the vendor of the MAC address found on the port
-                    if config.info == 'MAC Address Table':
-                        for mac in output_parsed:
-                            mac['vendor'] = config.get_mac_vendor(mac['destination_address'])
+        self.report_connection()
+
+        for command, info_list in self.client.get_command_plan(get_configs_info, self.vendor_os):
+            # Create a GetConfigs object for each information category that requested the command
+            config_list = [GetConfigs(self, info=info) for info in info_list]
+            self.config_list.extend(config_list)
+
+            # If there is a connection to the device, execute the command only once
+            if self.connection:
+                self.client.report_progress(self, 'collecting', command)
+                config = config_list[0]
+                if self.vendor_os == 'extreme_exos':
+                    output = config.get_config(command=command, expect_string=self.connection.find_prompt())
+                else:
+                    output = config.get_config(command=command)
+                # Share the output with the remaining information categories
+                for shared_config in config_list[1:]:
+                    shared_config.share_output(config, command=command)
+                self.parse_configs(command, config_list, output)
 
         # Disconnect from the device
         self.disconnect()
+        self.configs_completed()
+
+    def parse_configs(self, command: str, config_list: list, output: str) -> None:
+        '''
+        Parse the output of a command, executed once, and fan it out to each information category
+        (GetConfigs object) that requested it
+        '''
+
+        # Parse the output in the parse workers, while this thread keeps reading
+        if self.client.parse_stage is not None:
+            self.client.parse_stage.submit(self, command, config_list, output)
+            return
+
+        with self.client.metrics.timer(self.ip_address, 'parse', command=command):
+            structured_output = config_list[0].structure_output(raw_output=output, platform=self.vendor_os, command=command)
+            for config in config_list:
+                output_parsed = config.parse_output(command=command, structured_output=structured_output)
+
+                # Append to the output_parsed, the vendor of the MAC address found on the port
+                if config.info == 'MAC Address Table' and output_parsed:
+                    config.add_mac_vendors()
+
+    def configs_completed(self) -> None:
+        '''
+        Notify the client that all the information of the device was collected, once all its
+        outputs are parsed
+        '''
+
+        if self.client.parse_stage is not None:
+            self.client.parse_stage.when_parsed(self, self.client.device_completed)
+        else:
+            self.client.device_completed(self)
 
     # def serial_connect(self):
 
@@ -0,0 +1,248 @@
+import ipaddress
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .colors import Colors
+from .device import Device
+from .engine import MAX_WORKERS
+from .topology import Topology, get_neighbor, normalize_hostname, normalize_ip_address
+
+
+# Information categories read from each device, by discovery protocol
+NEIGHBOR_INFOS = {
+    'CDP': 'CDP Neighbors',
+    'LLDP': 'LLDP Neighbors',
+}
+# Maximum number of hops from the seed devices, by default
+MAX_HOPS = 3
+# vendor_os of the neighbors, by platform (or system description). Platforms mapped to None, such
+# as phones and access points, are added to the inventory but never crawled.
+PLATFORM_VENDOR_OS = (
+    (r'phone|AIR-[A-Z0-9]*AP|C91\d\dAX|Meraki MR', None),
+    (r'Nexus|N[3579]K-', 'cisco_nxos'),
+    (r'AIR-CT|Cisco Controller', 'cisco_wlc'),
+    (r'ExtremeXOS|EXOS|Summit', 'extreme_exos'),
+    (r'Extreme|Enterasys', 'extreme'),
+    (r'OmniSwitch|Alcatel', 'alcatel_aos'),
+    (r'cisco|Catalyst|WS-C|IOS', 'cisco_ios'),
+)
+
+
+def get_platform_vendor_os(platform: str) -> str|None:
+    '''
+    Get the vendor_os of a neighbor from its platform, or None if the platform is unknown or is
+    not a network device
+    '''
+
+    for pattern, vendor_os in PLATFORM_VENDOR_OS:
+        if platform and re.search(pattern, platform, flags=re.IGNORECASE):
+            return vendor_os
+    return None
+
+
+class Discovery():
+    '''
+    Class used to discover the network from a list of seed devices, reading their CDP and/or LLDP
+    neighbors with the existing commands. The management IP of each new neighbor is added to the
+    frontier, crawled concurrently by a thread pool, until the hop limit or outside the subnets
+    allowed. Devices are identified by management IP and hostname, so each one is visited only
+    once, even when its neighbors report it with different addresses.
+    '''
+
+    def __init__(self, client, protocols: list=('CDP', 'LLDP'), max_hops: int=MAX_HOPS, subnets: list=None,
+        max_workers: int=MAX_WORKERS, credentials: dict=None):
+        '''
+        Constructor used to create a new discovery. The credentials are used for the devices found,
+        when the client keepass database doesn't have specific ones.
+        '''
+        self.client = client
+        self.protocols = [protocol.upper() for protocol in protocols]
+        self.max_hops = max_hops
+        self.subnets = [ipaddress.ip_network(subnet, strict=False) for subnet in subnets or []]
+        self.max_workers = max_workers
+        self.credentials = credentials
+        # Devices and links found, by node ID (management IP, or hostname when there is no IP)
+        self.nodes = {}
+        self.node_ids = {}
+        self.topology = Topology()
+        self.device_list = []
+
+    def run(self, seed_list: list) -> list:
+        '''
+        Crawl the network from the seed devices and return the list of devices visited. The
+        frontier is only changed by this thread, as each device visited returns its neighbors.
+        The hostnames of the seeds are only known once they are visited, so the neighbors found
+        are only added after all seeds are visited, otherwise a seed reported by a neighbor with
+        another address would be found again and visited twice.
+        '''
+
+        if self.credentials is None and seed_list:
+            self.credentials = seed_list[0].credentials
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='discovery') as executor:
+            future_list = set()
+            for device in seed_list:
+                if device.ip_address not in self.nodes and self.add_node(device.ip_address, None, None, device.vendor_os, 0) is None:
+                    future_list.add(executor.submit(self.visit, device, 0))
+            seeds_pending = len(future_list)
+            # Neighbors found while there are seeds still being visited (device, neighbor and hops)
+            neighbors_pending = []
+
+            while future_list:
+                done, future_list = wait(future_list, return_when=FIRST_COMPLETED)
+                for future in done:
+                    device, hops, neighbor_list = future.result()
+                    self.add_visited(device)
+                    if hops == 0:
+                        seeds_pending -= 1
+                    neighbors_pending.extend((device, neighbor, hops + 1) for neighbor in neighbor_list)
+                if seeds_pending > 0:
+                    continue
+                for device, neighbor, hops in neighbors_pending:
+                    new_device = self.add_neighbor(device, neighbor, hops)
+                    if new_device is not None:
+                        future_list.add(executor.submit(self.visit, new_device, hops))
+                neighbors_pending = []
+
+        visited = len([node for node in self.nodes.values() if node['visited']])
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Discovery finished: {visited} devices visited, "
+            f"{len(self.nodes)} found, {len(self.topology.links)} links")
+        return self.device_list
+
+    def visit(self, device: Device, hops: int) -> tuple:
+        '''
+        Get the neighbors of a device, using the commands of the CDP and LLDP information
+        categories supported by its vendor_os
+        '''
+
+        info_list = [NEIGHBOR_INFOS[protocol] for protocol in self.protocols
+            if device.vendor_os in self.client.command_list[NEIGHBOR_INFOS[protocol]]['commands']]
+        try:
+            device.get_configs(info_list)
+        except Exception as exception:
+            print(f"{Colors.NOK_RED}[{device.ip_address}]{Colors.END} Couldn't get the neighbors: {exception}")
+            device.status = 'Failed'
+
+        neighbor_list = []
+        for config in device.config_list:
+            if config.info in info_list and getattr(config, 'output_parsed', None):
+                protocol = 'CDP' if config.info == NEIGHBOR_INFOS['CDP'] else 'LLDP'
+                for entry in config.output_parsed:
+                    neighbor = get_neighbor(entry)
+                    neighbor['protocol'] = protocol
+                    neighbor_list.append(neighbor)
+        return device, hops, neighbor_list
+
+    def add_node(self, ip_address: str|None, hostname: str|None, platform: str|None, vendor_os: str|None, hops: int) -> str|None:
+        '''
+        Add a device found to the inventory, with the reason why it won't be visited (or None if
+        it will)
+        '''
+
+        if not ip_address:
+            status = 'No management IP'
+        elif vendor_os is None:
+            status = 'Unsupported platform'
+        elif hops > self.max_hops:
+            status = 'Hop limit'
+        # The seed devices are always visited
+        elif hops > 0 and self.subnets and not any(ipaddress.ip_address(ip_address) in subnet for subnet in self.subnets):
+            status = 'Out of scope'
+        else:
+            status = None
+
+        node_id = ip_address or normalize_hostname(hostname)
+        self.nodes[node_id] = {'ip_address': ip_address, 'hostname': hostname, 'vendor_os': vendor_os,
+            'platform': platform, 'hops': hops, 'visited': status is None, 'status': status}
+        if hostname:
+            self.node_ids[normalize_hostname(hostname)] = node_id
+        return status
+
+    def add_visited(self, device: Device) -> None:
+        '''
+        Update the node of a visited device with its status and, now that it's known, its hostname
+        '''
+
+        node = self.nodes[device.ip_address]
+        node['status'] = getattr(device, 'status', None)
+        if device.hostname:
+            node['hostname'] = device.hostname
+            self.node_ids.setdefault(normalize_hostname(device.hostname), device.ip_address)
+        self.device_list.append(device)
+
+    def add_neighbor(self, device: Device, neighbor: dict, hops: int) -> Device|None:
+        '''
+        Add the link to a neighbor of a visited device and, if the neighbor wasn't found yet,
+        return the device to be visited (if any)
+        '''
+
+        ip_address = normalize_ip_address(neighbor['ip_address'])
+        hostname_key = normalize_hostname(neighbor['hostname'])
+        # A device already found, by its management IP or by its hostname
+        node_id = ip_address if ip_address in self.nodes else self.node_ids.get(hostname_key)
+        new_device = None
+        if node_id is None:
+            vendor_os = get_platform_vendor_os(neighbor['platform'])
+            if self.add_node(ip_address, neighbor['hostname'], neighbor['platform'], vendor_os, hops) is None:
+                new_device = Device(self.client, vendor_os, ip_address, self.get_credentials(ip_address))
+            node_id = ip_address or hostname_key
+        if node_id is None:
+            return new_device
+
+        # The same link is reported by both ends, and may be reported by both protocols
+        self.topology.add_link(device.ip_address, node_id, neighbor['local_port'], neighbor['remote_port'], neighbor['protocol'])
+        return new_device
+
+    def get_credentials(self, ip_address: str) -> dict:
+        '''
+        Get the credentials of a device found, from the client keepass database or, if it doesn't
+        have them, the credentials of the discovery
+        '''
+
+        if self.client.kdbx_database:
+            try:
+                return self.client.get_kdbx_credentials(self.client.kdbx_database, ip_address)
+            except Exception:
+                pass
+        return self.credentials
+
+    def get_inventory(self) -> list:
+        '''
+        Get the devices found, in the format of the device_list.csv file (without credentials), so
+        the inventory can be used by the other flows. Devices not visited are commented out.
+        '''
+
+        inventory = []
+        for node_id, node in self.nodes.items():
+            if not node['ip_address']:
+                continue
+            visited = node['visited'] and node['status'] == 'Connected'
+            inventory.append({
+                'ip_address': node['ip_address'],
+                'vendor_os': node['vendor_os'] if visited else f"#{node['vendor_os'] or 'unknown'}",
+                'username': '',
+                'password': '',
+                'enable_secret': '',
+                'hostname': node['hostname'] or '',
+                'platform': node['platform'] or '',
+                'hops': node['hops'],
+                'status': node['status'] or '',
+            })
+        return inventory
+
+    def get_topology(self) -> Topology:
+        '''
+        Get the adjacency graph of the devices found, to be drawn by Client.generate_diagram
+        '''
+
+        for node_id, node in self.nodes.items():
+            self.topology.nodes[node_id] = node
+        return self.topology
+
+    def to_dict(self) -> dict:
+        return {
+            'protocols': self.protocols,
+            'max_hops': self.max_hops,
+            'subnets': [str(subnet) for subnet in self.subnets],
+            'nodes': [{'id': node_id, **node} for node_id, node in self.nodes.items()],
+            'links': list(self.topology.links.values()),
+        }
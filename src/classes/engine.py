@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable
+
+
+# Maximum number of devices handled at the same time (each one holds a thread and a session)
+MAX_WORKERS = 40
+
+
+def run_concurrently(func: Callable, items: Iterable, *args, max_workers: int=None, **kwargs) -> list:
+    '''
+    Run func over each item using a fixed size pool of max_workers threads (MAX_WORKERS by
+    default), so each device in flight holds a thread and an SSH session. Each item is passed as
+    the first argument of the function, followed by the remaining args and kwargs.
+    '''
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as executor:
+        future_list = [executor.submit(func, item, *args, **kwargs) for item in items]
+        for future in as_completed(future_list):
+            results.append(future.result())
+    return results
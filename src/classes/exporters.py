@@ -0,0 +1,295 @@
+import csv
+import json
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from .colors import Colors
+
+
+# Maximum number of rows in an Excel sheet (including the header)
+EXCEL_MAX_ROWS = 1048576
+# Number of rows kept in memory before being written to a Parquet file
+PARQUET_BATCH_SIZE = 10000
+
+
+def to_text(value) -> str:
+    '''
+    Convert a value parsed by TextFSM (string or list of strings) to a single string
+    '''
+
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value)
+    return str(value)
+
+
+def write_excel(path: str, filename: str, rows, columns: list=None) -> None:
+    '''
+    Save rows (dicts) in an Excel file using a write-only workbook, which doesn't keep the rows in
+    memory. If the columns are not specified, they are taken from all rows (as pandas does).
+    Rows above the Excel limit are written to additional sheets.
+    '''
+
+    from openpyxl import Workbook
+
+    if columns is None:
+        rows = list(rows)
+        columns = list(dict.fromkeys(key for row in rows for key in row.keys()))
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    for index, row in enumerate(rows):
+        # Start a new sheet, with the header, when the current one is full
+        if index % (EXCEL_MAX_ROWS - 1) == 0:
+            sheet = workbook.create_sheet(title=f"Sheet{index // (EXCEL_MAX_ROWS - 1) + 1}")
+            sheet.append(columns)
+        values = [row.get(column) for column in columns]
+        sheet.append([to_text(value) if isinstance(value, (list, dict)) else value for value in values])
+    if sheet is None:
+        workbook.create_sheet(title='Sheet1').append(columns)
+
+    os.makedirs(path, exist_ok=True)
+    workbook.save(f"{path}/{filename}")
+
+
+class Exporter(ABC):
+    '''
+    Base class of the streaming exporters. Each exporter keeps one open file per information
+    category and appends the rows of each device as soon as the device finishes.
+    '''
+
+    extension = None
+
+    def __init__(self, path_list: dict):
+        '''
+        Constructor used to create a new exporter, given a function that returns the path and
+        filename (without extension) of each information category
+        '''
+        self.path_list = path_list
+        self.files = {}
+
+    def get_filename(self, info: str) -> str:
+        '''
+        Get the full filename of the export file of an information category
+        '''
+
+        path, filename = self.path_list(info)
+        os.makedirs(path, exist_ok=True)
+        return f"{path}/{filename}.{self.extension}"
+
+    @abstractmethod
+    def write_rows(self, info: str, rows: list) -> None:
+        '''
+        Append the rows of a device to the export file of an information category
+        '''
+
+    def close(self) -> list:
+        '''
+        Close all files and return the list of filenames written
+        '''
+
+        filename_list = []
+        for file in self.files.values():
+            file.close()
+            filename_list.append(file.name)
+        return filename_list
+
+
+class CsvExporter(Exporter):
+    '''
+    Exporter that appends rows to CSV files. When a device brings new columns, the columns are
+    added at the end and the header is rewritten when the file is closed.
+    '''
+
+    extension = 'csv'
+
+    def __init__(self, path_list):
+        super().__init__(path_list)
+        self.columns = {}
+        self.header_outdated = set()
+
+    def write_rows(self, info: str, rows: list) -> None:
+        if info not in self.files:
+            self.files[info] = open(self.get_filename(info), mode='w', encoding='utf-8', newline='')
+            self.columns[info] = list(dict.fromkeys(key for row in rows for key in row.keys()))
+            csv.writer(self.files[info]).writerow(self.columns[info])
+
+        columns = self.columns[info]
+        for row in rows:
+            for key in row.keys():
+                if key not in columns:
+                    columns.append(key)
+                    self.header_outdated.add(info)
+        csv.writer(self.files[info]).writerows([[to_text(row.get(column)) for column in columns] for row in rows])
+
+    def close(self) -> list:
+        filename_list = super().close()
+
+        # Rewrite the header of the files whose columns changed, copying the rows line by line
+        for info in self.header_outdated:
+            filename = self.files[info].name
+            with open(filename, mode='r', encoding='utf-8', newline='') as source, \
+                open(f"{filename}.tmp", mode='w', encoding='utf-8', newline='') as destination:
+                source.readline()
+                csv.writer(destination).writerow(self.columns[info])
+                shutil.copyfileobj(source, destination)
+            os.replace(f"{filename}.tmp", filename)
+
+        return filename_list
+
+
+class JsonLinesExporter(Exporter):
+    '''
+    Exporter that appends each row as a compact JSON object in a single line
+    '''
+
+    extension = 'jsonl'
+
+    def write_rows(self, info: str, rows: list) -> None:
+        if info not in self.files:
+            self.files[info] = open(self.get_filename(info), mode='w', encoding='utf-8')
+        self.files[info].writelines(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+
+
+class ParquetExporter(Exporter):
+    '''
+    Exporter that writes rows to Parquet files (all columns as strings), in batches. Since the
+    schema of a Parquet file can't change, a new part file is created when new columns appear.
+    Requires the pyarrow package.
+    '''
+
+    extension = 'parquet'
+
+    def __init__(self, path_list):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export requires the pyarrow package: pip install pyarrow')
+        super().__init__(path_list)
+        self.pyarrow = pyarrow
+        self.writers = {}
+        self.buffers = {}
+        self.parts = {}
+        self.filename_list = []
+
+    def write_rows(self, info: str, rows: list) -> None:
+        self.buffers.setdefault(info, []).extend(rows)
+        if len(self.buffers[info]) >= PARQUET_BATCH_SIZE:
+            self.write_batch(info)
+
+    def write_batch(self, info: str) -> None:
+        '''
+        Write the rows kept in memory for an information category
+        '''
+
+        rows = self.buffers.pop(info, [])
+        if not rows:
+            return
+        columns = list(dict.fromkeys(key for row in rows for key in row.keys()))
+
+        writer = self.writers.get(info)
+        # New columns: close the current part file and start a new one
+        if writer is not None and writer.schema.names != columns:
+            if set(columns) <= set(writer.schema.names):
+                columns = writer.schema.names
+            else:
+                writer.close()
+                writer = None
+        if writer is None:
+            part = self.parts.get(info, 0)
+            self.parts[info] = part + 1
+            filename = self.get_filename(info)
+            if part > 0:
+                filename = filename.replace(f".{self.extension}", f"-{part}.{self.extension}")
+            schema = self.pyarrow.schema([(column, self.pyarrow.string()) for column in columns])
+            writer = self.pyarrow.parquet.ParquetWriter(filename, schema)
+            self.writers[info] = writer
+            self.filename_list.append(filename)
+
+        table = self.pyarrow.table({column: [to_text(row.get(column)) for row in rows]
+            for column in writer.schema.names}, schema=writer.schema)
+        writer.write_table(table)
+
+    def close(self) -> list:
+        for info in list(self.buffers.keys()):
+            self.write_batch(info)
+        for writer in self.writers.values():
+            writer.close()
+        return self.filename_list
+
+
+EXPORTERS = {
+    'csv': CsvExporter,
+    'jsonl': JsonLinesExporter,
+    'parquet': ParquetExporter,
+}
+
+
+class ExportStage():
+    '''
+    Class used to export the output parsed of each device as soon as the device finishes, in one
+    or more streaming formats (csv, jsonl and parquet). Excel (xlsx) is an optional conversion of
+    the CSV files, made when the stage is closed.
+    '''
+
+    def __init__(self, dir: str, formats: list, date: str=None):
+        '''
+        Constructor used to create the exporters of the requested formats. All files of the stage
+        share the same date and datetime, as the files generated by generate_config_parsed. The
+        date folder can be set (YYYYmmdd), so a replayed run is exported next to the original one.
+        '''
+        unknown_formats = set(formats) - set(EXPORTERS.keys()) - {'xlsx'}
+        if unknown_formats:
+            raise ValueError(f"Unknown export formats: {', '.join(unknown_formats)}")
+
+        now = datetime.now()
+        self.current_date = now.strftime('%Y%m%d') if date is None else date
+        self.current_datetime = now.strftime('%Y%m%d%H%M%S')
+        self.dir = dir
+        self.excel = 'xlsx' in formats
+        # Excel files are converted from the CSV files
+        formats = [format for format in formats if format != 'xlsx']
+        if self.excel and 'csv' not in formats:
+            formats.append('csv')
+        self.exporters = {format: EXPORTERS[format](self.get_path) for format in formats}
+        self.lock = threading.Lock()
+
+    def get_path(self, info: str) -> tuple:
+        '''
+        Get the path and the filename (without extension) of an information category
+        '''
+
+        path = f"{self.dir}/outputfiles/GetConfigs/{info}/{self.current_date}"
+        filename = re.sub(r'[\\/*?:"<>|]', '', f"[{self.current_datetime}] {info}")
+        return path, filename
+
+    def export_rows(self, output_parsed_dict: dict) -> None:
+        '''
+        Append the rows of a device, grouped by information category, to all exporters
+        '''
+
+        with self.lock:
+            for info, rows in output_parsed_dict.items():
+                for exporter in self.exporters.values():
+                    exporter.write_rows(info, rows)
+
+    def close(self) -> None:
+        '''
+        Close all exporters and convert the CSV files to Excel, if requested
+        '''
+
+        with self.lock:
+            for format, exporter in self.exporters.items():
+                for filename in exporter.close():
+                    print(f"{Colors.OK_GREEN}[>]{Colors.END} Data exported to {format} - {os.path.basename(filename)}")
+                    if self.excel and format == 'csv':
+                        with open(filename, mode='r', encoding='utf-8', newline='') as file:
+                            reader = csv.DictReader(file)
+                            write_excel(os.path.dirname(filename), os.path.basename(filename)[:-4] + '.xlsx',
+                                reader, columns=reader.fieldnames)
+            self.exporters = {}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from .port_range import PORT_FILTERS
+
+
+# Directory of the jinja2 templates and base template (skeleton) of the configurations
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '../jinja2_templates')
+BASE_TEMPLATE = 'base_config.j2'
+# Maximum number of rendered blocks kept in memory
+MAX_RENDERED_BLOCKS = 4096
+
+
+class J2Cache():
+    '''
+    Class used to keep, for the whole process, a single jinja2 environment for the template
+    directory, with a bytecode cache on disk, so the templates are only compiled when they change.
+    The blocks rendered are memoized by (vendor_os, block, digest of the variables used by the
+    block), since most blocks (e.g. SNMP, NTP or syslog) render the same text for every device of
+    a vendor. Variables specific to each device (e.g. its IP address) are only used by the blocks
+    that reference them, and by the base template, rendered for each device.
+    '''
+
+    def __init__(self, template_dir: str=TEMPLATE_DIR, max_rendered_blocks: int=MAX_RENDERED_BLOCKS):
+        '''
+        Constructor used to create a new, empty, cache. The jinja2 environment is only created
+        when the first template is needed.
+        '''
+        self.template_dir = template_dir
+        self.max_rendered_blocks = max_rendered_blocks
+        self.lock = threading.Lock()
+        self.environment = None
+        self.variables = {}
+        self.digests = {}
+        self.rendered_blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_environment(self):
+        '''
+        Get the jinja2 environment of the template directory, creating it on the first call. The
+        compiled templates are kept in the default bytecode cache directory of the user, shared by
+        all processes and runs.
+        '''
+
+        with self.lock:
+            if self.environment is None:
+                from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+                self.environment = Environment(
+                    loader=FileSystemLoader(self.template_dir),
+                    bytecode_cache=FileSystemBytecodeCache(),
+                    trim_blocks=True,
+                    lstrip_blocks=True)
+                # Port range filters, to configure many ports with a single command
+                self.environment.filters.update(PORT_FILTERS)
+        return self.environment
+
+    def get_template(self, name: str):
+        '''
+        Get a template, loaded again only if its file changed
+        '''
+        return self.get_environment().get_template(name)
+
+    def get_variables(self, template) -> frozenset|None:
+        '''
+        Get the variables used by a template, or None if it includes other templates (its output
+        can depend on variables not known), in which case its output is not memoized
+        '''
+
+        if template not in self.variables:
+            from jinja2 import meta
+            environment = self.get_environment()
+            source = environment.loader.get_source(environment, template.name)[0]
+            ast = environment.parse(source)
+            if list(meta.find_referenced_templates(ast)):
+                variables = None
+            else:
+                variables = frozenset(meta.find_undeclared_variables(ast))
+            with self.lock:
+                self.variables[template] = variables
+        return self.variables[template]
+
+    def get_digest(self, value) -> object:
+        '''
+        Get a hashable key of a variable value. Lists and dicts of the YAML data are shared by all
+        devices, and not changed while rendering, so their digest is computed once per object
+        (kept referenced, so its id is never reused).
+        '''
+
+        if isinstance(value, (str, int, float, bool, type(None))):
+            return value
+        digest = self.digests.get(id(value))
+        if digest is None or digest[0] is not value:
+            digest = (value, hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest())
+            with self.lock:
+                self.digests[id(value)] = digest
+        return digest[1]
+
+    def render_block(self, vendor_os: str, block: str, data: dict) -> str:
+        '''
+        Render the template of a configuration block ({vendor_os}_{block}.j2), or get it from the
+        blocks already rendered with the same values of the variables it uses
+        '''
+
+        template = self.get_template(f"{vendor_os}_{block}.j2")
+        variables = self.get_variables(template)
+        if variables is None:
+            return template.render(data)
+
+        context = {name: data[name] for name in variables if name in data}
+        # The template object changes when its file changes, so old outputs are never used
+        key = (vendor_os, block, template, tuple(sorted((name, self.get_digest(value)) for name, value in context.items())))
+        with self.lock:
+            rendered = self.rendered_blocks.get(key)
+            if rendered is not None:
+                self.rendered_blocks.move_to_end(key)
+                self.hits += 1
+                return rendered
+            self.misses += 1
+
+        rendered = template.render(context)
+        with self.lock:
+            self.rendered_blocks[key] = rendered
+            if len(self.rendered_blocks) > self.max_rendered_blocks:
+                self.rendered_blocks.popitem(last=False)
+        return rendered
+
+    def clear(self) -> None:
+        with self.lock:
+            self.variables = {}
+            self.digests = {}
+            self.rendered_blocks = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+
+# Jinja2 environment and rendered blocks shared by all devices of the process
+J2_CACHE = J2Cache()
@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .colors import Colors
+
+
+# States of a device during a job, in the order they are usually reached
+DEVICE_STATES = ('queued', 'connected', 'collecting', 'parsed', 'written', 'applying', 'applied', 'unchanged', 'failed')
+# States of a job
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+# Maximum number of jobs running at the same time and waiting to run
+MAX_RUNNING_JOBS = 2
+MAX_QUEUED_JOBS = 10
+# Number of finished jobs kept, so their status and result can still be consulted
+MAX_FINISHED_JOBS = 50
+# Seconds between the keep-alive comments sent to the event stream clients
+KEEPALIVE_INTERVAL = 15
+
+
+class Job():
+    '''
+    Class used to keep the state of a background job (e.g. a get configs run), the state of each
+    of its devices and the list of events sent to the clients following its progress
+    '''
+
+    def __init__(self, kind: str, params: dict=None):
+        '''
+        Constructor used to create a new queued job
+        '''
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.devices = {}
+        self.result = None
+        self.error = None
+        self.events = []
+        self.condition = threading.Condition()
+
+    def add_event(self, event_type: str, data: dict) -> None:
+        '''
+        Append an event and wake up the clients waiting for it
+        '''
+
+        with self.condition:
+            self.events.append((len(self.events) + 1, event_type, data))
+            self.condition.notify_all()
+
+    def update_device(self, ip_address: str, state: str, detail: str=None) -> None:
+        '''
+        Progress callback of the client: set the state of a device. A failed device keeps the
+        failed state until the end of the job.
+        '''
+
+        if state not in DEVICE_STATES:
+            raise ValueError(f"Unknown device state: {state}")
+        with self.condition:
+            device = self.devices.get(ip_address)
+            if device is not None and device['state'] == 'failed':
+                return
+            self.devices[ip_address] = {'state': state, 'detail': detail, 'updated': time.time()}
+        self.add_event('device', {'ip_address': ip_address, 'state': state, 'detail': detail})
+
+    def set_status(self, status: str) -> None:
+        '''
+        Set the state of the job, recording when it started and finished
+        '''
+
+        with self.condition:
+            self.status = status
+            if status == 'running':
+                self.started = time.time()
+            elif status in ('done', 'failed'):
+                self.finished = time.time()
+        self.add_event('job', {'status': status, 'error': self.error})
+
+    def get_events(self, last_event_id: int=0, timeout: float=None) -> list:
+        '''
+        Get the events after the last event received by a client, waiting up to timeout seconds
+        for new events if there are none yet
+        '''
+
+        with self.condition:
+            if len(self.events) <= last_event_id and not self.is_finished():
+                self.condition.wait(timeout)
+            return self.events[last_event_id:]
+
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> dict:
+        '''
+        Get the status of the job, with the number of devices in each state
+        '''
+
+        with self.condition:
+            states = {}
+            for device in self.devices.values():
+                states[device['state']] = states.get(device['state'], 0) + 1
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'params': self.params,
+                'status': self.status,
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished,
+                'error': self.error,
+                'states': states,
+                'devices': {ip_address: dict(device) for ip_address, device in self.devices.items()},
+            }
+
+
+class JobManager():
+    '''
+    Class used to run jobs in the background, with a bounded number of jobs running and waiting,
+    so long runs don't hold the web requests that started them
+    '''
+
+    def __init__(self, max_running_jobs: int=MAX_RUNNING_JOBS, max_queued_jobs: int=MAX_QUEUED_JOBS,
+        max_finished_jobs: int=MAX_FINISHED_JOBS):
+        '''
+        Constructor used to create the executor of the jobs
+        '''
+        self.executor = ThreadPoolExecutor(max_workers=max_running_jobs, thread_name_prefix='job')
+        self.max_pending_jobs = max_running_jobs + max_queued_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, func, *args, params: dict=None, **kwargs) -> Job:
+        '''
+        Queue a new job, which runs func(job, *args, **kwargs) and keeps its return value as the
+        result. Raises an exception if there are already too many jobs waiting to finish.
+        '''
+
+        with self.lock:
+            pending_jobs = sum(1 for job in self.jobs.values() if not job.is_finished())
+            if pending_jobs >= self.max_pending_jobs:
+                raise Exception(f"There are already {pending_jobs} jobs running or queued")
+            job = Job(kind, params=params)
+            self.jobs[job.id] = job
+            self.remove_finished_jobs()
+        self.executor.submit(self.run, job, func, *args, **kwargs)
+        return job
+
+    def run(self, job: Job, func, *args, **kwargs) -> None:
+        '''
+        Run a job, keeping its result or the error that stopped it
+        '''
+
+        job.set_status('running')
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.set_status('done')
+        except Exception as exception:
+            print(f"{Colors.NOK_RED}[>]{Colors.END} Job {job.id} failed: {exception}")
+            traceback.print_exc()
+            job.error = str(exception)
+            job.set_status('failed')
+
+    def remove_finished_jobs(self) -> None:
+        '''
+        Forget the oldest finished jobs, above the number of finished jobs kept
+        '''
+
+        finished_jobs = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished_jobs[:max(0, len(finished_jobs) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Job|None:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        '''
+        Get the status of all jobs kept, without the state of each device
+        '''
+
+        with self.lock:
+            jobs = list(self.jobs.values())
+        job_list = []
+        for job in jobs:
+            job_dict = job.to_dict()
+            del job_dict['devices']
+            job_list.append(job_dict)
+        return job_list
+
+    def stream_events(self, job: Job, last_event_id: int=0):
+        '''
+        Generate the events of a job in the Server-Sent Events format, starting after the last
+        event received by the client, until the job finishes
+        '''
+
+        while True:
+            events = job.get_events(last_event_id, timeout=KEEPALIVE_INTERVAL)
+            if not events:
+                if job.is_finished():
+                    break
+                # Keep the connection open through proxies while nothing happens
+                yield ': keep-alive\n\n'
+                continue
+            for event_id, event_type, data in events:
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+            last_event_id = events[-1][0]
+            if job.is_finished() and last_event_id == len(job.events):
+                break
+        yield f"event: end\ndata: {json.dumps({'status': job.status})}\n\n"
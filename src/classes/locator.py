@@ -0,0 +1,271 @@
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+from .colors import Colors
+from .oui_index import get_oui_index
+from .port_range import get_interface_type
+from .store import ResultStore, get_key_value, normalize_mac
+
+
+# Information categories used to build the index
+MAC_TABLE_INFO = 'MAC Address Table'
+ARP_TABLE_INFO = 'ARP Table'
+NEIGHBOR_INFOS = {
+    'CDP Neighbors': 'CDP',
+    'Network Diagram CDP': 'CDP',
+    'LLDP Neighbors': 'LLDP',
+    'Network Diagram LLDP': 'LLDP',
+}
+# TextFSM fields (of any vendor) of the IP address of the ARP entries and of the local port of
+# the neighbors. The MAC address and interface of the ARP entries are key columns of the store.
+ARP_IP_COLUMNS = ('address', 'ip_address')
+NEIGHBOR_PORT_COLUMNS = ('local_port', 'local_interface')
+# Entries of the MAC address table that aren't learned on a port
+IGNORED_PORTS = ('cpu', 'router', 'switch', 'drop')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS endpoints (
+    mac TEXT NOT NULL,
+    oui TEXT,
+    vendor TEXT,
+    vlan TEXT NOT NULL,
+    device_ip TEXT NOT NULL,
+    device_hostname TEXT,
+    port TEXT,
+    port_key TEXT,
+    run_id INTEGER,
+    last_seen TEXT,
+    PRIMARY KEY (mac, device_ip, vlan)
+);
+CREATE TABLE IF NOT EXISTS arp_entries (
+    ip TEXT NOT NULL,
+    mac TEXT,
+    device_ip TEXT NOT NULL,
+    device_hostname TEXT,
+    interface TEXT,
+    run_id INTEGER,
+    last_seen TEXT,
+    PRIMARY KEY (ip, device_ip)
+);
+CREATE TABLE IF NOT EXISTS uplinks (
+    device_ip TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    port_key TEXT NOT NULL,
+    port TEXT,
+    run_id INTEGER,
+    PRIMARY KEY (device_ip, protocol, port_key)
+);
+CREATE TABLE IF NOT EXISTS indexed_runs (
+    run_id INTEGER PRIMARY KEY,
+    indexed TEXT
+);
+CREATE INDEX IF NOT EXISTS endpoints_oui ON endpoints(oui);
+CREATE INDEX IF NOT EXISTS endpoints_port ON endpoints(device_ip, port_key);
+CREATE INDEX IF NOT EXISTS arp_entries_mac ON arp_entries(mac);
+CREATE INDEX IF NOT EXISTS uplinks_port ON uplinks(device_ip, port_key);
+'''
+# Ports of the endpoints found, excluding the uplinks known when the lookup is made
+ENDPOINT_QUERY = '''
+SELECT * FROM endpoints WHERE {condition} AND NOT EXISTS (
+    SELECT 1 FROM uplinks WHERE uplinks.device_ip = endpoints.device_ip AND uplinks.port_key = endpoints.port_key)
+ORDER BY run_id DESC, mac LIMIT ?
+'''
+
+
+@lru_cache(maxsize=4096)
+def normalize_port(port: str) -> str:
+    '''
+    Get the key used to compare the names of a port, abbreviated or not (e.g. GigabitEthernet1/0/1
+    and Gi1/0/1 are both gi1/0/1, while TwentyFiveGigE1/0/1 is twe1/0/1), since the MAC address
+    table and the neighbors don't use the same notation
+    '''
+
+    port = str(port).strip()
+    match = re.match(r'^([A-Za-z][A-Za-z-]*?)\s*(\d.*)$', port)
+    if match:
+        return f"{get_interface_type(match.group(1))}{match.group(2)}"
+    return port.lower()
+
+
+def normalize_oui(oui: str) -> str|None:
+    '''
+    Get the OUI (first 6 hexadecimal digits) of a MAC address or prefix in any notation
+    '''
+
+    digits = re.sub(r'[^0-9a-f]', '', str(oui).lower())
+    return digits[:6] if len(digits) >= 6 else None
+
+
+def format_mac(mac: str) -> str:
+    return ':'.join(mac[index:index + 2] for index in range(0, 12, 2))
+
+
+class EndpointLocator():
+    '''
+    Class used to find where the endpoints are connected, using an index of the MAC address and ARP
+    tables kept in the result store. Each MAC address is mapped to the device, port and VLAN where
+    it was last seen, ignoring the uplinks (ports with CDP or LLDP neighbors), so only the access
+    port of the endpoint is found. The index is updated incrementally, once per run stored.
+    '''
+
+    def __init__(self, result_store: ResultStore):
+        '''
+        Constructor used to create the index tables in the result store, if they don't exist yet
+        '''
+        self.result_store = result_store
+        with result_store.lock:
+            result_store.connection.executescript(SCHEMA)
+
+    def update(self) -> int:
+        '''
+        Index the runs finished since the last update, from the oldest to the most recent, and
+        return the number of runs indexed
+        '''
+
+        run_list = self.result_store.query('SELECT id, started FROM runs WHERE finished IS NOT NULL '
+            'AND id NOT IN (SELECT run_id FROM indexed_runs) ORDER BY id')
+        for run in run_list:
+            self.index_run(run['id'], run['started'])
+        if run_list:
+            print(f"{Colors.OK_GREEN}[>]{Colors.END} Endpoint index updated with {len(run_list)} runs")
+        return len(run_list)
+
+    def index_run(self, run_id: int, started: str=None) -> None:
+        '''
+        Index the MAC address tables, ARP tables and neighbors of a run. The neighbors are indexed
+        first, so the MAC addresses learned on uplinks of the same run are not indexed.
+        '''
+
+        # The MAC address, VLAN and port of the rows were already extracted when they were stored,
+        # so only the neighbors and ARP entries need to be decoded
+        infos = [MAC_TABLE_INFO, ARP_TABLE_INFO, *NEIGHBOR_INFOS.keys()]
+        row_list = self.result_store.query(f"SELECT ip_address, hostname, info, mac, vlan, port, "
+            f"CASE WHEN info = ? THEN json_extract(data, '$.vendor') ELSE data END AS data FROM rows "
+            f"WHERE run_id = ? AND info IN ({', '.join('?' * len(infos))}) ORDER BY id", (MAC_TABLE_INFO, run_id, *infos))
+
+        uplinks = {}
+        arp_entries = {}
+        endpoints = {}
+        for row in row_list:
+            device_ip = row['ip_address']
+
+            if row['info'] == MAC_TABLE_INFO:
+                mac, port = row['mac'], row['port']
+                if mac is None or not port or port.lower() in IGNORED_PORTS:
+                    continue
+                vlan = row['vlan'] or ''
+                endpoints[(mac, device_ip, vlan)] = [mac, mac[:6], row['data'], vlan, device_ip, row['hostname'],
+                    port, normalize_port(port), run_id, started]
+
+            elif row['info'] == ARP_TABLE_INFO:
+                ip = get_key_value(json.loads(row['data']), ARP_IP_COLUMNS)
+                if ip and row['mac']:
+                    arp_entries[(ip, device_ip)] = (ip, row['mac'], device_ip, row['hostname'], row['port'], run_id, started)
+
+            else:
+                port = get_key_value(json.loads(row['data']), NEIGHBOR_PORT_COLUMNS)
+                ports = uplinks.setdefault((device_ip, NEIGHBOR_INFOS[row['info']]), {})
+                if port:
+                    ports[normalize_port(port)] = port
+
+        # Resolve the vendors not added when the MAC address tables were parsed
+        missing_vendors = [endpoint for endpoint in endpoints.values() if endpoint[2] is None]
+        oui_index = get_oui_index() if missing_vendors else None
+        if oui_index:
+            vendor_list = oui_index.lookup_many([endpoint[0] for endpoint in missing_vendors])
+            for endpoint, vendor in zip(missing_vendors, vendor_list):
+                endpoint[2] = vendor
+
+        with self.result_store.lock, self.result_store.connection as connection:
+            # The neighbors of a device replace the ones found by the same protocol on previous runs
+            for (device_ip, protocol), ports in uplinks.items():
+                connection.execute('DELETE FROM uplinks WHERE device_ip = ? AND protocol = ?', (device_ip, protocol))
+                connection.executemany('INSERT INTO uplinks (device_ip, protocol, port_key, port, run_id) VALUES (?, ?, ?, ?, ?)',
+                    [(device_ip, protocol, port_key, port, run_id) for port_key, port in ports.items()])
+
+            uplink_ports = set((row[0], row[1]) for row in connection.execute('SELECT device_ip, port_key FROM uplinks'))
+            # Runs indexed out of order don't replace what was seen by more recent runs
+            connection.executemany('''
+                INSERT INTO endpoints (mac, oui, vendor, vlan, device_ip, device_hostname, port, port_key, run_id, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (mac, device_ip, vlan) DO UPDATE SET vendor = COALESCE(excluded.vendor, vendor),
+                    device_hostname = excluded.device_hostname, port = excluded.port, port_key = excluded.port_key,
+                    run_id = excluded.run_id, last_seen = excluded.last_seen
+                WHERE excluded.run_id >= endpoints.run_id''',
+                [endpoint for endpoint in endpoints.values() if (endpoint[4], endpoint[7]) not in uplink_ports])
+            connection.executemany('''
+                INSERT INTO arp_entries (ip, mac, device_ip, device_hostname, interface, run_id, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ip, device_ip) DO UPDATE SET mac = excluded.mac, device_hostname = excluded.device_hostname,
+                    interface = excluded.interface, run_id = excluded.run_id, last_seen = excluded.last_seen
+                WHERE excluded.run_id >= arp_entries.run_id''', arp_entries.values())
+            connection.execute('INSERT OR REPLACE INTO indexed_runs (run_id, indexed) VALUES (?, ?)',
+                (run_id, datetime.now().isoformat(timespec='seconds')))
+
+    def locate(self, mac: str=None, ip: str=None, oui: str=None, vendor: str=None, limit: int=100) -> list:
+        '''
+        Find where endpoints are connected, by MAC address (any notation), IP address (resolved
+        with the ARP tables), OUI or vendor name (partial match). The most recently seen endpoints
+        come first. An IP address whose MAC address is not on any access port is returned with the
+        device and interface of its ARP entry.
+        '''
+
+        if mac:
+            mac_list = [normalize_mac(mac)]
+            if mac_list[0] is None:
+                raise ValueError(f"Invalid MAC address: {mac}")
+            endpoint_list = self.find_endpoints('mac = ?', mac_list, limit)
+        elif ip:
+            mac_list = [row['mac'] for row in self.result_store.query(
+                'SELECT DISTINCT mac FROM arp_entries WHERE ip = ? ORDER BY run_id DESC', (ip,))]
+            endpoint_list = self.find_endpoints(f"mac IN ({', '.join('?' * len(mac_list))})", mac_list, limit) if mac_list else []
+        elif oui:
+            oui_value = normalize_oui(oui)
+            if oui_value is None:
+                raise ValueError(f"Invalid OUI: {oui}")
+            endpoint_list = self.find_endpoints('oui = ?', [oui_value], limit)
+        elif vendor:
+            endpoint_list = self.find_endpoints('vendor LIKE ?', [f"%{vendor}%"], limit)
+        else:
+            raise ValueError('A MAC address, IP address, OUI or vendor is required')
+
+        # IP addresses of each MAC address found
+        mac_list = list(set(endpoint['mac'] for endpoint in endpoint_list))
+        ip_addresses = {}
+        if mac_list:
+            for row in self.result_store.query(f"SELECT DISTINCT mac, ip FROM arp_entries "
+                f"WHERE mac IN ({', '.join('?' * len(mac_list))}) ORDER BY run_id DESC", mac_list):
+                ip_addresses.setdefault(row['mac'], []).append(row['ip'])
+
+        result_list = []
+        for endpoint in endpoint_list:
+            result_list.append({
+                'mac': format_mac(endpoint['mac']),
+                'vendor': endpoint['vendor'],
+                'ip_addresses': ip_addresses.get(endpoint['mac'], []),
+                'device_ip_address': endpoint['device_ip'],
+                'device_hostname': endpoint['device_hostname'],
+                'port': endpoint['port'],
+                'vlan': endpoint['vlan'] or None,
+                'run_id': endpoint['run_id'],
+                'last_seen': endpoint['last_seen'],
+            })
+
+        if ip and not result_list:
+            for entry in self.result_store.query('SELECT * FROM arp_entries WHERE ip = ? ORDER BY run_id DESC LIMIT ?', (ip, limit)):
+                result_list.append({
+                    'mac': format_mac(entry['mac']),
+                    'vendor': None,
+                    'ip_addresses': [entry['ip']],
+                    'device_ip_address': entry['device_ip'],
+                    'device_hostname': entry['device_hostname'],
+                    'port': entry['interface'],
+                    'vlan': None,
+                    'run_id': entry['run_id'],
+                    'last_seen': entry['last_seen'],
+                })
+
+        return result_list
+
+    def find_endpoints(self, condition: str, parameters: list, limit: int) -> list:
+        return self.result_store.query(ENDPOINT_QUERY.format(condition=condition), (*parameters, limit))
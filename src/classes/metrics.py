@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from .colors import Colors
+
+
+# Phases measured on each device. Netmiko establishes the TCP connection, the SSH session and
+# the authentication in a single call (ConnectHandler), so they are measured together as connect.
+PHASES = ('connect', 'enable', 'paging_disable', 'save_config', 'command', 'parse', 'render', 'write', 'disconnect')
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Prefix of the metrics exposed to Prometheus
+METRIC_PREFIX = 'netauto'
+
+
+def percentile(values: list, percent: float) -> float|None:
+    '''
+    Get the percentile of a sorted list of values, using the nearest rank
+    '''
+
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+class Histogram():
+    '''
+    Class used to count durations in cumulative buckets, as the Prometheus histograms
+    '''
+
+    def __init__(self, buckets: tuple=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+
+    def to_prometheus(self, name: str, labels: str) -> list:
+        '''
+        Get the lines of the histogram in the Prometheus text format
+        '''
+
+        lines = [f'{name}_bucket{{{labels},le="{bucket}"}} {count}' for bucket, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RunMetrics():
+    '''
+    Class used to record the duration of each phase of each device during a single run (get,
+    set or replay of configurations). The durations are also added to the histograms of the
+    registry, and can be saved as a JSON summary once the run finishes.
+    '''
+
+    def __init__(self, registry, flow: str):
+        '''
+        Constructor used to create the metrics of a new run
+        '''
+        self.registry = registry
+        self.flow = flow
+        self.start_datetime = datetime.now()
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+        # Durations of each phase, and of each command, over all devices
+        self.phases = {}
+        self.commands = {}
+        # Total duration of each phase, for each device
+        self.devices = {}
+
+    def observe(self, ip_address: str|None, phase: str, seconds: float, command: str=None) -> None:
+        '''
+        Record the duration of a phase of a device. Durations not related to a device (e.g. the
+        excel files) have no IP address and are only added to the phase totals.
+        '''
+
+        with self.lock:
+            self.phases.setdefault(phase, []).append(seconds)
+            if command is not None:
+                self.commands.setdefault(command, []).append(seconds)
+            if ip_address is not None:
+                device = self.devices.setdefault(ip_address, {})
+                device[phase] = device.get(phase, 0.0) + seconds
+        self.registry.observe(self.flow, phase, seconds)
+
+    @contextmanager
+    def timer(self, ip_address: str|None, phase: str, command: str=None):
+        '''
+        Measure the duration of the code inside the with statement, even if it raises an exception
+        '''
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(ip_address, phase, time.perf_counter() - start_time, command=command)
+
+    def summary(self) -> dict:
+        '''
+        Summarize the run: statistics of each phase and command, and phase totals of each device
+        '''
+
+        def statistics(values: list) -> dict:
+            values = sorted(values)
+            return {
+                'count': len(values),
+                'total': sum(values),
+                'min': values[0],
+                'p50': percentile(values, 50),
+                'p90': percentile(values, 90),
+                'p99': percentile(values, 99),
+                'max': values[-1],
+            }
+
+        with self.lock:
+            return {
+                'flow': self.flow,
+                'start': self.start_datetime.isoformat(timespec='seconds'),
+                'elapsed': time.perf_counter() - self.start_time,
+                'phases': {phase: statistics(self.phases[phase]) for phase in PHASES if phase in self.phases},
+                'commands': {command: statistics(values) for command, values in self.commands.items()},
+                'devices': {ip_address: dict(phases) for ip_address, phases in self.devices.items()},
+            }
+
+    def save(self, dir: str) -> str:
+        '''
+        Save the summary of the run in outputfiles/Metrics and return the filename
+        '''
+
+        path = f"{dir}/outputfiles/Metrics"
+        os.makedirs(path, exist_ok=True)
+        filename = f"{path}/[{self.start_datetime.strftime('%Y%m%d%H%M%S')}] {self.flow}_metrics.json"
+        with open(filename, mode='w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, indent=2)
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Metrics saved - {os.path.basename(filename)}")
+        return filename
+
+
+class MetricsRegistry():
+    '''
+    Class used to keep, for the whole process, the histograms of the duration of each phase of
+    all runs, exposed in the Prometheus text format
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.runs = {}
+
+    def new_run(self, flow: str) -> RunMetrics:
+        '''
+        Create the metrics of a new run of a given flow (e.g. get_configs)
+        '''
+
+        with self.lock:
+            self.runs[flow] = self.runs.get(flow, 0) + 1
+        return RunMetrics(self, flow)
+
+    def observe(self, flow: str, phase: str, seconds: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get((flow, phase))
+            if histogram is None:
+                histogram = self.histograms[(flow, phase)] = Histogram()
+            histogram.observe(seconds)
+
+    def to_prometheus(self) -> str:
+        '''
+        Get all metrics in the Prometheus text exposition format
+        '''
+
+        name = f"{METRIC_PREFIX}_phase_duration_seconds"
+        with self.lock:
+            lines = [
+                f"# HELP {METRIC_PREFIX}_runs_total Runs started, per flow",
+                f"# TYPE {METRIC_PREFIX}_runs_total counter",
+            ]
+            lines.extend(f'{METRIC_PREFIX}_runs_total{{flow="{flow}"}} {count}' for flow, count in sorted(self.runs.items()))
+            lines.extend([
+                f"# HELP {name} Duration of each phase of the interaction with the devices",
+                f"# TYPE {name} histogram",
+            ])
+            for (flow, phase), histogram in sorted(self.histograms.items()):
+                lines.extend(histogram.to_prometheus(name, f'flow="{flow}",phase="{phase}"'))
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics shared by all clients of the process (e.g. all runs of the web application)
+METRICS = MetricsRegistry()
@@ -0,0 +1,181 @@
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+from .colors import Colors
+
+
+# Default location of the OUI index, generated from the IEEE registries by build_oui_index.py
+OUI_INDEX_PATH = os.path.join(os.path.dirname(__file__), '../oui_index.bin')
+# Prefix lengths (in bits) of the IEEE registries: MA-S, MA-M and MA-L (most specific first)
+PREFIX_BITS = (36, 28, 24)
+
+MAGIC = b'OUIX'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+SECTION = struct.Struct('<II')
+
+
+def mac_to_int(mac: str) -> int|None:
+    '''
+    Convert a MAC address in any of the usual formats (aabb.ccdd.eeff, aa:bb:cc:dd:ee:ff,
+    aa-bb-cc-dd-ee-ff) to a 48-bit integer
+    '''
+
+    digits = re.sub(r'[^0-9a-fA-F]', '', mac) if isinstance(mac, str) else ''
+    if len(digits) != 12:
+        return None
+    return int(digits, 16)
+
+
+def build_index(registry_files: list, path: str=OUI_INDEX_PATH) -> int:
+    '''
+    Build the OUI index from the IEEE registry CSV files (oui.csv, mam.csv and oui36.csv), with
+    the columns Registry, Assignment, Organization Name and Organization Address. Returns the
+    number of prefixes written to the index.
+    '''
+
+    sections = {bits: {} for bits in PREFIX_BITS}
+    for registry_file in registry_files:
+        with open(registry_file, mode='r', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                assignment = row['Assignment'].strip()
+                bits = len(assignment) * 4
+                if bits in sections:
+                    sections[bits][int(assignment, 16)] = row['Organization Name'].strip()
+
+    # Vendor names are stored only once, in a blob at the end of the file
+    names = {}
+    blob = bytearray()
+    for prefixes in sections.values():
+        for name in prefixes.values():
+            if name not in names:
+                names[name] = len(blob)
+                encoded = name.encode('utf-8')
+                blob += struct.pack('<H', len(encoded)) + encoded
+
+    with open(path, mode='wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        for bits, prefixes in sections.items():
+            file.write(SECTION.pack(bits, len(prefixes)))
+        # Each section has the sorted prefixes (uint64) followed by the name offsets (uint32)
+        for prefixes in sections.values():
+            keys = sorted(prefixes.keys())
+            file.write(struct.pack(f"<{len(keys)}Q", *keys))
+            file.write(struct.pack(f"<{len(keys)}I", *(names[prefixes[key]] for key in keys)))
+        file.write(blob)
+
+    return sum(len(prefixes) for prefixes in sections.values())
+
+
+class OuiIndex():
+    '''
+    Class used to find the vendor of MAC addresses using a memory-mapped index of the IEEE
+    24, 28 and 36-bit prefixes. The index is loaded once per process and shared by all threads.
+    '''
+
+    def __init__(self, path: str=OUI_INDEX_PATH):
+        '''
+        Constructor used to map the index file in memory
+        '''
+        self.file = open(path, mode='rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.mmap)
+
+        magic, version, section_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Invalid OUI index: {path}")
+
+        offset = HEADER.size
+        section_info = []
+        for _ in range(section_count):
+            section_info.append(SECTION.unpack_from(self.mmap, offset))
+            offset += SECTION.size
+
+        self.sections = []
+        for bits, count in section_info:
+            keys = view[offset:offset + count * 8].cast('Q')
+            offset += count * 8
+            name_offsets = view[offset:offset + count * 4].cast('I')
+            offset += count * 4
+            self.sections.append((bits, keys, name_offsets))
+        self.names_offset = offset
+        self.names = {}
+
+    def get_name(self, name_offset: int) -> str:
+        '''
+        Read the vendor name stored at a given offset of the names blob
+        '''
+
+        if name_offset not in self.names:
+            position = self.names_offset + name_offset
+            length, = struct.unpack_from('<H', self.mmap, position)
+            self.names[name_offset] = self.mmap[position + 2:position + 2 + length].decode('utf-8')
+        return self.names[name_offset]
+
+    @staticmethod
+    def search(keys, prefix: int, low: int=0) -> int:
+        '''
+        Binary search of a prefix in the sorted keys of a section, starting at a given position
+        '''
+
+        high = len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[middle] < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, mac: str) -> str|None:
+        '''
+        Get the vendor of a single MAC address
+        '''
+        return self.lookup_many([mac])[0]
+
+    def lookup_many(self, macs: list) -> list:
+        '''
+        Get the vendor of a list of MAC addresses, in the same order. The addresses are converted
+        and sorted once, and each section of the index is walked only once, from the lowest to the
+        highest prefix, using the most specific prefix found for each address.
+        '''
+
+        values = {mac: mac_to_int(mac) for mac in set(macs)}
+        unique_values = sorted(set(value for value in values.values() if value is not None))
+        vendors = {}
+
+        for bits, keys, name_offsets in self.sections:
+            position = 0
+            for value in unique_values:
+                if value in vendors:
+                    continue
+                prefix = value >> (48 - bits)
+                position = self.search(keys, prefix, position)
+                if position < len(keys) and keys[position] == prefix:
+                    vendors[value] = self.get_name(name_offsets[position])
+
+        return [vendors.get(values[mac]) for mac in macs]
+
+
+OUI_INDEX = None
+OUI_INDEX_LOCK = threading.Lock()
+
+
+def get_oui_index() -> OuiIndex|None:
+    '''
+    Get the OUI index of the process, loading it on the first call. If the index file doesn't
+    exist, the MAC vendors are not resolved.
+    '''
+
+    global OUI_INDEX
+    with OUI_INDEX_LOCK:
+        if OUI_INDEX is None:
+            if not os.path.exists(OUI_INDEX_PATH):
+                print(f"{Colors.NOK_RED}[>]{Colors.END} OUI index not found, please run build_oui_index.py")
+                OUI_INDEX = False
+            else:
+                OUI_INDEX = OuiIndex(OUI_INDEX_PATH)
+    return OUI_INDEX or None
@@ -0,0 +1,207 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from .colors import Colors
+
+
+# Maximum number of files waiting to be written, before the device threads wait for the writer
+MAX_QUEUE_SIZE = 1000
+# Maximum number of files written in each batch
+BATCH_SIZE = 64
+# When to force the files to disk: never (left to the OS), once per batch or after each file
+FSYNC_POLICIES = ('never', 'batch', 'always')
+
+
+class OutputWriter():
+    '''
+    Class used to write the output files in a dedicated thread, so the threads interacting with
+    the devices never block on disk (e.g. on synced root directories). Files are queued in a
+    bounded queue and written in batches, creating each directory only once. Each file queued can
+    be waited for (see wait), before reading it back.
+    '''
+
+    def __init__(self, max_queue_size: int=MAX_QUEUE_SIZE, batch_size: int=BATCH_SIZE, fsync: str='never'):
+        '''
+        Constructor used to create a new writer. The writer thread is only started when the first
+        file is submitted.
+        '''
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.directories = set()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Files queued and not written yet, by full filename, and files that couldn't be written
+        self.pending = {}
+        self.failed = set()
+        self.pending_lock = threading.Lock()
+
+    def start(self) -> None:
+        '''
+        Start the writer thread, if it isn't running yet
+        '''
+
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, name='output-writer', daemon=True)
+            self.thread.start()
+            # Make sure queued files are written if the script ends without closing the client
+            atexit.register(self.close)
+
+    def submit(self, path: str, filename: str, data, on_written=None) -> None:
+        '''
+        Queue a file to be written. If the queue is full, waits until the writer has space for it.
+        Once the file is written, on_written is called with the time spent writing it.
+        '''
+
+        self.start()
+        with self.pending_lock:
+            self.pending.setdefault(f"{path}/{filename}", threading.Event())
+        self.queue.put((path, filename, data, on_written))
+
+    def done(self, path: str, filename: str, written: bool) -> None:
+        '''
+        Mark a file as written (or not), waking up whoever is waiting for it
+        '''
+
+        with self.pending_lock:
+            full_filename = f"{path}/{filename}"
+            if written:
+                self.failed.discard(full_filename)
+            else:
+                self.failed.add(full_filename)
+            event = self.pending.pop(full_filename, None)
+        if event is not None:
+            event.set()
+
+    def wait(self, full_filename: str) -> bool:
+        '''
+        Wait until a file queued is written. Returns False if the file couldn't be written, and
+        True if it was written or wasn't queued in this writer.
+        '''
+
+        if full_filename is None:
+            return True
+        with self.pending_lock:
+            event = self.pending.get(full_filename)
+        if event is not None:
+            event.wait()
+        with self.pending_lock:
+            return full_filename not in self.failed
+
+    def make_dirs(self, path: str) -> None:
+        '''
+        Create the folder where the file will be written, only if it wasn't created before
+        '''
+
+        if path not in self.directories:
+            os.makedirs(path, exist_ok=True)
+            self.directories.add(path)
+
+    def write(self, path: str, filename: str, data):
+        '''
+        Write a single file, according to its extension, and return it still open so it can be
+        forced to disk according to the fsync policy
+        '''
+
+        self.make_dirs(path)
+        file = open(f"{path}/{filename}", mode='w', encoding='utf-8')
+        try:
+            # Save .json files
+            if filename.endswith('.json'):
+                json.dump(data, file, indent=2)
+            # Save .txt files
+            else:
+                file.write(data)
+        except Exception:
+            file.close()
+            raise
+        return file
+
+    def run(self) -> None:
+        '''
+        Write the queued files, in batches, until the writer is closed
+        '''
+
+        while True:
+            batch = [self.queue.get()]
+            # Get all files already waiting, up to the batch size
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            file_list = []
+            for item in batch:
+                # Writer was closed
+                if item is None:
+                    stop = True
+                    continue
+                path, filename, data, on_written = item
+                try:
+                    start_time = time.perf_counter()
+                    file = self.write(path, filename, data)
+                    if self.fsync == 'batch':
+                        file_list.append((path, filename, file))
+                        # The time spent forcing the batch to disk isn't attributed to each file
+                        if on_written is not None:
+                            on_written(time.perf_counter() - start_time)
+                        continue
+                    try:
+                        if self.fsync == 'always':
+                            file.flush()
+                            os.fsync(file.fileno())
+                    finally:
+                        file.close()
+                    self.done(path, filename, True)
+                    if on_written is not None:
+                        on_written(time.perf_counter() - start_time)
+                except Exception as exception:
+                    print(f"{Colors.NOK_RED}[>]{Colors.END} Couldn't save file {item[1]}: {exception}")
+                    self.done(path, filename, False)
+
+            # Force all files of the batch to disk at once
+            for path, filename, file in file_list:
+                written = False
+                try:
+                    file.flush()
+                    os.fsync(file.fileno())
+                    written = True
+                except Exception as exception:
+                    print(f"{Colors.NOK_RED}[>]{Colors.END} Couldn't save file {file.name}: {exception}")
+                finally:
+                    file.close()
+                    self.done(path, filename, written)
+
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        '''
+        Wait until all queued files are written
+        '''
+
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self) -> None:
+        '''
+        Write all queued files and stop the writer thread
+        '''
+
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                return
+            self.queue.put(None)
+            self.thread.join()
+            atexit.unregister(self.close)
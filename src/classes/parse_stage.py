@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+from .colors import Colors
+from .configs import post_process_output
+from .profiler import SamplingProfiler
+from .textfsm_cache import TEMPLATE_CACHE
+
+
+# Profiler of the parse worker, if the run is being profiled
+WORKER_PROFILER = None
+
+
+def init_worker(template_env: str, command_list: dict, profile_path: str=None) -> None:
+    '''
+    Initialize a parse worker, pointing TextFSM to the same templates used by the main process
+    and compiling them once, before the first output is received. If the run is being profiled,
+    the worker is profiled too, until it exits.
+    '''
+
+    global WORKER_PROFILER
+    if profile_path is not None:
+        WORKER_PROFILER = SamplingProfiler(profile_path, f"parse_worker_{os.getpid()}")
+        WORKER_PROFILER.start()
+        # Worker processes don't run the atexit functions, only the multiprocessing finalizers
+        util.Finalize(WORKER_PROFILER, WORKER_PROFILER.stop, exitpriority=10)
+
+    if template_env is not None:
+        os.environ['NET_TEXTFSM'] = template_env
+    TEMPLATE_CACHE.warm_up(command_list)
+
+
+def parse_raw_output(raw_output: str, platform: str, command: str, info_list: list) -> dict:
+    '''
+    Parse the raw output of a command with TextFSM and apply the post-processing of each
+    information category that requested it. Runned by the parse workers.
+    '''
+
+    structured_output = TEMPLATE_CACHE.parse(raw_output=raw_output, platform=platform, command=command)
+    # Output couldn't be converted
+    if structured_output is None or isinstance(structured_output, str):
+        return {info: None for info in info_list}
+
+    return {info: post_process_output(platform, info, [dict(entry) for entry in structured_output])
+        for info in info_list}
+
+
+def timed_parse_raw_output(*args) -> tuple:
+    '''
+    Parse the raw output of a command and return the results with the time spent by the worker
+    parsing it, excluding the time the output waited in the queue
+    '''
+
+    start_time = time.perf_counter()
+    results = parse_raw_output(*args)
+    return results, time.perf_counter() - start_time
+
+
+class ParseStage():
+    '''
+    Class used to parse the command outputs in a pool of processes, separated from the threads
+    that interact with the devices. Outputs are submitted as soon as they are received and the
+    results are attached to the GetConfigs objects asynchronously, so parsing scales with the
+    number of cores while the device threads keep reading.
+    '''
+
+    def __init__(self, command_list: dict, workers: int=None, profile_path: str=None):
+        '''
+        Constructor used to create the pool of parse workers, profiled if a profile path is given
+        '''
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+            initargs=(os.environ.get('NET_TEXTFSM'), command_list, profile_path))
+        self.lock = threading.Lock()
+        # Outputs still being parsed and completion callbacks, for each device
+        self.pending = {}
+        self.callbacks = {}
+
+    def submit(self, device, command: str, config_list: list, raw_output: str) -> None:
+        '''
+        Send the raw output of a command to be parsed by the workers, for all the information
+        categories (GetConfigs objects) that requested it
+        '''
+
+        print(f"{Colors.OK_GREEN}[{device.ip_address}]{Colors.END} Parsing output: {command}")
+        with self.lock:
+            self.pending[device] = self.pending.get(device, 0) + 1
+        future = self.executor.submit(timed_parse_raw_output, raw_output, device.vendor_os, command,
+            [config.info for config in config_list])
+        future.add_done_callback(lambda future: self.apply(device, command, config_list, future))
+
+    def when_parsed(self, device, callback) -> None:
+        '''
+        Call the callback with the device once all its outputs are parsed (immediately, if there
+        is nothing left to parse)
+        '''
+
+        with self.lock:
+            if self.pending.get(device, 0) > 0:
+                self.callbacks[device] = callback
+                return
+        callback(device)
+
+    def apply(self, device, command: str, config_list: list, future) -> None:
+        '''
+        Attach the parsed output to each GetConfigs object, once the worker finishes parsing
+        '''
+
+        try:
+            self.apply_results(device, command, config_list, future)
+        finally:
+            with self.lock:
+                self.pending[device] -= 1
+                callback = self.callbacks.pop(device, None) if self.pending[device] == 0 else None
+            if callback is not None:
+                callback(device)
+
+    def apply_results(self, device, command: str, config_list: list, future) -> None:
+        '''
+        Set the output parsed by the worker in each GetConfigs object
+        '''
+
+        try:
+            results, seconds = future.result()
+        except Exception as exception:
+            print(f"{Colors.NOK_RED}[{device.ip_address}]{Colors.END} Couldn't parse the output of the command: {command}")
+            print(exception)
+            return
+        device.client.metrics.observe(device.ip_address, 'parse', seconds, command=command)
+
+        for config in config_list:
+            output_parsed = results[config.info]
+            if output_parsed is None:
+                print(f"{Colors.NOK_RED}[{device.ip_address}]{Colors.END} Couldn't parse the output of the command: {command}")
+                continue
+            config.output_parsed = output_parsed
+
+            # Append to the output_parsed, the vendor of the MAC address found on the port
+            if config.info == 'MAC Address Table':
+                config.add_mac_vendors()
+
+    def close(self) -> None:
+        '''
+        Wait for all outputs to be parsed and stop the workers
+        '''
+
+        self.executor.shutdown(wait=True)
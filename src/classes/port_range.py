@@ -0,0 +1,183 @@
+import json
+import re
+from functools import lru_cache
+
+
+# Port name: interface type (if any), slot/module numbers and port number, or a range of ports
+# (e.g. 1:12, 1:1-48, Gi1/0/1, GigabitEthernet1/0/1 - 48, ge.1.1)
+PORT_PATTERN = re.compile(r'^(?P<prefix>[A-Za-z][A-Za-z-]*?\.?)?\s*(?P<base>(?:\d+[:/.])*)(?P<first>\d+)(?:\s*-\s*(?P<last>\d+))?$')
+# Port range syntax of each vendor_os: separator of the first and last port of a range,
+# separator of the ranges and maximum number of ranges accepted by a single command
+PORT_FORMATS = {
+    'cisco_ios': {'range': ' - ', 'separator': ', ', 'max_ranges': 5},
+    'cisco_nxos': {'range': '-', 'separator': ', ', 'max_ranges': None},
+    'extreme_exos': {'range': '-', 'separator': ',', 'max_ranges': None},
+    'extreme': {'range': '-', 'separator': ';', 'max_ranges': None},
+}
+DEFAULT_PORT_FORMAT = {'range': '-', 'separator': ',', 'max_ranges': None}
+# Keyword used by the commands to select all ports, kept as is
+ALL_PORTS = 'all'
+# Interface types, by full name and shortest abbreviation accepted. Any name between them is the
+# same type (e.g. Gi, Gig and GigabitEthernet), while Tw and Twe are different types.
+INTERFACE_TYPES = (
+    ('fastethernet', 'fa'),
+    ('gigabitethernet', 'gi'),
+    ('twogigabitethernet', 'tw'),
+    ('fivegigabitethernet', 'fi'),
+    ('tengigabitethernet', 'te'),
+    ('twentyfivegige', 'twe'),
+    ('fortygigabitethernet', 'fo'),
+    ('fiftygige', 'fif'),
+    ('hundredgige', 'hu'),
+    ('twohundredgige', 'two'),
+    ('fourhundredgige', 'fou'),
+    ('appgigabitethernet', 'ap'),
+    ('ethernet', 'et'),
+    ('port-channel', 'po'),
+    ('vlan', 'vl'),
+    ('loopback', 'lo'),
+    ('tunnel', 'tu'),
+)
+
+
+@lru_cache(maxsize=256)
+def get_interface_type(name: str) -> str:
+    '''
+    Get the abbreviation of an interface type, abbreviated or not (e.g. GigabitEthernet and Gi are
+    both gi, TwoGigabitEthernet is tw and TwentyFiveGigE is twe). Unknown types are kept, in
+    lowercase.
+    '''
+
+    name = name.lower()
+    for full_name, abbreviation in INTERFACE_TYPES:
+        if full_name.startswith(name) and name.startswith(abbreviation):
+            return abbreviation
+    return name
+
+
+def split_ports(ports) -> list:
+    '''
+    Get the list of port names (or ranges) of a list, or of a string with ports separated by
+    commas or semicolons
+    '''
+
+    if ports is None:
+        return []
+    if isinstance(ports, (str, int)):
+        ports = re.split(r'[,;]', str(ports))
+    return [str(port).strip() for port in ports if str(port).strip()]
+
+
+def is_all_ports(ports) -> bool:
+    return any(port.lower() == ALL_PORTS for port in split_ports(ports))
+
+
+def parse_ports(ports) -> dict:
+    '''
+    Parse the ports, expanding the ranges, and group them by interface type and slot/module.
+    Returns {(type key, base): (type, base, set of port numbers)}, where the type key is the
+    abbreviation of the interface type (see get_interface_type), so abbreviated and full names
+    (e.g. Gi1/0/1 and GigabitEthernet1/0/2) are grouped together.
+    '''
+
+    groups = {}
+    for port in split_ports(ports):
+        match = PORT_PATTERN.match(port)
+        if match is None:
+            raise ValueError(f"Invalid port: {port}")
+        prefix = match.group('prefix') or ''
+        first = int(match.group('first'))
+        last = int(match.group('last') or first)
+        if last < first:
+            raise ValueError(f"Invalid port range: {port}")
+        key = (get_interface_type(prefix), match.group('base'))
+        groups.setdefault(key, (prefix, match.group('base'), set()))[2].update(range(first, last + 1))
+    return groups
+
+
+def sort_key(key: tuple) -> tuple:
+    return key[0], tuple(int(number) for number in re.findall(r'\d+', key[1]))
+
+
+def expand_ports(ports, vendor_os: str=None) -> list:
+    '''
+    Get the individual ports of a list of ports and ranges, without duplicates and sorted by
+    slot/module and port number (e.g. ['1:10', '1:2-3'] is ['1:2', '1:3', '1:10'])
+    '''
+
+    if is_all_ports(ports):
+        return [ALL_PORTS]
+    groups = parse_ports(ports)
+    return [f"{prefix}{base}{number}" for key in sorted(groups, key=sort_key)
+        for prefix, base, numbers in [groups[key]] for number in sorted(numbers)]
+
+
+def compact_ports(ports, vendor_os: str=None) -> list:
+    '''
+    Get the shortest list of ranges with the same ports, in the syntax of the vendor_os (e.g.
+    ['1:1', '1:2', ..., '1:48'] is ['1:1-48'] for extreme_exos and ['Gi1/0/1', ..., 'Gi1/0/48']
+    is ['Gi1/0/1 - 48'] for cisco_ios)
+    '''
+
+    if is_all_ports(ports):
+        return [ALL_PORTS]
+    port_format = PORT_FORMATS.get(vendor_os, DEFAULT_PORT_FORMAT)
+    groups = parse_ports(ports)
+    ranges = []
+    for key in sorted(groups, key=sort_key):
+        prefix, base, numbers = groups[key]
+        numbers = sorted(numbers)
+        first = previous = numbers[0]
+        for number in numbers[1:] + [None]:
+            if number is not None and number == previous + 1:
+                previous = number
+                continue
+            if first == previous:
+                ranges.append(f"{prefix}{base}{first}")
+            else:
+                ranges.append(f"{prefix}{base}{first}{port_format['range']}{previous}")
+            first = previous = number
+    return ranges
+
+
+def port_ranges(ports, vendor_os: str=None) -> list:
+    '''
+    Get the port lists to be used by the commands of the vendor_os, each one with as many ranges
+    as a single command accepts (e.g. interface range of cisco_ios accepts up to 5 ranges)
+    '''
+
+    port_format = PORT_FORMATS.get(vendor_os, DEFAULT_PORT_FORMAT)
+    ranges = compact_ports(ports, vendor_os)
+    max_ranges = port_format['max_ranges'] or len(ranges) or 1
+    return [port_format['separator'].join(ranges[index:index + max_ranges]) for index in range(0, len(ranges), max_ranges)]
+
+
+def merge_interfaces(interfaces: list, vendor_os: str=None, key: str='id') -> list:
+    '''
+    Merge the interfaces with the same settings in interface ranges, so each group of interfaces
+    is configured once. Returns a copy of the settings of each group, with its port list in the key.
+    Interfaces whose port list can't be parsed (e.g. Gi1/0/1-Gi1/0/4) are kept as they are.
+    '''
+
+    groups = {}
+    for index, interface in enumerate(interfaces or []):
+        settings = {name: value for name, value in interface.items() if name != key}
+        ports = split_ports(interface[key])
+        try:
+            parse_ports(ports)
+        except ValueError:
+            groups[index] = (settings, None, interface[key])
+            continue
+        digest = json.dumps(settings, sort_keys=True, default=str)
+        groups.setdefault(digest, (settings, [], None))[1].extend(ports)
+    return [{key: ports, **settings} for settings, port_list, original in groups.values()
+        for ports in (port_ranges(port_list, vendor_os) if port_list is not None else [original])]
+
+
+# Filters available in the jinja2 templates
+PORT_FILTERS = {
+    'expand_ports': expand_ports,
+    'compact_ports': compact_ports,
+    'port_ranges': port_ranges,
+    'merge_interfaces': merge_interfaces,
+}
@@ -0,0 +1,129 @@
+import os
+import sys
+import sysconfig
+import threading
+import time
+from datetime import datetime
+from .colors import Colors
+
+
+# Time between samples, in seconds
+SAMPLE_INTERVAL = 0.01
+# Maximum fraction of time spent sampling. When the stacks get deep or there are many threads,
+# the interval is increased so the overhead stays below this fraction.
+MAX_OVERHEAD = 0.02
+# Folder of the standard library, removed from the labels of its functions
+STDLIB_PATH = sysconfig.get_paths()['stdlib']
+
+
+def get_profile_path(dir: str) -> str:
+    '''
+    Get the folder where the profiles of a new run are saved, shared by all its processes
+    '''
+    return f"{dir}/outputfiles/Profiles/{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+class SamplingProfiler():
+    '''
+    Class used to profile a whole run with low overhead. A background thread takes, at a regular
+    interval, the stack of every other thread of the process (sys._current_frames), so time is
+    attributed to each thread without tracing every call. The samples are saved in the collapsed
+    stack format (one "thread;caller;...;callee count" line per stack), which can be loaded by
+    flamegraph.pl, speedscope or inferno.
+    '''
+
+    def __init__(self, path: str, name: str, interval: float=SAMPLE_INTERVAL):
+        '''
+        Constructor used to create a new profiler, saving the samples in {path}/{name}.folded
+        '''
+        self.path = path
+        self.name = name
+        self.interval = interval
+        self.samples = {}
+        self.labels = {}
+        self.sample_count = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        '''
+        Start sampling the threads of the process
+        '''
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        '''
+        Take samples until the profiler is stopped, adjusting the interval to the cost of sampling
+        '''
+
+        interval = self.interval
+        while not self.stop_event.wait(interval):
+            start_time = time.perf_counter()
+            self.sample()
+            interval = max(self.interval, (time.perf_counter() - start_time) / MAX_OVERHEAD)
+
+    def sample(self) -> None:
+        '''
+        Count the current stack of each thread. Stacks are kept as tuples of code objects and
+        only converted to text when the profile is saved.
+        '''
+
+        own_ident = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            key = (thread_names.get(ident, str(ident)), tuple(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+        self.sample_count += 1
+
+    def get_label(self, code) -> str:
+        '''
+        Get the label of a function: name, module file and line where the function starts
+        '''
+
+        label = self.labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            # Keep only the path inside the packages, the standard library or the current directory
+            if 'site-packages' in filename:
+                filename = filename.split('site-packages')[-1].lstrip('/\\')
+            elif filename.startswith(STDLIB_PATH):
+                filename = os.path.relpath(filename, STDLIB_PATH)
+            elif filename.startswith(os.getcwd()):
+                filename = os.path.relpath(filename)
+            # Semicolons separate the frames in the collapsed format
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+            self.labels[code] = label
+        return label
+
+    def stop(self) -> str|None:
+        '''
+        Stop sampling and save the profile, returning its filename
+        '''
+
+        if self.thread is None:
+            return None
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+        # Thread first, then the frames from the outermost to the innermost call
+        lines = {}
+        for (thread_name, stack), count in self.samples.items():
+            line = ';'.join([thread_name.replace(';', ':')] + [self.get_label(code) for code in reversed(stack)])
+            lines[line] = lines.get(line, 0) + count
+
+        os.makedirs(self.path, exist_ok=True)
+        filename = f"{self.path}/{self.name}.folded"
+        with open(filename, mode='w', encoding='utf-8') as file:
+            file.writelines(f"{line} {count}\n" for line, count in sorted(lines.items()))
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Profile saved ({self.sample_count} samples) - {filename}")
+        return filename
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+from datetime import datetime
+from .colors import Colors
+
+
+class RawDataSink():
+    '''
+    Class used to save the script output as JSON Lines, instead of a single JSON document. The
+    first line has the client data and each following line has the data of one device, written as
+    soon as the device finishes, so the data of all devices is never held in memory at once.
+    '''
+
+    def __init__(self, dir: str):
+        '''
+        Constructor used to create the script output file of a new run
+        '''
+        path = f"{dir}/outputfiles/RAWData"
+        os.makedirs(path, exist_ok=True)
+        self.filename = f"{path}/[{datetime.now().strftime('%Y%m%d%H%M%S')}] script_output.jsonl"
+        self.file = open(self.filename, mode='w', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write_record(self, record_type: str, data: dict) -> None:
+        '''
+        Write a single record (client or device) in a compact JSON line
+        '''
+
+        line = json.dumps({record_type: data}, separators=(',', ':'), default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            # Keep the file readable up to the last device finished, even if the script stops
+            self.file.flush()
+
+    def write_client(self, client_dict: dict) -> None:
+        self.write_record('client', client_dict)
+
+    def write_device(self, device_dict: dict) -> None:
+        self.write_record('device', device_dict)
+
+    def close(self) -> None:
+        '''
+        Close the script output file
+        '''
+
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+                print(f"{Colors.OK_GREEN}[>]{Colors.END} Script output saved - {os.path.basename(self.filename)}")
+
+
+class DeviceRecords():
+    '''
+    Lazy list of the devices saved in a script output file. The file is read again each time the
+    list is iterated, so only one device is held in memory at a time.
+    '''
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __iter__(self):
+        return self.reader.devices()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.reader.records('device'))
+
+
+class RawDataReader():
+    '''
+    Class used to read the script output files saved by the RawDataSink
+    '''
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def records(self, record_type: str):
+        '''
+        Iterate over the records of a given type (client or device), one line at a time
+        '''
+
+        with open(self.filename, mode='r', encoding='utf-8') as file:
+            for line in file:
+                # Skip the prefix of the record, if it's from another type, without decoding it
+                if not line.startswith(f'{{"{record_type}":'):
+                    continue
+                yield json.loads(line)[record_type]
+
+    def client(self) -> dict:
+        '''
+        Get the client data of the run
+        '''
+        return next(self.records('client'), {})
+
+    def devices(self):
+        '''
+        Iterate over the data of each device of the run
+        '''
+        return self.records('device')
+
+    def to_dict(self) -> dict:
+        '''
+        Rebuild the structure returned by Client.generate_data_dict, with the device list loaded
+        lazily from the file
+        '''
+
+        client_dict = self.client()
+        client_dict['device_list'] = DeviceRecords(self)
+        return client_dict
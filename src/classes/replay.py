@@ -0,0 +1,139 @@
+import os
+import re
+from .colors import Colors
+from .configs import GetConfigs
+from .device import Device
+
+
+# Filename of a recorded output: [datetime] hostname (ip_address) - command.txt
+RECORDING_FILENAME = re.compile(r'^\[(\d{14})\] (.*) \((.*)\) - (.*)\.txt$')
+
+
+def find_recordings(dir: str, dates: list=None, get_configs_info: list=None) -> dict:
+    '''
+    Find the outputs recorded by get configs, in outputfiles/GetConfigs/<info>/<date>/<command>,
+    grouped by date and device. When a command was recorded more than once for a device on the
+    same date, only the last recording is kept. Optionally, only some dates (YYYYmmdd) and
+    information categories are considered.
+    Returns {date: {ip_address: {'hostname': str, 'outputs': {(info, command): filename}}}}
+    '''
+
+    path = f"{dir}/outputfiles/GetConfigs"
+    recordings = {}
+    if not os.path.isdir(path):
+        return recordings
+
+    for info in sorted(os.listdir(path)):
+        if get_configs_info is not None and info not in get_configs_info:
+            continue
+        for date in sorted(os.listdir(f"{path}/{info}")):
+            if dates is not None and date not in dates:
+                continue
+            # Besides the command folders, each date has the files exported (e.g. excel files)
+            command_dirs = [command_dir for command_dir in sorted(os.listdir(f"{path}/{info}/{date}"))
+                if os.path.isdir(f"{path}/{info}/{date}/{command_dir}")]
+            for command_dir in command_dirs:
+                # Recordings are sorted by datetime, so the last one of each device prevails
+                for filename in sorted(os.listdir(f"{path}/{info}/{date}/{command_dir}")):
+                    match = RECORDING_FILENAME.match(filename)
+                    if match is None:
+                        continue
+                    _, hostname, ip_address, command = match.groups()
+                    device = recordings.setdefault(date, {}).setdefault(ip_address, {'hostname': hostname, 'outputs': {}})
+                    device['hostname'] = hostname
+                    device['outputs'][(info, command)] = f"{path}/{info}/{date}/{command_dir}/{filename}"
+
+    return recordings
+
+
+class Replay():
+    '''
+    Class used to replay the outputs recorded by previous runs of get configs, without
+    connecting to the devices. Each recorded output goes through the same parsing, post-processing
+    and export as a live output, so the output parsed can be regenerated (e.g. after fixing a
+    TextFSM template) and the CPU side of the pipeline can be measured in isolation.
+    '''
+
+    def __init__(self, client, platform: str=None):
+        '''
+        Constructor used to create a new replay for a client, whose command list must be loaded.
+        The vendor_os of each device is taken from the client device list, if loaded, otherwise
+        from the commands recorded. The platform, if specified, is used for all devices.
+        '''
+        self.client = client
+        self.platform = platform
+        self.vendor_os_list = {device.ip_address: device.vendor_os for device in client.device_list}
+        self.recordings = {}
+
+    def get_vendor_os(self, ip_address: str, outputs: dict) -> str|None:
+        '''
+        Get the vendor_os of a recorded device. When the device is not in the device list, the
+        vendor_os is the only one whose commands match all the commands recorded.
+        '''
+
+        if self.platform is not None:
+            return self.platform
+        if ip_address in self.vendor_os_list:
+            return self.vendor_os_list[ip_address]
+
+        vendor_os_list = None
+        for info, command in outputs.keys():
+            commands = self.client.command_list.get(info, {}).get('commands', {})
+            matches = {vendor_os for vendor_os, command_list in commands.items()
+                if command in [command.strip() for command in command_list]}
+            vendor_os_list = matches if vendor_os_list is None else vendor_os_list & matches
+        if vendor_os_list and len(vendor_os_list) == 1:
+            return vendor_os_list.pop()
+        return None
+
+    def create_devices(self, date: str, get_configs_info: list=None) -> list:
+        '''
+        Create a Device object, without connection, for each device with outputs recorded on the
+        given date (YYYYmmdd)
+        '''
+
+        self.recordings = find_recordings(self.client.dir, dates=[date], get_configs_info=get_configs_info).get(date, {})
+        if not self.recordings:
+            raise Exception(f"There are no outputs recorded on {date}")
+
+        device_list = []
+        for ip_address, recording in sorted(self.recordings.items()):
+            vendor_os = self.get_vendor_os(ip_address, recording['outputs'])
+            if vendor_os is None:
+                print(f"{Colors.NOK_RED}[{ip_address}]{Colors.END} Couldn't identify the vendor_os, device not replayed")
+                continue
+            device = Device(self.client, vendor_os, ip_address, credentials=None)
+            device.hostname = recording['hostname']
+            device.status = 'Replayed'
+            device_list.append(device)
+
+        print(f"{Colors.OK_GREEN}[>]{Colors.END} Replaying {len(device_list)} devices recorded on {date}")
+        return device_list
+
+    def replay_device(self, device) -> None:
+        '''
+        Parse the recorded outputs of a device, command by command, as Device.get_configs does
+        with the outputs received from the device
+        '''
+
+        # Group the information categories that shared the output of each command
+        command_plan = {}
+        for (info, command), filename in self.recordings[device.ip_address]['outputs'].items():
+            command_plan.setdefault(command, []).append((info, filename))
+
+        for command, info_list in command_plan.items():
+            with open(info_list[0][1], mode='r', encoding='utf-8') as file:
+                output = file.read()
+
+            config_list = []
+            for info, filename in info_list:
+                config = GetConfigs(device, info=info)
+                config.command = command
+                config.output = output
+                config.output_file = filename
+                config.status = 'Command not found' if 'Invalid input detected' in output else 'Done'
+                config_list.append(config)
+            device.config_list.extend(config_list)
+            device.parse_configs(command, config_list, output)
+
+        device.configs_completed()
@@ -0,0 +1,196 @@
+import threading
+import time
+from .colors import Colors
+from .device import PAGING_DISABLE, WITHOUT_ENABLE_SECRET
+
+
+# Seconds a session can stay unused in the pool before being closed
+IDLE_TIMEOUT = 300
+# Seconds after which a session is closed, even if it's being reused
+MAX_AGE = 3600
+# Seconds between each verification of expired sessions
+REAPER_INTERVAL = 30
+
+
+class PooledSession():
+    '''
+    Class used to keep an initialised netmiko connection (authenticated, in enable mode and with
+    paging disabled) together with the information needed to reuse it
+    '''
+
+    def __init__(self, device):
+        '''
+        Constructor used to create a new pooled session from a connected device
+        '''
+        self.connection = device.connection
+        self.method = device.connect_method
+        self.vendor_os = device.vendor_os
+        self.username = device.credentials['username'] if device.credentials else None
+        self.hostname = device.hostname
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def is_expired(self, idle_timeout: int, max_age: int) -> bool:
+        '''
+        Check if the session was idle for too long or if it reached its maximum age
+        '''
+        now = time.monotonic()
+        return now - self.last_used > idle_timeout or now - self.created > max_age
+
+    def close(self, ip_address: str) -> None:
+        '''
+        Restore paging on the device and close the connection
+        '''
+        try:
+            if self.connection.is_alive() and self.vendor_os in PAGING_DISABLE.keys():
+                self.connection.send_command(PAGING_DISABLE[self.vendor_os]['enable'])
+            self.connection.disconnect()
+            print(f"{Colors.OK_GREEN}[{ip_address}]{Colors.END} Disconnected")
+        except Exception:
+            # Session was already closed by the device
+            pass
+
+
+class SessionPool():
+    '''
+    Class used to keep the device sessions alive between operations (get and set configs),
+    avoiding a new SSH handshake, authentication, enable and paging disable on each operation.
+    Sessions are keyed by device IP address and connection method (ssh or telnet) and are handed
+    out to a single user at a time. Only sessions whose operation finished cleanly are returned
+    to the pool (see discard).
+    '''
+
+    def __init__(self, idle_timeout: int=IDLE_TIMEOUT, max_age: int=MAX_AGE):
+        '''
+        Constructor used to create a new, empty, session pool
+        '''
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+        self.closed = threading.Event()
+
+    def acquire(self, device, method: str='ssh'):
+        '''
+        Get an idle session for the device, connected with the given method, if there's one still
+        valid. The session is removed from the pool while the device is using it and is
+        health-checked before being handed out.
+        '''
+
+        with self.lock:
+            session = self.sessions.pop((device.ip_address, method), None)
+        if session is None:
+            return None
+
+        # Session can't be reused by a different platform or user
+        username = device.credentials['username'] if device.credentials else None
+        if session.vendor_os != device.vendor_os or session.username != username or \
+            session.is_expired(self.idle_timeout, self.max_age):
+            session.close(device.ip_address)
+            return None
+
+        # Health-check the session before reusing it: any output left unread is dropped, and the
+        # device must be back at the exec prompt (not in configuration mode, and in enable mode)
+        try:
+            alive = session.connection.is_alive()
+            if alive:
+                session.connection.clear_buffer()
+                session.connection.find_prompt()
+                alive = not session.connection.check_config_mode() and \
+                    (device.vendor_os in WITHOUT_ENABLE_SECRET or session.connection.check_enable_mode())
+        except Exception:
+            alive = False
+        if not alive:
+            print(f"{Colors.OK_YELLOW}[{device.ip_address}]{Colors.END} Pooled session can't be reused")
+            session.close(device.ip_address)
+            return None
+
+        return session
+
+    def release(self, device) -> None:
+        '''
+        Return the device session to the pool, so it can be reused by the next operation. If there
+        is already a session for the device in the pool, the oldest one is closed.
+        '''
+
+        if device.connection is None:
+            return
+
+        key = (device.ip_address, device.connect_method)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is not None and session.connection is device.connection:
+                session.last_used = time.monotonic()
+                return
+            if session is not None:
+                self.sessions.pop(key)
+            pooled = getattr(device, 'pooled_session', None)
+            new_session = pooled if pooled is not None and pooled.connection is device.connection \
+                else PooledSession(device)
+            new_session.last_used = time.monotonic()
+            # Sessions that reached their maximum age are not kept in the pool
+            expired = new_session.is_expired(self.idle_timeout, self.max_age)
+            if not expired:
+                self.sessions[key] = new_session
+                self.start_reaper()
+
+        if session is not None:
+            session.close(device.ip_address)
+        if expired:
+            new_session.close(device.ip_address)
+
+    def discard(self, device) -> None:
+        '''
+        Close the device session instead of returning it to the pool, when its operation didn't
+        finish cleanly (e.g. a command timed out, leaving output unread or a configuration prompt)
+        '''
+
+        if device.connection is None:
+            return
+        pooled = getattr(device, 'pooled_session', None)
+        session = pooled if pooled is not None and pooled.connection is device.connection else PooledSession(device)
+        session.close(device.ip_address)
+
+    def evict_expired(self) -> None:
+        '''
+        Close all sessions that were idle for too long or reached their maximum age
+        '''
+
+        with self.lock:
+            expired = {key: session for key, session in self.sessions.items()
+                if session.is_expired(self.idle_timeout, self.max_age)}
+            for key in expired.keys():
+                del self.sessions[key]
+
+        for (ip_address, _), session in expired.items():
+            session.close(ip_address)
+
+    def start_reaper(self) -> None:
+        '''
+        Start the background thread that closes expired sessions. Must be called with the lock held.
+        '''
+
+        if self.reaper is not None and self.reaper.is_alive():
+            return
+
+        def reap():
+            while not self.closed.wait(REAPER_INTERVAL):
+                self.evict_expired()
+
+        self.closed.clear()
+        self.reaper = threading.Thread(target=reap, name='session-pool-reaper', daemon=True)
+        self.reaper.start()
+
+    def close(self) -> None:
+        '''
+        Close all sessions in the pool
+        '''
+
+        with self.lock:
+            sessions = self.sessions
+            self.sessions = {}
+            self.closed.set()
+
+        for (ip_address, _), session in sessions.items():
+            session.close(ip_address)
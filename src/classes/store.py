@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# Columns of the parsed rows that are indexed, with the TextFSM fields (of any vendor) they
+# are taken from, by order of preference
+KEY_COLUMNS = {
+    'mac': ('destination_address', 'mac_address', 'mac', 'mac_addr'),
+    'vlan': ('vlan_id', 'vlan'),
+    'port': ('destination_port', 'port', 'local_port', 'local_interface', 'interface'),
+    'version': ('version', 'software_version', 'running_image'),
+}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    client TEXT,
+    flow TEXT,
+    started TEXT,
+    finished TEXT,
+    raw_data TEXT
+);
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ip_address TEXT,
+    hostname TEXT,
+    vendor_os TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    info TEXT,
+    command TEXT,
+    status TEXT,
+    output_file TEXT
+);
+CREATE TABLE IF NOT EXISTS rows (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    device_id INTEGER NOT NULL REFERENCES devices(id),
+    ip_address TEXT,
+    hostname TEXT,
+    info TEXT,
+    mac TEXT,
+    vlan TEXT,
+    port TEXT,
+    version TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS devices_ip_address ON devices(ip_address);
+CREATE INDEX IF NOT EXISTS devices_hostname ON devices(hostname);
+CREATE INDEX IF NOT EXISTS commands_device ON commands(device_id);
+CREATE INDEX IF NOT EXISTS rows_info_run ON rows(info, run_id);
+CREATE INDEX IF NOT EXISTS rows_ip_address ON rows(ip_address, info, run_id);
+CREATE INDEX IF NOT EXISTS rows_hostname ON rows(hostname);
+CREATE INDEX IF NOT EXISTS rows_mac ON rows(mac);
+CREATE INDEX IF NOT EXISTS rows_vlan ON rows(vlan);
+CREATE INDEX IF NOT EXISTS rows_port ON rows(port);
+CREATE INDEX IF NOT EXISTS rows_version ON rows(version);
+'''
+
+
+def get_store_filename(dir: str) -> str:
+    '''
+    Get the filename of the result store of a client directory
+    '''
+    return f"{dir}/outputfiles/results.sqlite3"
+
+
+def normalize_mac(mac: str) -> str|None:
+    '''
+    Convert a MAC address in any notation (aabb.ccdd.eeff, aa:bb:cc:dd:ee:ff, AA-BB-...) to 12
+    lowercase hexadecimal digits, so addresses can be compared
+    '''
+
+    if not mac:
+        return None
+    digits = re.sub(r'[^0-9a-f]', '', str(mac).lower())
+    return digits if len(digits) == 12 else None
+
+
+def get_key_value(row: dict, fields: tuple) -> str|None:
+    '''
+    Get the value of the first field present in a parsed row. Lists (e.g. the ports of a MAC
+    address) are indexed by their first value.
+    '''
+
+    for field in fields:
+        value = row.get(field)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if value not in (None, ''):
+            return str(value)
+    return None
+
+
+class ResultStore():
+    '''
+    Class used to keep the runs, devices, commands (with the file of their raw output) and parsed
+    rows in a local SQLite database, indexed by device, information category and key columns
+    (MAC address, VLAN, port and version), so the results of all runs can be queried without
+    opening the output files. Each device is stored in a single transaction as soon as it finishes.
+    '''
+
+    def __init__(self, filename: str):
+        '''
+        Constructor used to open (or create) the store
+        '''
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        # The connection is shared by the device threads, serialized by the lock
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+
+    def start_run(self, client: str, flow: str, raw_data: str=None) -> int:
+        '''
+        Register a new run and return its ID
+        '''
+
+        with self.lock, self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (client, flow, started, raw_data) VALUES (?, ?, ?, ?)',
+                (client, flow, datetime.now().isoformat(timespec='seconds'), raw_data))
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE runs SET finished = ? WHERE id = ?',
+                (datetime.now().isoformat(timespec='seconds'), run_id))
+
+    def add_device(self, run_id: int, device: dict) -> None:
+        '''
+        Store a device (in dict format, as generated by Client.generate_device_dict), with its
+        commands and parsed rows
+        '''
+
+        with self.lock, self.connection:
+            device_id = self.connection.execute(
+                'INSERT INTO devices (run_id, ip_address, hostname, vendor_os, status) VALUES (?, ?, ?, ?, ?)',
+                (run_id, device.get('ip_address'), device.get('hostname'), device.get('vendor_os'), device.get('status'))).lastrowid
+
+            command_list = []
+            row_list = []
+            for config in device.get('config_list', []):
+                info = config.get('info')
+                command_list.append((device_id, info, config.get('command'), config.get('status'), config.get('output_file')))
+                for row in config.get('output_parsed') or []:
+                    row_list.append((run_id, device_id, device.get('ip_address'), device.get('hostname'), info,
+                        normalize_mac(get_key_value(row, KEY_COLUMNS['mac'])),
+                        get_key_value(row, KEY_COLUMNS['vlan']),
+                        get_key_value(row, KEY_COLUMNS['port']),
+                        get_key_value(row, KEY_COLUMNS['version']),
+                        json.dumps(row, separators=(',', ':'), default=str)))
+
+            self.connection.executemany(
+                'INSERT INTO commands (device_id, info, command, status, output_file) VALUES (?, ?, ?, ?, ?)', command_list)
+            self.connection.executemany(
+                'INSERT INTO rows (run_id, device_id, ip_address, hostname, info, mac, vlan, port, version, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row_list)
+
+    def add_script_data(self, script_data: dict, flow: str='import') -> int:
+        '''
+        Store a whole run from its script data (e.g. loaded from a script output file) and return
+        the ID of the run
+        '''
+
+        run_id = self.start_run(script_data.get('name'), flow, raw_data=script_data.get('raw_data_filename'))
+        for device in script_data['device_list']:
+            self.add_device(run_id, device)
+        self.finish_run(run_id)
+        return run_id
+
+    def query(self, sql: str, parameters: tuple=()) -> list:
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def get_runs(self, limit: int=100) -> list:
+        '''
+        Get the most recent runs, with their number of devices
+        '''
+
+        return self.query('SELECT runs.*, (SELECT COUNT(*) FROM devices WHERE devices.run_id = runs.id) AS devices '
+            'FROM runs ORDER BY id DESC LIMIT ?', (limit,))
+
+    def get_devices(self, run_id: int=None, ip_address: str=None, hostname: str=None, limit: int=1000) -> list:
+        '''
+        Get the devices stored, optionally of a run or with a given IP address or hostname
+        '''
+
+        conditions, parameters = [], []
+        for column, value in (('run_id', run_id), ('ip_address', ip_address), ('hostname', hostname)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.query(f"SELECT * FROM devices {where} ORDER BY id DESC LIMIT ?", (*parameters, limit))
+
+    def get_commands(self, device_id: int) -> list:
+        '''
+        Get the commands runned on a device, with the file where their raw output was saved
+        '''
+        return self.query('SELECT * FROM commands WHERE device_id = ? ORDER BY id', (device_id,))
+
+    def get_latest_output(self, ip_address: str, info: str, since: str=None) -> dict|None:
+        '''
+        Get the latest command of an information category runned successfully on a device, with the
+        file of its raw output, optionally only if its run finished after a given date (ISO format)
+        '''
+
+        conditions = ['devices.ip_address = ?', 'commands.info = ?', "commands.status = 'Done'",
+            'commands.output_file IS NOT NULL', 'runs.finished IS NOT NULL']
+        parameters = [ip_address, info]
+        if since is not None:
+            conditions.append('runs.finished >= ?')
+            parameters.append(since)
+        rows = self.query('SELECT commands.*, runs.finished FROM commands JOIN devices ON devices.id = commands.device_id '
+            f"JOIN runs ON runs.id = devices.run_id WHERE {' AND '.join(conditions)} ORDER BY runs.id DESC LIMIT 1", tuple(parameters))
+        return rows[0] if rows else None
+
+    def find_rows(self, info: str=None, ip_address: str=None, hostname: str=None, mac: str=None, vlan: str=None,
+        port: str=None, version: str=None, run_id: int=None, latest: bool=True, limit: int=1000) -> list:
+        '''
+        Find the parsed rows matching all the given filters. By default, only the rows of the
+        latest run of each device and information category are considered, so the result reflects
+        the current state of the network (e.g. the port where a MAC address is now).
+        '''
+
+        filters = {'info': info, 'ip_address': ip_address, 'hostname': hostname, 'mac': normalize_mac(mac) if mac else None,
+            'vlan': vlan, 'port': port, 'version': version, 'run_id': run_id}
+        if mac and filters['mac'] is None:
+            raise ValueError(f"Invalid MAC address: {mac}")
+
+        conditions, parameters = [], []
+        for column, value in filters.items():
+            if value is not None:
+                conditions.append(f"rows.{column} = ?")
+                parameters.append(value)
+        if latest and run_id is None:
+            conditions.append('rows.run_id = (SELECT MAX(latest.run_id) FROM rows AS latest '
+                'WHERE latest.ip_address = rows.ip_address AND latest.info = rows.info)')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        row_list = []
+        for row in self.query(f"SELECT rows.run_id, rows.ip_address, rows.hostname, rows.info, rows.data "
+            f"FROM rows {where} ORDER BY rows.id LIMIT ?", (*parameters, limit)):
+            row_list.append({
+                'run_id': row['run_id'],
+                'device_ip_address': row['ip_address'],
+                'device_hostname': row['hostname'],
+                'info': row['info'],
+                **json.loads(row['data']),
+            })
+        return row_list
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,140 @@
+import copy
+import os
+import threading
+from .colors import Colors
+
+
+class TemplateCache():
+    '''
+    Class used to keep, for the whole process, the TextFSM templates already compiled and the
+    ntc-templates index lookups, keyed by (platform, command). Each parse uses a cheap clone of
+    the compiled template, so the cache can be shared by all threads.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor used to create a new, empty, template cache
+        '''
+        self.lock = threading.Lock()
+        self.template_env = None
+        self.template_dir = None
+        self.index = None
+        self.lookups = {}
+        self.templates = {}
+
+    def check_template_dir(self) -> None:
+        '''
+        Load the ntc-templates index, only once or when the NET_TEXTFSM environment variable
+        changes, clearing all templates compiled from the previous directory
+        '''
+
+        template_env = os.environ.get('NET_TEXTFSM')
+        if self.index is not None and template_env == self.template_env:
+            return
+
+        with self.lock:
+            if self.index is not None and template_env == self.template_env:
+                return
+            from netmiko.utilities import get_template_dir
+            from textfsm import clitable
+            template_dir = get_template_dir()
+            self.index = clitable.CliTable('index', template_dir).index
+            self.template_dir = template_dir
+            self.template_env = template_env
+            self.lookups = {}
+            self.templates = {}
+
+    def lookup(self, platform: str, command: str) -> list|None:
+        '''
+        Get the list of template files used to parse the output of a command in a platform
+        '''
+
+        key = (platform, command)
+        if key not in self.lookups:
+            row = self.index.GetRowMatch({'Command': command, 'Platform': platform})
+            self.lookups[key] = self.index.index[row]['Template'].split(':') if row else None
+        return self.lookups[key]
+
+    def get_fsm(self, platform: str, command: str) -> 'textfsm.TextFSM|None':
+        '''
+        Get the compiled TextFSM template for a command in a platform. Commands parsed by more
+        than one template (merged by key) are not cached.
+        '''
+
+        self.check_template_dir()
+        key = (platform, command)
+        if key in self.templates:
+            return self.templates[key]
+
+        template_list = self.lookup(platform, command)
+        fsm = None
+        if template_list and len(template_list) == 1:
+            import textfsm
+            with open(os.path.join(self.template_dir, template_list[0]), 'r', encoding='utf-8') as template:
+                fsm = textfsm.TextFSM(template)
+        with self.lock:
+            self.templates.setdefault(key, fsm)
+        return self.templates[key]
+
+    @staticmethod
+    def clone(fsm: 'textfsm.TextFSM') -> 'textfsm.TextFSM':
+        '''
+        Create a new FSM sharing the compiled states and rules with the cached one. Only the values
+        (which keep the state of the record being parsed) are copied.
+        '''
+
+        fsm_clone = copy.copy(fsm)
+        fsm_clone.values = copy.deepcopy(fsm.values, {id(fsm): fsm_clone})
+        fsm_clone.Reset()
+        return fsm_clone
+
+    def parse(self, raw_output: str, platform: str, command: str) -> list|str:
+        '''
+        Parse the raw output of a command, with the same result as netmiko get_structured_data:
+        a list of entries, or the raw output if it couldn't be parsed
+        '''
+
+        structured_output = self.parse_with_template(raw_output, platform, command)
+        # Retry the output of "cisco_xe" devices with "cisco_ios" templates
+        if 'cisco_xe' in platform and not isinstance(structured_output, list):
+            structured_output = self.parse_with_template(raw_output, 'cisco_ios', command)
+        return structured_output
+
+    def parse_with_template(self, raw_output: str, platform: str, command: str) -> list|str:
+        '''
+        Parse the raw output of a command using a clone of the cached template
+        '''
+
+        fsm = self.get_fsm(platform, command)
+        if fsm is None:
+            # Commands parsed by multiple templates are handled by netmiko
+            if self.lookup(platform, command):
+                from netmiko.utilities import get_structured_data
+                return get_structured_data(raw_output, platform=platform, command=command)
+            return raw_output
+
+        fsm = self.clone(fsm)
+        header = [name.lower() for name in fsm.header]
+        structured_output = [dict(zip(header, row)) for row in fsm.ParseText(raw_output)]
+        return structured_output if structured_output else raw_output
+
+    def warm_up(self, command_list: dict) -> None:
+        '''
+        Compile the templates of all commands supported by the script, so the first devices don't
+        pay the template compilation
+        '''
+
+        try:
+            for info in command_list.values():
+                if not info.get('textfsm'):
+                    continue
+                for platform, commands in info['commands'].items():
+                    for command in commands:
+                        self.get_fsm(platform, command)
+        except Exception as exception:
+            print(f"{Colors.NOK_RED}[>]{Colors.END} Couldn't load the TextFSM templates")
+            print(exception)
+
+
+# Template cache shared by all devices of the process
+TEMPLATE_CACHE = TemplateCache()
@@ -0,0 +1,285 @@
+import ipaddress
+import re
+from collections import deque
+from .locator import normalize_port
+from .store import get_key_value
+
+
+# TextFSM fields (of any vendor) of the neighbors, by order of preference
+NEIGHBOR_COLUMNS = {
+    'hostname': ('destination_host', 'remote_host', 'neighbor', 'neighbor_name', 'system_name', 'remote_system_name'),
+    'ip_address': ('management_ip', 'remote_ip_address', 'mgmt_address', 'management_address', 'remote_management_address'),
+    'platform': ('platform', 'remote_platform', 'system_description', 'remote_system_description'),
+    'local_port': ('local_port', 'local_interface'),
+    'remote_port': ('remote_port', 'neighbor_port_id', 'neighbor_interface', 'port_id', 'remote_port_id'),
+}
+# Maximum number of nodes of a single diagram. Bigger topologies are partitioned.
+DIAGRAM_MAX_NODES = 250
+# Prefix length of the subnets used to partition the topology by subnet
+SUBNET_PREFIX_LENGTH = 24
+# Site of a device, taken from its hostname (e.g. LIS of LIS-SW01), when not specified
+SITE_PATTERN = r'^([A-Za-z0-9]+)[-_.]'
+
+
+def normalize_hostname(hostname: str) -> str|None:
+    '''
+    Get the key used to compare hostnames, without domain and serial number (e.g. NX-OS reports
+    its neighbors as sw1.example.com(FOC1234X0AB))
+    '''
+
+    if not hostname:
+        return None
+    hostname = re.sub(r'\(.*\)$', '', hostname.strip()).lower()
+    return hostname.split('.')[0] if not re.match(r'^\d+\.\d+\.\d+\.\d+$', hostname) else hostname
+
+
+def normalize_ip_address(ip_address: str) -> str|None:
+    try:
+        return str(ipaddress.ip_address(ip_address.strip())) if ip_address else None
+    except ValueError:
+        return None
+
+
+def get_neighbor(entry: dict) -> dict:
+    '''
+    Get the hostname, management IP, platform and ports of a neighbor entry parsed by TextFSM
+    '''
+    return {column: get_key_value(entry, fields) for column, fields in NEIGHBOR_COLUMNS.items()}
+
+
+class Topology():
+    '''
+    Class used to keep the adjacency graph of the network. Each device is a single node,
+    identified by its management IP (or its hostname, when the IP is unknown), whatever the number
+    of neighbors reporting it. A link reported by both ends, or by CDP and LLDP, is a single link.
+    Big topologies can be partitioned by site, subnet or connected component, so each diagram
+    stays small.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor used to create an empty topology
+        '''
+        self.nodes = {}
+        self.node_ids = {}
+        self.links = {}
+
+    def get_node_id(self, ip_address: str=None, hostname: str=None) -> str|None:
+        '''
+        Get the ID of a device, by its management IP or its hostname
+        '''
+
+        ip_address = normalize_ip_address(ip_address)
+        if ip_address in self.nodes:
+            return ip_address
+        hostname_key = normalize_hostname(hostname)
+        if hostname_key in self.node_ids:
+            return self.node_ids[hostname_key]
+        return ip_address or hostname_key
+
+    def add_node(self, ip_address: str=None, hostname: str=None, **attributes) -> str|None:
+        '''
+        Add a device, or complete the device already known by the same IP or hostname, and return
+        its ID
+        '''
+
+        node_id = self.get_node_id(ip_address, hostname)
+        if node_id is None:
+            return None
+        node = self.nodes.setdefault(node_id, {'ip_address': None, 'hostname': None})
+        for key, value in (('ip_address', normalize_ip_address(ip_address)), ('hostname', hostname), *attributes.items()):
+            if value not in (None, '') and not node.get(key):
+                node[key] = value
+        if hostname:
+            self.node_ids.setdefault(normalize_hostname(hostname), node_id)
+        return node_id
+
+    def add_link(self, source: str, target: str, source_port: str=None, target_port: str=None, protocol: str=None) -> None:
+        '''
+        Add a link between two devices (by ID), merging it with the same link reported by the
+        other end or by another protocol
+        '''
+
+        key = frozenset(((source, normalize_port(source_port or '')), (target, normalize_port(target_port or ''))))
+        link = self.links.get(key)
+        if link is None:
+            link = self.links[key] = {'source': source, 'target': target, 'src_label': source_port or '',
+                'trgt_label': target_port or '', 'protocols': []}
+        if protocol and protocol not in link['protocols']:
+            link['protocols'].append(protocol)
+
+    def add_neighbors(self, entry_list: list, protocol: str=None) -> None:
+        '''
+        Add the neighbors parsed from the devices (entries with the device_ip_address and
+        device_hostname of the device that reported them)
+        '''
+
+        for entry in entry_list:
+            source = self.add_node(entry.get('device_ip_address'), entry.get('device_hostname'))
+            neighbor = get_neighbor(entry)
+            target = self.add_node(neighbor['ip_address'], neighbor['hostname'], platform=neighbor['platform'])
+            if source is not None and target is not None and source != target:
+                self.add_link(source, target, neighbor['local_port'], neighbor['remote_port'], protocol)
+
+    def get_site(self, node_id: str) -> str:
+        node = self.nodes[node_id]
+        if node.get('site'):
+            return node['site']
+        match = re.match(SITE_PATTERN, node['hostname'] or '')
+        return match.group(1).upper() if match else 'Unknown site'
+
+    def get_subnet(self, node_id: str, prefix_length: int=SUBNET_PREFIX_LENGTH) -> str:
+        ip_address = self.nodes[node_id]['ip_address']
+        if ip_address is None:
+            return 'Unknown subnet'
+        return str(ipaddress.ip_network(f"{ip_address}/{prefix_length}", strict=False))
+
+    def get_components(self) -> list:
+        '''
+        Get the connected components of the topology (lists of node IDs), from the biggest to the
+        smallest
+        '''
+
+        parents = {node_id: node_id for node_id in self.nodes}
+
+        def find(node_id):
+            while parents[node_id] != node_id:
+                parents[node_id] = parents[parents[node_id]]
+                node_id = parents[node_id]
+            return node_id
+
+        for link in self.links.values():
+            parents[find(link['source'])] = find(link['target'])
+
+        components = {}
+        for node_id in self.nodes:
+            components.setdefault(find(node_id), []).append(node_id)
+        return sorted(components.values(), key=len, reverse=True)
+
+    def split_nodes(self, node_id_list: list, max_nodes: int=DIAGRAM_MAX_NODES) -> list:
+        '''
+        Split a list of nodes bigger than max_nodes by site, then by subnet and, when neither
+        splits it, in connected parts of up to max_nodes (see split_connected)
+        '''
+
+        if len(node_id_list) <= max_nodes:
+            return [node_id_list]
+        for get_key in (self.get_site, self.get_subnet):
+            groups = {}
+            for node_id in node_id_list:
+                groups.setdefault(get_key(node_id), []).append(node_id)
+            if len(groups) > 1:
+                return [part for group in groups.values() for part in self.split_nodes(group, max_nodes)]
+        return self.split_connected(node_id_list, max_nodes)
+
+    def split_connected(self, node_id_list: list, max_nodes: int=DIAGRAM_MAX_NODES) -> list:
+        '''
+        Split a list of nodes in parts of up to max_nodes, each one grown breadth-first from the
+        node with more links still without part, so the devices of each part stay connected
+        '''
+
+        node_id_set = set(node_id_list)
+        neighbors = {node_id: [] for node_id in node_id_list}
+        for link in self.links.values():
+            if link['source'] in node_id_set and link['target'] in node_id_set:
+                neighbors[link['source']].append(link['target'])
+                neighbors[link['target']].append(link['source'])
+
+        parts = []
+        assigned = set()
+        for start_id in sorted(node_id_list, key=lambda node_id: len(neighbors[node_id]), reverse=True):
+            if start_id in assigned:
+                continue
+            part = []
+            queue = deque([start_id])
+            assigned.add(start_id)
+            while queue and len(part) < max_nodes:
+                node_id = queue.popleft()
+                part.append(node_id)
+                for other_id in neighbors[node_id]:
+                    if other_id not in assigned:
+                        assigned.add(other_id)
+                        queue.append(other_id)
+            # Nodes reached after the part was full are left for the next parts
+            assigned.difference_update(queue)
+            parts.append(part)
+        return parts
+
+    def partition(self, by: str='component', max_nodes: int=DIAGRAM_MAX_NODES) -> dict:
+        '''
+        Split the topology by site, subnet or connected component, returning a sub-topology per
+        partition. Links between partitions are kept in both, with the device on the other side
+        as a boundary node, so the diagrams show how the partitions connect. Small connected
+        components are grouped together, up to max_nodes per partition, and components bigger
+        than max_nodes are split (see split_nodes).
+        '''
+
+        groups = {}
+        if by == 'site':
+            for node_id in self.nodes:
+                groups.setdefault(self.get_site(node_id), []).append(node_id)
+        elif by == 'subnet':
+            for node_id in self.nodes:
+                groups.setdefault(self.get_subnet(node_id), []).append(node_id)
+        elif by == 'component':
+            group = []
+            for component in self.get_components():
+                for part in self.split_nodes(component, max_nodes):
+                    if group and len(group) + len(part) > max_nodes:
+                        groups[f"Component {len(groups) + 1}"] = group
+                        group = []
+                    group.extend(part)
+            if group:
+                groups[f"Component {len(groups) + 1}"] = group
+        else:
+            raise ValueError(f"Unknown topology partition: {by}")
+
+        partition_ids = {node_id: name for name, node_id_list in groups.items() for node_id in node_id_list}
+        partitions = {name: Topology() for name in groups}
+        for name, node_id_list in groups.items():
+            for node_id in node_id_list:
+                partitions[name].nodes[node_id] = self.nodes[node_id]
+        for key, link in self.links.items():
+            for node_id, other_id in ((link['source'], link['target']), (link['target'], link['source'])):
+                partition = partitions[partition_ids[node_id]]
+                partition.links[key] = link
+                if other_id not in partition.nodes:
+                    partition.nodes[other_id] = {**self.nodes[other_id], 'boundary': True}
+        return partitions
+
+    def to_graph(self) -> dict:
+        '''
+        Get the graph in the format used by the N2G diagrams
+        '''
+
+        graph = {'nodes': [], 'links': []}
+        for node_id, node in self.nodes.items():
+            graph['nodes'].append({
+                'id': node_id,
+                'top_label': node['hostname'] or '',
+                'bottom_label': node['ip_address'] or '',
+            })
+        for link in self.links.values():
+            graph['links'].append({key: link[key] for key in ('source', 'target', 'src_label', 'trgt_label')})
+        return graph
+
+    @classmethod
+    def from_graph(cls, graph: dict) -> 'Topology':
+        '''
+        Create a topology from a graph in the N2G format
+        '''
+
+        topology = cls()
+        for node in graph['nodes']:
+            topology.nodes[node['id']] = {'ip_address': node.get('bottom_label') or None, 'hostname': node.get('top_label') or None}
+        for link in graph['links']:
+            for node_id in (link['source'], link['target']):
+                topology.nodes.setdefault(node_id, {'ip_address': None, 'hostname': None})
+            topology.add_link(link['source'], link['target'], link.get('src_label'), link.get('trgt_label'))
+        return topology
+
+    def to_dict(self) -> dict:
+        return {
+            'nodes': [{'id': node_id, **node} for node_id, node in self.nodes.items()],
+            'links': list(self.links.values()),
+        }
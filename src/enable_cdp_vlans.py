@@ -119,4 +119,7 @@ if __name__ == '__main__':
     for device_obj in client.device_list:
         config = device_obj.set_configs(config_blocks=['cdp'], j2_data=device_ports[device_obj.ip_address])
     # Get device information for each information requested
-    #client.set_concurrent_configs(config_blocks=['CDP'])
\ No newline at end of file
+    #client.set_concurrent_configs(config_blocks=['CDP'])
+
+    # Close the device sessions reused between the get and set operations
+    client.close()
@@ -131,4 +131,7 @@ if __name__ == '__main__':
 
     # ADD CONCURRENCY TO THIS LAST PART
     for device_obj in client.device_list:
-        config = device_obj.set_configs(config_blocks=['lldp'], j2_data=device_ports[device_obj.ip_address])
\ No newline at end of file
+        config = device_obj.set_configs(config_blocks=['lldp'], j2_data=device_ports[device_obj.ip_address])
+
+    # Close the device sessions reused between the get and set operations
+    client.close()
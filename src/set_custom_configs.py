@@ -43,4 +43,7 @@ if __name__ == '__main__':
     # # script_data = client.generate_data_dict()
     # # output_parsed_dict = client.generate_config_parsed(script_data)
 
+    # Close the device sessions kept by the client
+    client.close()
+
     print(f"Execution time: {time.time() - start_time} seconds")
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.classes.port_range import merge_interfaces
+
+
+SETTINGS = {'mode': 'access', 'data_vlan': 10}
+
+
+def test_merge_interfaces_with_ranges():
+    interfaces = [{'id': 'Gi1/0/1 - 4, Gi1/0/10', **SETTINGS}, {'id': 'Gi1/0/5', **SETTINGS}]
+    assert merge_interfaces(interfaces, 'cisco_ios') == [{'id': 'Gi1/0/1 - 5, Gi1/0/10', **SETTINGS}]
+
+
+def test_merge_interfaces_with_port_lists():
+    interfaces = [{'id': 'Gi1/0/1,Gi2/0/1', **SETTINGS}]
+    assert merge_interfaces(interfaces, 'cisco_ios') == [{'id': 'Gi1/0/1, Gi2/0/1', **SETTINGS}]
+
+
+def test_merge_interfaces_keeps_unparsed_ids():
+    interfaces = [{'id': 'Gi1/0/1-Gi1/0/4', **SETTINGS}, {'id': 'Gi1/0/5', **SETTINGS}]
+    assert merge_interfaces(interfaces, 'cisco_ios') == [{'id': 'Gi1/0/1-Gi1/0/4', **SETTINGS}, {'id': 'Gi1/0/5', **SETTINGS}]
@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 
+import argparse
 import json
 import os
 import re
@@ -7,6 +8,7 @@ import sys
 import time
 
 from classes import Client
+from src.classes.profiler import SamplingProfiler, get_profile_path
 
 from multiprocessing import Manager, Process
 
@@ -14,8 +16,26 @@ from multiprocessing import Manager, Process
 def raise_exception(exception): sys.exit("[!] {}".format(exception))
 
 
+def run_upgrade(device, upgrade_steps_info, report, profile_path=None):
+    ''' Upgrade a device in its own process, profiling the process if requested '''
+
+    if profile_path is None:
+        return device.run_upgrade(upgrade_steps_info, report)
+
+    profiler = SamplingProfiler(profile_path, f"upgrade_{device.ip_address}")
+    profiler.start()
+    try:
+        device.run_upgrade(upgrade_steps_info, report)
+    finally:
+        profiler.stop()
+
+
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Upgrade the devices with the steps selected in upgrade.txt')
+    parser.add_argument('--profile', action='store_true', help='save a sampling profile of the run in outputfiles/Profiles')
+    args = parser.parse_args()
+
     st = time.time()
 
     with open(os.path.join(os.path.dirname(__file__), 'upgrade.txt'), 'r', \
@@ -61,10 +81,16 @@ if __name__ == '__main__':
     manager = Manager()
     report = manager.list()
 
+    # Each device is upgraded in its own process, profiled separately in the same folder
+    profile_path = get_profile_path(root_dir) if args.profile else None
+    if profile_path is not None:
+        profiler = SamplingProfiler(profile_path, 'upgrade')
+        profiler.start()
+
     process_list = []
     for devive in client.device_list:
         # Append in a list the process of acquiring information for the device
-        process = Process(target=devive.run_upgrade, args=(upgrade_steps_info, report))
+        process = Process(target=run_upgrade, args=(devive, upgrade_steps_info, report, profile_path))
         process_list.append(process)
 
     # Initiate the process of acquiring configurations for each device
@@ -77,6 +103,8 @@ if __name__ == '__main__':
     # Generage reports for this script
     client.report = report
     client.generate_upgrade_report()
+    if profile_path is not None:
+        profiler.stop()
 
     # Save all script output in a json file
     with open(f"{client.dir}/outputfiles/script_output.json", "w") as outfile: